@@ -2,23 +2,44 @@ from azure.devops.connection import Connection
 from msrest.authentication import BasicAuthentication
 from azure.devops.v7_1.work_item_tracking.models import Wiql
 from azure.devops.v7_1.git.models import GitPullRequestSearchCriteria
+from datetime import datetime
 from typing import Literal
+import logging
 import re
 import traceback
 import sys
 import json
+import pandas as pd
 sys.path.insert(0, '../common')
 from ALMConnector import ALMConnector
 from LMPUtils import LMPUtils
+from MentionExtractor import MentionExtractor
+from HttpTransport import HttpTransport
 
 
 class AZDConnector(ALMConnector):
+    checkpoint_attributes = ALMConnector.checkpoint_attributes + ['issue_issue_mention_dict']
+    # system comments of PR threads. reviews end with the vote score, which is the only way to identify them
+    pr_review_regex = re.compile(r'([+-]?\d+)$')
+    pr_complete_regex = re.compile('^.*updated the pull request status to Completed$')
+    pr_abandoned_regex = re.compile('^.*updated the pull request status to Abandoned$')
+    vote_map = {
+        10: "_MR_approved",
+        5: "_MR_appr_sug",
+        -5: "_MR_wait_author",
+        -10: "_MR_rejected"
+    }
+    # PRs mentioned in work item comments, and work items mentioned by related links
+    work_item_mentions = MentionExtractor({'mr': r'pullrequest/(\d+)', 'work_item': r'mentioned work item #(\d+)'})
+
     def __init__(self, base_url: str, pvt_token: str, project_name: str, ext_issue_ref_regex: str,
-                 case_type_prefixes: dict, api_delay: int = 0):
+                 case_type_prefixes: dict, api_delay: int = 0, connection: Connection = None,
+                 http_settings: dict = None):
         ALMConnector.__init__(self, project_name, ext_issue_ref_regex, api_delay, case_type_prefixes)
-        self.logger.info('Running test auth to: ' + base_url)
-        credentials = BasicAuthentication('', pvt_token)
-        connection = Connection(base_url=base_url, creds=credentials)
+        if connection is None:
+            connection = self.create_connection(base_url, pvt_token, http_settings)
+        else:
+            self.logger.info('Using shared connection for: ' + base_url)
 
         # create various connection clients needed for pulling information
         self.core = connection.clients.get_core_client()
@@ -38,6 +59,50 @@ class AZDConnector(ALMConnector):
         # TODO: branch creation events can only be retrived by scanning all commits, which is too slow, find other way
         # limit to use if production run is false
         self.nonprod_limit = 10
+        # WIQL results are capped at 20000 work items, get work items accepts up to 200 ids per request
+        self.wiql_window_size = 19999
+        self.work_item_batch_size = 200
+        self.work_item_workers = 1
+        # when enabled, revisions of all work items are read using the reporting api instead of one call per item
+        self.bulk_revisions = False
+        # releases are listed project wide in pages, details missing in the listing are read in parallel
+        self.release_page_size = 100
+        self.release_workers = 1
+        # builds are listed project wide in pages
+        self.build_page_size = 1000
+        # threads and commits of PRs are read ahead of event derivation by a bounded pool
+        self.mr_workers = 1
+
+    @classmethod
+    def create_connection(cls, base_url: str, pvt_token: str, http_settings: dict = None) -> Connection:
+        """Creates a connection which can be shared among connectors of the same organization.
+        Clients created from a connection are cached by the connection itself. If http_settings are given, a single
+        HttpTransport is mounted on the clients, so that its pool and response cache are shared by all connectors"""
+        logging.getLogger('scriptLogger').info('Running test auth to: ' + base_url)
+        credentials = BasicAuthentication('', pvt_token)
+        connection = Connection(base_url=base_url, creds=credentials)
+        if http_settings is not None:
+            cls.mount_transport(connection, HttpTransport.from_settings(http_settings))
+        return connection
+
+    @classmethod
+    def mount_transport(cls, connection: Connection, transport: HttpTransport):
+        """Mounts the transport adapter on the requests sessions used by the msrest clients, so that connection
+        pooling, rate limiting, retries and the response cache apply to sdk calls as well. msrest keeps a session
+        per thread, hence the adapter is mounted by the public session configuration callback before each request.
+        The adapter retries throttled, unavailable and gateway error responses itself, so the urllib3 retry policy
+        of msrest is disabled instead of stacking both. Unlike msrest, 500 responses are not sent again"""
+
+        def mount_session(session, global_config, local_config, **kwargs) -> dict:
+            if session.get_adapter('https://') is not transport.adapter:
+                transport.mount(session)
+            return kwargs
+
+        clients = connection.clients
+        for client in [clients.get_core_client(), clients.get_git_client(), clients.get_work_item_tracking_client(),
+                       clients.get_build_client(), clients.get_release_client()]:
+            client.config.session_configuration_callback = mount_session
+            client.config.retry_policy.retries = 0
 
     def get_release_completed_time(self, environments: list):
         # this assumes the last job finish time as the completed time of the release
@@ -57,13 +122,72 @@ class AZDConnector(ALMConnector):
                                 latest_end_time = deployment_job.job.finish_time
         return latest_end_time
 
+    @classmethod
+    def paged_response(cls, response) -> tuple[list, object]:
+        """Gives the values and continuation token of an sdk response. Paged sdk methods either give an object
+        with value and continuation token, or a plain list, in which case the token is not known"""
+        if isinstance(response, list):
+            return response, None
+        return response.value, response.continuation_token
+
+    def list_releases(self) -> dict:
+        """Lists releases of all definitions in the project with environments and artifacts expanded, newest
+        first. Gives definition id to releases. When the continuation token is not exposed by the sdk, the
+        lowest release id read is used as the token, as releases are paged by id"""
+        releases_by_definition = {}
+        release_ids = set()
+        continuation_token = None
+        while True:
+            response = self.release.get_releases(project=self.project_name, min_created_time=self.updated_after,
+                                                 query_order='descending', top=self.release_page_size,
+                                                 continuation_token=continuation_token,
+                                                 expand='environments,artifacts')
+            page, continuation_token = self.paged_response(response)
+            # token may be inclusive, hence releases already read are skipped
+            new_releases = [run for run in page if run.id not in release_ids]
+            if len(new_releases) == 0:
+                break
+            for run in new_releases:
+                release_ids.add(run.id)
+                releases_by_definition.setdefault(run.release_definition.id, []).append(run)
+            if continuation_token is None:
+                if len(page) < self.release_page_size:
+                    break
+                continuation_token = min(run.id for run in new_releases)
+        self.logger.info('number of releases found for project: ' + str(len(release_ids)))
+        return releases_by_definition
+
+    @classmethod
+    def has_release_details(cls, run) -> bool:
+        """Listed releases may come without deploy steps of their environments, which are needed for the
+        completed time"""
+        if run.environments is None or run.artifacts is None:
+            return False
+        return all(environment.deploy_steps is not None for environment in run.environments)
+
+    def get_release(self, release_id: int):
+        return self.release.get_release(project=self.project_name, release_id=release_id)
+
     def get_release_events(self, prod_run: bool = False):
         return_list = []
         # Get all release definitions in the project
         # Since pipelines and releases are similar mostly similar logic is being used
         self.logger.info('scanning releases in project_id: ' + str(self.project_name))
         definitions = self.release.get_release_definitions(project=self.project_name)
-        pl_counter = 0
+        # releases of all definitions are listed at once, instead of one request per definition
+        releases_by_definition = self.list_releases()
+        if not prod_run:
+            for definition_id in releases_by_definition:
+                releases_by_definition[definition_id] = releases_by_definition[definition_id][0:self.nonprod_limit]
+        definition_total = len(definitions)
+        pl_counter, definitions = self.resume_items(definitions, lambda pipeline: pipeline.id)
+        # details are only read for releases listed without them, in parallel
+        detail_ids = [run.id for pipeline in definitions for run in releases_by_definition.get(pipeline.id, [])
+                      if not self.has_release_details(run)]
+        if len(detail_ids) > 0:
+            self.logger.info('reading details of ' + str(len(detail_ids)) + ' releases')
+        release_details = dict(zip(detail_ids, LMPUtils.ordered_map(self.get_release, detail_ids,
+                                                                    self.release_workers)))
         for pipeline in definitions:
             pl_counter += 1
             try:
@@ -77,10 +201,7 @@ class AZDConnector(ALMConnector):
                 # case id is local id since pl definition is not dependent on commit
                 self.add_event(pl_id, self.action_prefix + '_REL_created', pl_created, local_case, user_email,
                                user_name, local_case, pl_dict['name'], '', str(self.project_id))
-                # can run this without definition id scope to reduce number of api calls, if needed
-                releases = self.release.get_releases(project=self.project_name, definition_id=pipeline.id)
-                if not prod_run:
-                    releases = releases[0:self.nonprod_limit]
+                releases = releases_by_definition.get(pipeline.id, [])
                 for run in releases:
                     b_dict = run.as_dict()
                     return_list.append(b_dict)
@@ -89,7 +210,7 @@ class AZDConnector(ALMConnector):
                     run_created = b_dict['created_on']
                     user_email = b_dict['created_by']['unique_name']
                     user_name = b_dict['created_by']['display_name']
-                    release = self.release.get_release(project=self.project_name, release_id=b_dict['id'])
+                    release = release_details.get(run.id, run)
                     # Iterate through all stages (environments) of the release
                     latest_end_time = self.get_release_completed_time(release.environments)
                     if latest_end_time is not None:
@@ -116,7 +237,7 @@ class AZDConnector(ALMConnector):
                                  'project_id': self.project_id}
                     # release have a different format, hence exposed as a separate entity
                     self.rel_list.append(pl_record)
-                self.log_status(pl_counter, len(definitions))
+                self.log_status(pl_counter, definition_total, pipeline.id)
             except (TypeError, KeyError):
                 self.logger.error('Error occurred retrieving data for: ' + str(pipeline.id) + ' moving to next.')
                 traceback.print_exc()
@@ -124,12 +245,69 @@ class AZDConnector(ALMConnector):
         self.logger.info('number of pipeline related events found: ' + str(self.added_event_count()))
         return return_list
 
+    def list_builds(self, prod_run: bool = False, min_time=None, max_time=None) -> dict:
+        """Lists builds of all definitions in the project, latest queued first, optionally within a queue time
+        window. min_time and max_time filter on queue time, as the listing is ordered by it. Gives definition id
+        to builds. The sdk does not expose the continuation token, hence the window end is moved back to the oldest
+        queue time read, every build has one. Non production runs read a single page"""
+        builds_by_definition = {}
+        build_ids = set()
+        continuation_token = None
+        while True:
+            response = self.build.get_builds(project=self.project_name, min_time=min_time, max_time=max_time,
+                                             query_order='queueTimeDescending', top=self.build_page_size,
+                                             continuation_token=continuation_token,
+                                             max_builds_per_definition=None if prod_run else self.nonprod_limit)
+            page, continuation_token = self.paged_response(response)
+            # window end is inclusive, hence builds already read are skipped
+            new_builds = [run for run in page if run.id not in build_ids]
+            for run in new_builds:
+                build_ids.add(run.id)
+                builds_by_definition.setdefault(run.definition.id, []).append(run)
+            if not prod_run or len(page) < self.build_page_size:
+                break
+            if continuation_token is None:
+                if len(new_builds) == 0:
+                    # only when more builds than a page share one queue time, the window can not move back
+                    self.logger.warn('A full page of builds queued at ' + str(max_time) + ' was read again, '
+                                     'older builds are not listed. Increase pipelines.page_size')
+                    break
+                max_time = min(run.queue_time for run in new_builds)
+        self.logger.info('number of builds found for project: ' + str(len(build_ids)))
+        return builds_by_definition
+
+    @classmethod
+    def get_durations(cls, build_dicts: list[dict]) -> list[int]:
+        """Seconds between start and finish of each build, 0 for builds which are not finished"""
+        if len(build_dicts) == 0:
+            return []
+        start_times = pd.Series([b_dict.get('start_time') for b_dict in build_dicts], dtype=object)
+        finish_times = pd.Series([b_dict.get('finish_time') for b_dict in build_dicts], dtype=object)
+        start_times = pd.to_datetime(start_times, format='ISO8601', utc=True, errors='coerce')
+        finish_times = pd.to_datetime(finish_times, format='ISO8601', utc=True, errors='coerce')
+        # truncated towards zero like timedelta seconds
+        return (finish_times - start_times).dt.total_seconds().fillna(0).astype('int64').tolist()
+
     def get_pipeline_events(self, prod_run: bool = False):
         return_list = []
         # Get all pipeline definitions in the project
         self.logger.info('scanning pipelines in project_id: ' + str(self.project_name))
         definitions = self.build.get_definitions(project=self.project_name)
-        pl_counter = 0
+        definition_total = len(definitions)
+        pl_counter, definitions = self.resume_items(definitions, lambda pipeline: pipeline.id)
+        # builds of all definitions are listed at once, instead of one request per definition
+        builds_by_definition = self.list_builds(prod_run, self.updated_after)
+        build_dicts = {}
+        for pipeline in definitions:
+            builds = builds_by_definition.get(pipeline.id, [])
+            if not prod_run:
+                builds = builds[0:self.nonprod_limit]
+            build_dicts[pipeline.id] = [run.as_dict() for run in builds]
+        # durations of all builds are calculated in a single pass
+        all_build_dicts = [b_dict for b_dicts in build_dicts.values() for b_dict in b_dicts]
+        durations = iter(self.get_durations(all_build_dicts))
+        build_durations = {pipeline_id: [next(durations) for _ in b_dicts]
+                           for pipeline_id, b_dicts in build_dicts.items()}
         for pipeline in definitions:
             pl_counter += 1
             try:
@@ -144,12 +322,7 @@ class AZDConnector(ALMConnector):
                 # case id is local id since pl definition is not dependent on commit
                 self.add_event(pl_id, self.action_prefix + '_PL_created', pl_created, local_case, user_email,
                                user_name, local_case, pl_dict['name'], '', str(self.project_id))
-                # Get the top 5 most recent runs for this pipeline definition
-                builds = self.build.get_builds(project=self.project_name, definitions=[pipeline.id])
-                if not prod_run:
-                    builds = builds[0:self.nonprod_limit]
-                for run in builds:
-                    b_dict = run.as_dict()
+                for b_dict, b_duration in zip(build_dicts[pipeline.id], build_durations[pipeline.id]):
                     return_list.append(b_dict)
                     # run id is unique for a project
                     run_id = str(b_dict['id'])
@@ -169,13 +342,13 @@ class AZDConnector(ALMConnector):
                         run_finished = b_dict['finish_time']
                         self.add_event(run_id, self.action_prefix + '_PL_completed', run_finished, case_id,
                                        user_email, user_name, local_case, '', '', str(self.project_id))
-                        duration = LMPUtils.get_seconds_difference_same_zone(run_created, run_finished)
+                        duration = b_duration
                     pl_record = {'id': run_id, 'source': b_dict['source_branch'], 'sha': run_sha,
                                  'author': user_email, 'created_time': run_created,
                                  'duration': duration, 'status': b_dict['status'], 'case_id': case_id,
                                  'project_id': self.project_id}
                     self.pl_list.append(pl_record)
-                self.log_status(pl_counter, len(definitions))
+                self.log_status(pl_counter, definition_total, pipeline.id)
             except (TypeError, KeyError):
                 self.logger.error('Error occurred retrieving data for: ' + str(pipeline.id) + ' moving to next.')
                 traceback.print_exc()
@@ -183,6 +356,34 @@ class AZDConnector(ALMConnector):
         self.logger.info('number of pipeline related events found: ' + str(self.added_event_count()))
         return return_list
 
+    def get_mr_details(self, mr) -> tuple[list, list]:
+        """Reads threads and commits of a PR. Runs in worker threads"""
+        mr_id = str(mr.pull_request_id)
+        mr_threads = self.git.get_threads(repository_id=mr.repository.id, pull_request_id=mr_id,
+                                          project=self.project_name)
+        commits = self.git.get_pull_request_commits(repository_id=mr.repository.id, pull_request_id=mr_id,
+                                                    project=self.project_name)
+        return mr_threads, commits
+
+    def classify_pr_comment(self, comment: dict) -> str:
+        """Gives the action of a PR thread comment. Raises KeyError for review scores without a vote action"""
+        # log unknown actions for now
+        action = self.action_prefix + '_MR_comment_UNKNOWN'
+        if comment['comment_type'] == 'system':
+            review_match = self.pr_review_regex.search(comment['content'])
+            if review_match is not None:
+                review_score = int(review_match.group(1))
+                # need to use vote map to identify what has happened, no other way
+                action = self.action_prefix + self.vote_map[review_score]
+            elif self.pr_complete_regex.match(comment['content']) is not None:
+                action = self.action_prefix + '_MR_completed'
+            elif self.pr_abandoned_regex.match(comment['content']) is not None:
+                action = self.action_prefix + '_MR_abandoned'
+        elif comment['comment_type'] == 'text':
+            action = self.action_prefix + '_MR_commented'
+            self.logger.warn('Unknown comment type: ' + json.dumps(comment))
+        return action
+
     def get_mrs_events(self, prod_run: bool = False) -> list[dict]:
         """Extract MR events from repo and analyse relations to issues"""
         return_list = []
@@ -193,11 +394,20 @@ class AZDConnector(ALMConnector):
         # Get the list of pull requests for the entire project
         merge_requests = self.git.get_pull_requests_by_project(project=self.project_name,
                                                                search_criteria=search_criteria)
+        if self.updated_after is not None:
+            # search criteria of the sdk has no time filter, MRs created or closed since the last run are kept
+            updated_after = datetime.fromisoformat(self.updated_after)
+            merge_requests = [mr for mr in merge_requests if mr.creation_date >= updated_after or
+                              (mr.closed_date is not None and mr.closed_date >= updated_after)]
+        # latest linked issue of each MR is chosen in batch, issue links are known at this point
+        self.resolve_mr_issue_links()
         self.logger.info('number of MRs found for project: ' + str(len(merge_requests)))
-        mr_counter = 0
         if not prod_run:
             merge_requests = merge_requests[0:self.nonprod_limit]
-        for mr in merge_requests:
+        mr_total = len(merge_requests)
+        mr_counter, merge_requests = self.resume_items(merge_requests, lambda mr: mr.pull_request_id)
+        mr_details = LMPUtils.ordered_map(self.get_mr_details, merge_requests, self.mr_workers)
+        for mr, (mr_threads, commits) in zip(merge_requests, mr_details):
             mr_counter += 1
             mr_dict = mr.as_dict()
             return_list.append(mr_dict)
@@ -221,40 +431,13 @@ class AZDConnector(ALMConnector):
                                author_email, author_name, local_case, '', '', str(self.project_id))
                 # get data from PR event thread
                 # this reads comments as well as review updates
-                pr_review_regex = re.compile(r'([+-]?\d+)$')
-                pr_complete_regex = re.compile('^.*updated the pull request status to Completed$')
-                pr_abandoned_regex = re.compile('^.*updated the pull request status to Abandoned$')
-                vote_map = {
-                    10: "_MR_approved",
-                    5: "_MR_appr_sug",
-                    -5: "_MR_wait_author",
-                    -10: "_MR_rejected"
-                }
-                mr_threads = self.git.get_threads(repository_id=repo_id, pull_request_id=mr_id,
-                                                  project=self.project_name)
                 for thread in mr_threads:
                     thread_dict = thread.as_dict()
                     for comment in thread_dict['comments']:
                         comment_created = comment['published_date']
                         comment_author = comment['author']['unique_name']
                         comment_name = comment['author']['display_name']
-                        # log unknown actions for now
-                        action = self.action_prefix + '_MR_comment_UNKNOWN'
-                        if comment['comment_type'] == 'system':
-                            review_match = pr_review_regex.search(comment['content'])
-                            comp_match = pr_complete_regex.match(comment['content'])
-                            aban_match = pr_abandoned_regex.match(comment['content'])
-                            if review_match is not None:
-                                review_score = int(review_match.group(1))
-                                # need to use vote map to identify what has happened, no other way
-                                action = self.action_prefix + vote_map[review_score]
-                            elif comp_match is not None:
-                                action = self.action_prefix + '_MR_completed'
-                            elif aban_match is not None:
-                                action = self.action_prefix + '_MR_abandoned'
-                        elif comment['comment_type'] == 'text':
-                            action = self.action_prefix + '_MR_commented'
-                            self.logger.warn('Unknown comment type: ' + json.dumps(comment))
+                        action = self.classify_pr_comment(comment)
                         self.add_event(mr_id, action, comment_created, case_id, comment_author,
                                        comment_name, local_case, '', '', str(self.project_id))
 
@@ -266,8 +449,6 @@ class AZDConnector(ALMConnector):
                 self.add_link(self.commit_mr_post_merge_dict, post_merge_commit, mr_id)
                 # find commit events
                 # TODO: commits which are not allocated to a MR or squashed will not be found
-                commits = self.git.get_pull_request_commits(repository_id=repo_id, pull_request_id=mr_id,
-                                                            project=self.project_name)
                 self.logger.debug('commits found related to MR: ' + str(len(commits)))
                 for commit in commits:
                     commit_dict = commit.as_dict()
@@ -285,11 +466,8 @@ class AZDConnector(ALMConnector):
                                                    'user_ref': commit_name,  'info1': info1}
                     # merge pipelines could be launched from any commit related to MR
                     self.add_link(self.commit_mr_commits_dict, commit_id, mr_id)
-                # Try to find an external issue id. description can be null
-                if 'description' in mr_dict:
-                    ext_issue_id = self.find_ext_issue_id(mr_dict['title'] + ' ' + mr_dict['description'])
-                else:
-                    ext_issue_id = self.find_ext_issue_id(mr_dict['title'])
+                # Try to find an external issue id. description can be missing
+                ext_issue_id = self.find_ext_issue_id(mr_dict['title'], mr_dict.get('description'))
                 linked = set()
                 mentioned = set()
                 if mr_id in self.mr_issue_link_dict:
@@ -304,7 +482,7 @@ class AZDConnector(ALMConnector):
                            'ext_issue_id': ext_issue_id, 'linked_issues': linked, 'mentioned_issues': mentioned,
                            'case_id': case_id, 'link_type': link_type}
                 self.mr_list.append(mr_dict)
-                self.log_status(mr_counter, len(merge_requests))
+                self.log_status(mr_counter, mr_total, mr.pull_request_id)
             except (TypeError, KeyError):
                 self.logger.error('Error occurred retrieving data for: ' + mr_id + ' moving to next.')
                 traceback.print_exc()
@@ -315,108 +493,172 @@ class AZDConnector(ALMConnector):
     def get_issues_events(self, prod_run: bool = False) -> list[dict]:
         return_list = []
         self.logger.info('scanning issues in project_id: ' + str(self.project_name))
-        # --initialising values---
-        mention_regex = re.compile('mentioned work item #\\d+')
-        mr_mention_regex = re.compile(r'pullrequest/\d+')
-        # WIQL supports SQL like syntax
         # we will be getting work item ids first in to a list
-        wiql_query = Wiql(query="SELECT [System.Id] FROM WorkItems WHERE [System.TeamProject] = \'"
-                                + self.project_name + '\'')
-        query_result = self.wit.query_by_wiql(wiql_query)
-        work_item_ids = [item.id for item in query_result.work_items]
+        work_item_ids = self.query_work_item_ids()
         if len(work_item_ids) == 0:
             self.logger.info('No work items found for project. skipping')
             return []
-        # And then pull data for all ids at once using single api call
-        work_items_batch = self.wit.get_work_items(ids=work_item_ids, project=self.project_name, expand='all')
-        self.logger.info('number of issues found for project: ' + str(len(work_items_batch)))
-        issue_counter = 0
+        self.logger.info('number of issues found for project: ' + str(len(work_item_ids)))
         if not prod_run:
-            work_items_batch = work_items_batch[0:self.nonprod_limit]
-        for item in work_items_batch:
-            # work items are considered as issues from now on
-            issue_counter += 1
-            linked_mrs = set()
-            mentioned_mrs = set()
-            linked_issues = set()
-            item_dict = item.as_dict()
-            return_list.append(item_dict)
-            fields = item_dict['fields']
-            issue_id = fields['System.Id']
-            case_id = self.generate_case_id(issue_id, 'issue')
-            self.logger.set_arg_only(case_id)
-            try:
-                created_time = fields['System.CreatedDate']
-                updated_time = fields['System.ChangedDate']
-                author_email = fields['System.CreatedBy']['uniqueName']
-                author_name = fields['System.CreatedBy']['displayName']
-                issue_type = fields['System.WorkItemType']
-                state = fields['System.State']
-                # add event for issue creation
-                self.add_event(case_id, self.action_prefix+ '_issue_created', created_time, case_id, author_email,
-                               author_name, case_id, '', '', str(self.project_id))
-                # get all revisions for the issue
-                revisions = self.wit.get_revisions(id=int(issue_id), project=self.project_name, expand='fields')
-                # sort revisions since we need to track state changes
-                revisions.sort(key=lambda r: r.rev)
-                # Loop through revisions to find the differences in the 'System.State' field
-                # TODO: see whether this captures assigning to user
-                for i in range(1, len(revisions)):
-                    rev = revisions[i]
-                    previous_rev = revisions[i - 1]
-                    # get comment events if there are any
-                    if 'System.History' in rev.fields:
-                        self.add_event(case_id + '-' + str(rev.rev),
-                                       self.action_prefix + '_issue_commented',
-                                       rev.fields['System.ChangedDate'], case_id,
-                                       rev.fields['System.ChangedBy']['uniqueName'],
-                                       rev.fields['System.ChangedBy']['displayName'],
-                                       case_id, '', '', str(self.project_id))
-                        mr_mention_match = re.search(mr_mention_regex, rev.fields['System.History'])
-                        if mr_mention_match is not None:
+            work_item_ids = work_item_ids[0:self.nonprod_limit]
+        issue_total = len(work_item_ids)
+        issue_counter, work_item_ids = self.resume_items(work_item_ids, lambda work_item_id: work_item_id)
+        revisions_by_item = None
+        if self.bulk_revisions and prod_run and self.updated_after is None:
+            # incremental runs need revisions before the watermark to detect state changes, hence read per item
+            revisions_by_item = self.get_reporting_revisions()
+        # And then pull data in batches of ids, which is the limit of the api
+        batches = [work_item_ids[i:i + self.work_item_batch_size]
+                   for i in range(0, len(work_item_ids), self.work_item_batch_size)]
+        for work_items_batch in LMPUtils.ordered_map(self.get_work_items_batch, batches, self.work_item_workers):
+            for item in work_items_batch:
+                # work items are considered as issues from now on
+                issue_counter += 1
+                self.add_issue(item, revisions_by_item, return_list)
+                self.log_status(issue_counter, issue_total, item.id)
+        self.logger.info('number of issue related events found: ' + str(self.added_event_count()))
+        return return_list
+
+    def query_work_item_ids(self) -> list[int]:
+        """Gives ids of the work items in the project. WIQL results are capped, hence the query is run in
+        windows of ascending ids"""
+        # WIQL supports SQL like syntax
+        wiql_text = "SELECT [System.Id] FROM WorkItems WHERE [System.TeamProject] = \'" + self.project_name + '\''
+        if self.updated_after is not None:
+            # only work items changed after the watermark are read in incremental runs
+            wiql_text += " AND [System.ChangedDate] > \'" + self.updated_after + '\''
+        work_item_ids = []
+        last_id = 0
+        while True:
+            wiql_query = Wiql(query=wiql_text + ' AND [System.Id] > ' + str(last_id) + ' ORDER BY [System.Id]')
+            query_result = self.wit.query_by_wiql(wiql_query, time_precision=True, top=self.wiql_window_size)
+            window = [item.id for item in query_result.work_items]
+            work_item_ids += window
+            if len(window) < self.wiql_window_size:
+                return work_item_ids
+            last_id = window[-1]
+
+    def get_work_items_batch(self, ids: list[int]) -> list:
+        return self.wit.get_work_items(ids=ids, project=self.project_name, expand='all')
+
+    def get_reporting_revisions(self) -> dict:
+        """Reads revisions of all work items in the project using the reporting api, following continuation
+        tokens. Gives work item id to revisions, only fields used for events are read"""
+        fields = ['System.State', 'System.History', 'System.ChangedBy', 'System.ChangedDate']
+        revisions_by_item = {}
+        continuation_token = None
+        revision_counter = 0
+        while True:
+            batch = self.wit.read_reporting_revisions_get(project=self.project_name, fields=fields,
+                                                          continuation_token=continuation_token,
+                                                          include_identity_ref=True)
+            for revision in batch.values:
+                revision_counter += 1
+                revisions_by_item.setdefault(revision.id, []).append({'rev': revision.rev, 'fields': revision.fields})
+            if batch.is_last_batch or not batch.values or batch.continuation_token is None:
+                break
+            continuation_token = batch.continuation_token
+        self.logger.info('number of work item revisions read: ' + str(revision_counter))
+        return revisions_by_item
+
+    def get_revisions(self, issue_id: int) -> list[dict]:
+        """Reads all revisions of a single work item"""
+        revisions = self.wit.get_revisions(id=int(issue_id), project=self.project_name, expand='fields')
+        return [{'rev': revision.rev, 'fields': revision.fields} for revision in revisions]
+
+    @classmethod
+    def identity_ref(cls, identity) -> tuple[str, str]:
+        """Gives unique name and display name of an identity field. Identities are given as dicts, or as
+        'Display Name <unique name>' strings when identity refs are not requested"""
+        if isinstance(identity, dict):
+            return identity['uniqueName'], identity['displayName']
+        match = re.match(r'^(.*?)\s*<([^<>]*)>$', identity)
+        if match is None:
+            return identity, identity
+        return match.group(2), match.group(1)
+
+    def add_issue(self, item, revisions_by_item: dict, return_list: list):
+        """Adds events of a work item and its revisions. Revisions are read per item if not given in bulk"""
+        linked_mrs = set()
+        mentioned_mrs = set()
+        linked_issues = set()
+        item_dict = item.as_dict()
+        return_list.append(item_dict)
+        fields = item_dict['fields']
+        issue_id = fields['System.Id']
+        case_id = self.generate_case_id(issue_id, 'issue')
+        self.logger.set_arg_only(case_id)
+        try:
+            created_time = fields['System.CreatedDate']
+            updated_time = fields['System.ChangedDate']
+            author_email, author_name = self.identity_ref(fields['System.CreatedBy'])
+            issue_type = fields['System.WorkItemType']
+            state = fields['System.State']
+            # add event for issue creation
+            self.add_event(case_id, self.action_prefix+ '_issue_created', created_time, case_id, author_email,
+                           author_name, case_id, '', '', str(self.project_id))
+            # get all revisions for the issue
+            if revisions_by_item is None:
+                revisions = self.get_revisions(issue_id)
+            else:
+                revisions = revisions_by_item.get(issue_id, [])
+            # sort revisions since we need to track state changes
+            revisions.sort(key=lambda r: r['rev'])
+            # Loop through revisions to find the differences in the 'System.State' field
+            # TODO: see whether this captures assigning to user
+            for i in range(1, len(revisions)):
+                rev = revisions[i]
+                previous_rev = revisions[i - 1]
+                changed_by_email, changed_by_name = self.identity_ref(rev['fields']['System.ChangedBy'])
+                # get comment events if there are any
+                if 'System.History' in rev['fields']:
+                    self.add_event(case_id + '-' + str(rev['rev']),
+                                   self.action_prefix + '_issue_commented',
+                                   rev['fields']['System.ChangedDate'], case_id,
+                                   changed_by_email, changed_by_name,
+                                   case_id, '', '', str(self.project_id))
+                    mr_mention = self.work_item_mentions.first('mr', rev['fields']['System.History'])
+                    if mr_mention != '':
+                        # get MR iid and add as int
+                        mentioned_mr = int(mr_mention)
+                        # add to set
+                        mentioned_mrs.add(mentioned_mr)
+                        self.add_link(self.mr_issue_mention_dict, mentioned_mr, issue_id)
+                # Direct comparison of the 'System.State' field to find state changes
+                current_state = rev['fields'].get('System.State')
+                previous_state = previous_rev['fields'].get('System.State')
+                if current_state != previous_state:
+                    self.add_event(case_id + '-' + str(rev['rev']),
+                                   self.action_prefix + '_issue_' + current_state,
+                                   rev['fields']['System.ChangedDate'], case_id,
+                                   changed_by_email, changed_by_name,
+                                   case_id, '', '', str(self.project_id))
+            # check relations to other entities (links and parents)
+            for x in item.relations:
+                relation = x.as_dict()
+                match relation['attributes']['name']:
+                    case 'Parent':
+                        # get parent issue
+                        url = relation['url']
+                        parent_id = url.split('/')[-1]
+                    case 'Related':
+                        # Related finds the linked entities like other issues, and PRs
+                        if self.work_item_mentions.first('work_item', relation['attributes']['comment']) != '':
+                            # TODO: PR relation gives an alien id which cannot be resolved
+                            # MR links hence not resolved at this point. Linked issues not used for any resolving
                             # get MR iid and add as int
-                            mentioned_mr = int(mr_mention_match.group(0).split('/')[-1])
+                            linked_issue = int(relation['url'].split('/')[-1])
                             # add to set
-                            mentioned_mrs.add(mentioned_mr)
-                            self.add_link(self.mr_issue_mention_dict, mentioned_mr, issue_id)
-                    # Direct comparison of the 'System.State' field to find state changes
-                    current_state = rev.fields.get('System.State')
-                    previous_state = previous_rev.fields.get('System.State')
-                    if current_state != previous_state:
-                        self.add_event(case_id + '-' + str(rev.rev),
-                                       self.action_prefix + '_issue_' + current_state,
-                                       rev.fields['System.ChangedDate'], case_id,
-                                       rev.fields['System.ChangedBy']['uniqueName'],
-                                       rev.fields['System.ChangedBy']['displayName'],
-                                       case_id, '', '', str(self.project_id))
-                # check relations to other entities (links and parents)
-                for x in item.relations:
-                    relation = x.as_dict()
-                    match relation['attributes']['name']:
-                        case 'Parent':
-                            # get parent issue
-                            url = relation['url']
-                            parent_id = url.split('/')[-1]
-                        case 'Related':
-                            # Related finds the linked entities like other issues, and PRs
-                            if re.search(mention_regex, relation['attributes']['comment']) is not None:
-                                # TODO: PR relation gives an alien id which cannot be resolved
-                                # MR links hence not resolved at this point. Linked issues not used for any resolving
-                                # get MR iid and add as int
-                                linked_issue = int(relation['url'].split('/')[-1])
-                                # add to set
-                                linked_issues.add(linked_issue)
-                                self.add_link(self.issue_issue_mention_dict, issue_id, linked_issue)
+                            linked_issues.add(linked_issue)
+                            self.add_link(self.issue_issue_mention_dict, issue_id, linked_issue)
+
+            issue_dict = {'id': fields['System.Id'], 'title': fields['System.Description'],
+                          'author_id': author_email, 'created_time': created_time, 'type': issue_type,
+                          'updated_time': updated_time, 'state': state, 'project_id': self.project_name,
+                          'mentioned_mrs': mentioned_mrs}
+            self.issue_list.append(issue_dict)
+        except (TypeError, KeyError):
+            self.logger.error('Error occurred retrieving data for: ' + str(issue_id) + ' moving to next.')
+            traceback.print_exc()
+        self.logger.reset_prefix()
 
-                issue_dict = {'id': fields['System.Id'], 'title': fields['System.Description'],
-                              'author_id': author_email, 'created_time': created_time, 'type': issue_type,
-                              'updated_time': updated_time, 'state': state, 'project_id': self.project_name,
-                              'mentioned_mrs': mentioned_mrs}
-                self.issue_list.append(issue_dict)
-                self.log_status(issue_counter, len(work_items_batch))
-            except (TypeError, KeyError):
-                self.logger.error('Error occurred retrieving data for: ' + str(issue_id) + ' moving to next.')
-                traceback.print_exc()
-            self.logger.reset_prefix()
-        self.logger.info('number of issue related events found: ' + str(self.added_event_count()))
-        return return_list
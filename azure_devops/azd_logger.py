@@ -1,19 +1,81 @@
+import argparse
 import pandas as pd
 from AZDConnector import AZDConnector
 import json
 import logging.config
+import multiprocessing
 import os
 import sys
+from functools import partial
 sys.path.insert(0, '../common')
 from LMPUtils import LMPUtils
 from DevOpsConnector import DevOpsConnector
+from EventBuffer import EventBuffer
+from WatermarkState import WatermarkState
+from ResponseCache import ResponseCache
+from ParquetStreamWriter import ParquetStreamWriter
+from OutputEngine import OutputEngine
+from CheckpointStore import CheckpointStore
+from RunMetrics import RunMetrics
+
+
+def init_worker():
+    """Logging needs to be configured again inside worker processes"""
+    logging.config.fileConfig('../common/logging.conf')
+
+
+def extract_project(project_name: str, config: dict) -> dict:
+    """Runs all event methods for a single project and returns its results.
+    Runs in worker threads or processes, hence config is passed explicitly and results are picklable"""
+    checkpoints = config.get('checkpoints')
+    state = None
+    if checkpoints is not None and config['resume']:
+        state = checkpoints.load(project_name)
+        if state is not None and 'result' in state:
+            # project was completed before the run failed
+            return state['result']
+    azd = AZDConnector(config['base_url'], config['private_token'], project_name, config['ext_issue_ref_regex'],
+                       config['case_type_prefixes'], connection=config.get('connection'),
+                       http_settings=config['http'])
+    if config['incremental']:
+        # only entities updated after the watermark are read, older relations come from previous outputs
+        azd.updated_after = config['updated_after'][project_name]
+        azd.load_relations(*config['previous_outputs'])
+    # work items are read in windows and batches of ids, revisions optionally in bulk
+    azd.wiql_window_size = config['work_items']['wiql_window_size']
+    azd.work_item_batch_size = config['work_items']['batch_size']
+    azd.work_item_workers = config['work_items']['workers']
+    azd.bulk_revisions = config['work_items']['bulk_revisions']
+    azd.mr_workers = config['merge_requests']['workers']
+    azd.build_page_size = config['pipelines']['page_size']
+    azd.release_page_size = config['releases']['page_size']
+    azd.release_workers = config['releases']['workers']
+    if config.get('streams'):
+        azd.enable_streaming(config['streams'], config['stream_batch_size'])
+    if checkpoints is not None:
+        if state is not None:
+            azd.restore_checkpoint(state)
+        azd.enable_checkpoints(checkpoints, project_name)
+    events = azd.get_all_events(config['get_all_events_order'], config['production_run'])
+    result = {'event_logs': events, 'issue_list': azd.issue_list, 'mr_list': azd.mr_list, 'pl_list': azd.pl_list,
+              'rel_list': azd.rel_list, 'commit_list': azd.commit_list, 'user_ref': azd.user_ref}
+    if checkpoints is not None:
+        # results of completed projects are kept, so that a resumed run does not extract them again
+        checkpoints.save(project_name, {'result': result})
+    if multiprocessing.parent_process() is not None:
+        # metrics of worker processes are merged into the ones of the main process
+        result['metrics'] = RunMetrics.get().take()
+    return result
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Extracts azure devops events of the projects in AZD_PROJECT_NAMES')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue a failed run from its checkpoints, completed work is not extracted again')
+    args = parser.parse_args()
     # ===== configurations ============
     # read main config
-    with open('../common/settings.json', 'r') as settings_file:
-        settings = json.load(settings_file)['azure_devops']
+    settings = LMPUtils.load_settings('azure_devops')
     # read config from environment vars
     AZD_base_url = os.environ['AZD_BASE_URL']
     AZD_private_token = os.environ['AZD_PRIVATE_TOKEN']
@@ -34,7 +96,7 @@ if __name__ == '__main__':
     # ======= start of code ===============
     # ----- running code ------------
     # initialize global var
-    event_logs = []
+    event_logs = EventBuffer()
     issue_list = []
     mr_list = []
     pl_list = []
@@ -46,45 +108,154 @@ if __name__ == '__main__':
     logger = logging.getLogger('scriptLogger')
     # iterate over project ids - as generally single 'project' has multiple AZD 'projects'
     # you can get project id by going to project id page and click on right hand side context menu
-    for project_id in AZD_project_id_list:
-        azd = AZDConnector(AZD_base_url, AZD_private_token, project_id, external_issue_ref_regex,
-                           settings['case_type_prefixes'])
-        events = azd.get_all_events(settings['get_all_events_order'], production_run)
-        event_logs.extend(events)
-        issue_list.extend(azd.issue_list)
-        mr_list.extend(azd.mr_list)
-        pl_list.extend(azd.pl_list)
-        rel_list.extend(azd.rel_list)
-        commit_list.extend(azd.commit_list)
-        # dictionary merge
-        user_dict = {**user_dict, **azd.user_ref}
-    logger.info('====== Saving data======')
+    project_config = {'base_url': AZD_base_url, 'private_token': AZD_private_token,
+                      'ext_issue_ref_regex': external_issue_ref_regex,
+                      'case_type_prefixes': settings['case_type_prefixes'],
+                      'get_all_events_order': settings['get_all_events_order'],
+                      'production_run': production_run, 'http': settings['http'],
+                      'incremental': settings['incremental']['enabled'], 'work_items': settings['work_items'],
+                      'merge_requests': settings['merge_requests'], 'pipelines': settings['pipelines'],
+                      'releases': settings['releases']}
+    # codec, categorical columns and layout of the outputs
+    output = OutputEngine.from_settings(settings['output'])
+    # incremental runs only read entities updated after the last successful run of each project
+    incremental = settings['incremental']
+    run_started = WatermarkState.now()
+    watermarks = WatermarkState(incremental['state_file'], incremental['overlap_minutes'])
+    # merge keys are used to upsert records into existing outputs
+    event_keys = None
+    entity_keys = None
+    if incremental['enabled']:
+        logger.info('incremental run, state file: ' + incremental['state_file'])
+        project_config['updated_after'] = {}
+        for project in AZD_project_id_list:
+            project_config['updated_after'][project] = watermarks.get('azure_devops', project)
+        project_config['previous_outputs'] = (DevOpsConnector.load_df('AZD_issues_' + parquet_suffix, output),
+                                              DevOpsConnector.load_df('AZD_MRs_' + parquet_suffix, output),
+                                              DevOpsConnector.load_df('AZD_commits_' + parquet_suffix, output))
+        # event ids are not unique on their own, ex: release completed events share the definition id
+        event_keys = ['id', 'action', 'time']
+        entity_keys = ['id', 'project_id']
     preserve_timezone = settings['preserve_timezone']
-    # stub devops connector. this is a hack as glc connector is not available outside the loop
-    devops = DevOpsConnector('AZD', 1)
-    # converting to pandas dataframes
-    event_df = pd.DataFrame(event_logs)
-    devops.publish_df(event_df, ['time'], preserve_timezone,  'event_logs',
-                      'AZD_event_log_' + parquet_suffix)
-    # use pm4py.format_dataframe and then pm4py.convert_to_event_log to convert this to an event log
-    # please use utils/process_mining.py for this task
-    issue_df = pd.DataFrame(issue_list)
-    devops.publish_df(issue_df, ['created_time'], preserve_timezone,  'issues',
-                      'AZD_issues_' + parquet_suffix)
-    mr_df = pd.DataFrame(mr_list)
-    devops.publish_df(mr_df, ['created_time'], preserve_timezone,
-                      'merge requests', 'AZD_MRs_' + parquet_suffix)
-    commit_df = pd.DataFrame(commit_list)
-    devops.publish_df(commit_df, ['created_time'], preserve_timezone,  'commits',
-                      'AZD_commits_' + parquet_suffix)
-    pl_df = pd.DataFrame(pl_list)
-    devops.publish_df(pl_df, ['created_time'], preserve_timezone,
-                      'pipelines', 'AZD_pipelines_' + parquet_suffix)
-    rel_df = pd.DataFrame(rel_list)
-    devops.publish_df(rel_df, ['created_time'], preserve_timezone,
-                      'releases', 'AZD_releases_' + parquet_suffix)
+    # streaming writes events and entity records in batches during extraction, keeping memory usage flat
+    streaming = settings['streaming']
+    streams = {}
+    if streaming['enabled']:
+        if incremental['enabled']:
+            logger.warning('streaming is disabled for incremental runs, as outputs need to be merged at the end')
+        else:
+            if output.partitioned or output.arrow_ipc:
+                logger.warning('partitioned and arrow ipc outputs are not streamed, a single parquet file is written')
+            streams['events'] = ParquetStreamWriter('AZD_event_log_' + parquet_suffix, ['time'],
+                                                    preserve_timezone, output)
+            streams['issue_list'] = ParquetStreamWriter('AZD_issues_' + parquet_suffix,
+                                                        ['created_time'], preserve_timezone, output)
+            streams['mr_list'] = ParquetStreamWriter('AZD_MRs_' + parquet_suffix,
+                                                     ['created_time'], preserve_timezone, output)
+            streams['commit_list'] = ParquetStreamWriter('AZD_commits_' + parquet_suffix,
+                                                         ['created_time'], preserve_timezone, output)
+            streams['pl_list'] = ParquetStreamWriter('AZD_pipelines_' + parquet_suffix,
+                                                     ['created_time'], preserve_timezone, output)
+            streams['rel_list'] = ParquetStreamWriter('AZD_releases_' + parquet_suffix,
+                                                      ['created_time'], preserve_timezone, output)
+            project_config['streams'] = streams
+            project_config['stream_batch_size'] = streaming['batch_size']
+    # checkpoints of each project are saved during extraction, so that a failed run can be resumed
+    checkpoint = settings['checkpoint']
+    checkpoints = None
+    if checkpoint['enabled'] or args.resume:
+        if streams:
+            logger.warning('checkpoints are disabled for streamed runs, as streamed outputs cannot be resumed')
+        else:
+            checkpoints = CheckpointStore(checkpoint['directory'], 'azure_devops', checkpoint['interval_seconds'])
+            run_state = checkpoints.load(CheckpointStore.run_key) if args.resume else None
+            if run_state is None:
+                # checkpoints of an earlier run are not used unless resuming
+                checkpoints.clear()
+                checkpoints.save(CheckpointStore.run_key, {'run_started': run_started})
+            else:
+                # watermarks are set to the start of the failed run, work completed before it is not read again
+                run_started = run_state['run_started']
+            project_config['checkpoints'] = checkpoints
+            project_config['resume'] = run_state is not None
+    # projects can be extracted in parallel, results are still merged in the order of the project name list
+    workers = settings['parallel']['workers']
+    pool_type = settings['parallel']['pool']
+    if streams and (workers > 1 or pool_type == 'process'):
+        # projects share the stream writers, rows of parallel projects would be written in the order batches fill
+        logger.warning('projects are extracted one at a time in this process when streaming, so that streamed rows '
+                       'follow the order of the project list')
+        workers = 1
+        pool_type = 'thread'
+    logger.info('extracting ' + str(len(AZD_project_id_list)) + ' projects using ' + str(workers) + ' '
+                + pool_type + ' worker(s)')
+    if pool_type != 'process':
+        # connection and its cached clients are shared by all connectors of the organization
+        # connections cannot be passed to worker processes, hence each process creates its own
+        # a single transport per organization, so that its session pool and response cache are shared
+        project_config['connection'] = AZDConnector.create_connection(AZD_base_url, AZD_private_token,
+                                                                      settings['http'])
+    results = LMPUtils.ordered_map(partial(extract_project, config=project_config), AZD_project_id_list,
+                                   workers, pool_type, init_worker if pool_type == 'process' else None)
+    try:
+        for result in results:
+            event_logs.extend(result['event_logs'])
+            issue_list.extend(result['issue_list'])
+            mr_list.extend(result['mr_list'])
+            pl_list.extend(result['pl_list'])
+            rel_list.extend(result['rel_list'])
+            commit_list.extend(result['commit_list'])
+            if 'metrics' in result:
+                RunMetrics.get().merge(result['metrics'])
+            # dictionary merge
+            user_dict = {**user_dict, **result['user_ref']}
+    finally:
+        # footer is written even if the run fails, so that already streamed records can be read
+        for writer in streams.values():
+            writer.close()
+    for cache in ResponseCache.instances.values():
+        logger.info(cache.summary())
+    logger.info('====== Saving data======')
+    if streams:
+        logger.info('outputs were streamed during extraction, skipping dataframe creation')
+    else:
+        # stub devops connector. this is a hack as glc connector is not available outside the loop
+        devops = DevOpsConnector('AZD', 1)
+        devops.output = output
+        # converting to pandas dataframes
+        event_df = event_logs.to_dataframe()
+        devops.publish_df(event_df, ['time'], preserve_timezone,  'event_logs',
+                          'AZD_event_log_' + parquet_suffix, event_keys)
+        # use pm4py.format_dataframe and then pm4py.convert_to_event_log to convert this to an event log
+        # please use utils/process_mining.py for this task
+        issue_df = pd.DataFrame(issue_list)
+        devops.publish_df(issue_df, ['created_time'], preserve_timezone,  'issues',
+                          'AZD_issues_' + parquet_suffix, entity_keys)
+        mr_df = pd.DataFrame(mr_list)
+        devops.publish_df(mr_df, ['created_time'], preserve_timezone,
+                          'merge requests', 'AZD_MRs_' + parquet_suffix, entity_keys)
+        commit_df = pd.DataFrame(commit_list)
+        devops.publish_df(commit_df, ['created_time'], preserve_timezone,  'commits',
+                          'AZD_commits_' + parquet_suffix, entity_keys)
+        pl_df = pd.DataFrame(pl_list)
+        devops.publish_df(pl_df, ['created_time'], preserve_timezone,
+                          'pipelines', 'AZD_pipelines_' + parquet_suffix, entity_keys)
+        rel_df = pd.DataFrame(rel_list)
+        devops.publish_df(rel_df, ['created_time'], preserve_timezone,
+                          'releases', 'AZD_releases_' + parquet_suffix, entity_keys)
     # dump user data
     # TODO: there's no implementation for this to be useful yet
     json_file = open(user_json_dump, "w")
     json.dump(user_dict, json_file)
-
+    if incremental['enabled']:
+        # watermarks are only moved once all outputs are saved
+        for project in AZD_project_id_list:
+            watermarks.set('azure_devops', project, run_started)
+        watermarks.save()
+    if checkpoints is not None:
+        # outputs are saved, a later run starts from scratch
+        checkpoints.clear()
+    # api call, stage and memory metrics of the run, for tracking performance across runs
+    metrics = settings['metrics']
+    if metrics['enabled']:
+        RunMetrics.get().write('azure_devops', metrics['json_file'], metrics['prometheus_file'])
@@ -0,0 +1,200 @@
+import argparse
+import contextlib
+import logging.config
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+sys.path.insert(0, '../common')
+from DevOpsConnector import DevOpsConnector
+from LMPUtils import LMPUtils
+from OutputEngine import OutputEngine
+from RunMetrics import RunMetrics
+from stub_servers import GitlabStub, JiraStub, AZDStub
+from synthetic_data import gitlab_data, jira_data, azure_devops_data
+from output_engine_benchmark import path_size
+
+SOURCES = ['gitlab', 'jira', 'azure_devops']
+EXTERNAL_ISSUE_REGEX = '(BENCH-[0-9]+)'
+
+
+def load_settings(source: str) -> dict:
+    """Connectors are configured the same way as the loggers, using common/settings.json"""
+    return LMPUtils.load_settings(source)
+
+
+def publish(source: str, settings: dict, work_dir: str, frames: list):
+    """Saves outputs the same way as the loggers. frames - (dataframe, time columns, name) tuples"""
+    devops = DevOpsConnector(source, 0)
+    devops.output = OutputEngine.from_settings(settings['output'])
+    # publish_df prints a glance of each dataframe, which is not part of the measurement
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for df, time_columns, name in frames:
+            devops.publish_df(df, time_columns, settings['preserve_timezone'], name,
+                              os.path.join(work_dir, source + '_' + name + '_benchmark'))
+
+
+def extract_gitlab(url: str, settings: dict, work_dir: str) -> int:
+    """Runs the project extraction of gitlab_logger against the stub, gives the number of events"""
+    sys.path.insert(0, '../gitlab')
+    from gitlab_logger import extract_project
+    config = {'base_url': url, 'private_token': 'benchmark', 'ext_issue_ref_regex': EXTERNAL_ISSUE_REGEX,
+              'case_type_prefixes': settings['case_type_prefixes'],
+              'get_all_events_order': settings['get_all_events_order'], 'production_run': True,
+              'http': settings['http'], 'incremental': False, 'user_email_map': {},
+              'pipelines': settings['pipelines'], 'issues': settings['issues']}
+    result = extract_project('1', config)
+    if 'metrics' in result:
+        RunMetrics.get().merge(result['metrics'])
+    publish('gitlab', settings, work_dir,
+            [(result['event_logs'].to_dataframe(), ['time'], 'event_log'),
+             (pd.DataFrame(result['issue_list']), ['created_time', 'updated_time'], 'issues'),
+             (pd.DataFrame(result['mr_list']), ['created_time', 'updated_time'], 'MRs'),
+             (pd.DataFrame(result['commit_list']), ['created_time'], 'commits'),
+             (pd.DataFrame(result['pl_list']), ['created_time', 'updated_time'], 'pipelines')])
+    return len(result['event_logs'])
+
+
+def extract_jira(url: str, settings: dict, work_dir: str) -> int:
+    """Reads issues via jql search the same way as jira_logger, gives the number of events. api delay is not
+    applied, requests are only paced by the requests_per_second setting"""
+    sys.path.insert(0, '../jira')
+    from jiraConnector import JiraConnector
+    jira_connector = JiraConnector(url, 'benchmark', 'default', 'benchmark@example.com', 0,
+                                   settings['api']['requests_per_second'], settings['http'])
+    jira_connector.page_size = settings['api']['page_size']
+    if settings['users']['bulk']:
+        jira_connector.user_bulk_size = settings['users']['accounts_per_request']
+    if settings['changelog']['bulk']:
+        jira_connector.changelog_bulk_size = settings['changelog']['issues_per_request']
+        jira_connector.changelog_bulk_page_size = settings['changelog']['page_size']
+    jql = settings['issue_source']['jql'].format(project='BENCH')
+    jira_connector.get_issues_via_search(jql, settings['issue_source']['page_size'],
+                                         settings['issue_source']['token_paging'], settings['api']['workers'])
+    jira_connector.resolve_accounts()
+    publish('jira', settings, work_dir,
+            [(pd.DataFrame(jira_connector.issue_list), ['created'], 'issues'),
+             (jira_connector.events.to_dataframe(), ['time'], 'event_logs')])
+    return len(jira_connector.events)
+
+
+def extract_azure_devops(url: str, settings: dict, work_dir: str) -> int:
+    """Runs the project extraction of azd_logger against the stub, gives the number of events"""
+    # resource locations are cached on disk by the sdk, each run starts without them
+    os.environ['AZURE_DEVOPS_CACHE_DIR'] = tempfile.mkdtemp()
+    sys.path.insert(0, '../azure_devops')
+    from azd_logger import extract_project
+    config = {'base_url': url, 'private_token': 'benchmark', 'ext_issue_ref_regex': EXTERNAL_ISSUE_REGEX,
+              'case_type_prefixes': settings['case_type_prefixes'],
+              'get_all_events_order': settings['get_all_events_order'], 'production_run': True,
+              'http': settings['http'], 'incremental': False, 'work_items': settings['work_items'],
+              'merge_requests': settings['merge_requests'], 'pipelines': settings['pipelines'],
+              'releases': settings['releases']}
+    result = extract_project('benchmark', config)
+    if 'metrics' in result:
+        RunMetrics.get().merge(result['metrics'])
+    publish('azure_devops', settings, work_dir,
+            [(result['event_logs'].to_dataframe(), ['time'], 'event_log'),
+             (pd.DataFrame(result['issue_list']), ['created_time', 'updated_time'], 'issues'),
+             (pd.DataFrame(result['mr_list']), ['created_time'], 'MRs'),
+             (pd.DataFrame(result['commit_list']), ['created_time'], 'commits'),
+             (pd.DataFrame(result['pl_list']), ['created_time'], 'pipelines'),
+             (pd.DataFrame(result['rel_list']), ['created_time'], 'releases')])
+    return len(result['event_logs'])
+
+
+EXTRACTORS = {'gitlab': extract_gitlab, 'jira': extract_jira, 'azure_devops': extract_azure_devops}
+
+
+def measure(source: str, url: str, log_level: str) -> dict:
+    """Runs in a fresh process, so that peak memory and imports of each source are measured on their own"""
+    logging.config.fileConfig('../common/logging.conf')
+    # root logger gives the logs of client libraries
+    for logger_name in ['scriptLogger', None]:
+        logging.getLogger(logger_name).setLevel(log_level)
+    settings = load_settings(source)
+    with tempfile.TemporaryDirectory() as work_dir:
+        begin = time.perf_counter()
+        events = EXTRACTORS[source](url, settings, work_dir)
+        wall_time = time.perf_counter() - begin
+        output_size = path_size(work_dir)
+    endpoints = RunMetrics.get().to_dict()['endpoints']
+    return {'wall_s': wall_time, 'events': events, 'retries': sum(endpoint['retries'] for endpoint in endpoints),
+            'peak_rss_mb': RunMetrics.peak_memory() / 1024 / 1024, 'output_mb': output_size / 1024 / 1024}
+
+
+def start_stub(source: str, args: argparse.Namespace):
+    """Starts the stub server of a source with its synthetic data, gives the server and the url to connect to"""
+    stub_options = {'latency': args.latency_ms / 1000, 'throttle_every': args.throttle_every,
+                    'retry_after': args.retry_after}
+    if source == 'gitlab':
+        server = GitlabStub(gitlab_data(args.issues, args.merge_requests, args.commits, args.pipelines, args.jobs,
+                                        seed=args.seed), **stub_options)
+        return server.start(), server.url
+    if source == 'jira':
+        server = JiraStub(None, **stub_options)
+        # issue links in descriptions and comments refer to the url of the server
+        server.data = jira_data(server.url, args.issues, args.comments, args.changes, seed=args.seed)
+        return server.start(), server.url
+    server = AZDStub(azure_devops_data(args.work_items, args.revisions, args.merge_requests, args.commits,
+                                       args.pipelines, args.releases, seed=args.seed), **stub_options)
+    return server.start(), server.organization_url
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measures end to end extraction of the connectors against local '
+                                                 'stub servers serving synthetic data')
+    parser.add_argument('--sources', nargs='+', choices=SOURCES, default=SOURCES)
+    parser.add_argument('--issues', type=int, default=1000, help='gitlab and jira issues')
+    parser.add_argument('--merge-requests', type=int, default=500, help='gitlab MRs and azure devops PRs')
+    parser.add_argument('--commits', type=int, default=3, help='commits per MR or PR')
+    parser.add_argument('--pipelines', type=int, default=500, help='gitlab pipelines and azure devops builds')
+    parser.add_argument('--jobs', type=int, default=3, help='jobs per gitlab pipeline')
+    parser.add_argument('--releases', type=int, default=100, help='azure devops releases')
+    parser.add_argument('--work-items', type=int, default=1000, help='azure devops work items')
+    parser.add_argument('--revisions', type=int, default=4, help='revisions per work item')
+    parser.add_argument('--comments', type=int, default=5, help='comments per jira issue')
+    parser.add_argument('--changes', type=int, default=4, help='changelog histories per jira issue')
+    parser.add_argument('--latency-ms', type=float, default=0, help='delay of each stub response')
+    parser.add_argument('--throttle-every', type=int, default=0,
+                        help='answer every n-th request with 429, 0 never throttles')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds of throttled responses')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per source, best run is reported')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--log-level', default='WARNING', help='level of the connector logs')
+    parser.add_argument('--save', help='json file to save the results to, to be used as a baseline later')
+    parser.add_argument('--baseline', help='results saved by an earlier run, speedups are reported against it')
+    args = parser.parse_args()
+
+    rows = []
+    # spawned workers do not inherit the stub server threads of this process
+    context = multiprocessing.get_context('spawn')
+    for source in args.sources:
+        server, url = start_stub(source, args)
+        best = None
+        try:
+            for _ in range(args.repeat):
+                server.reset_counters()
+                with ProcessPoolExecutor(1, mp_context=context) as executor:
+                    result = executor.submit(measure, source, url, args.log_level).result()
+                result.update({'requests': server.request_count, 'throttled': server.throttled_count})
+                if best is None or result['wall_s'] < best['wall_s']:
+                    best = result
+        finally:
+            server.stop()
+        best['requests_per_s'] = best['requests'] / best['wall_s']
+        rows.append({'source': source, **best})
+        print(source + ': ' + str(round(best['wall_s'], 2)) + 's, ' + str(best['requests']) + ' requests')
+    result_df = pd.DataFrame(rows)[['source', 'wall_s', 'requests', 'throttled', 'retries', 'requests_per_s',
+                                    'events', 'peak_rss_mb', 'output_mb']]
+    if args.baseline is not None:
+        baseline_df = pd.read_json(args.baseline)[['source', 'wall_s']].rename(columns={'wall_s': 'baseline_s'})
+        result_df = result_df.merge(baseline_df, on='source', how='left')
+        result_df['speedup'] = result_df['baseline_s'] / result_df['wall_s']
+    if args.save is not None:
+        result_df.to_json(args.save, orient='records', indent=2)
+    with pd.option_context('display.width', 160, 'display.float_format', '{:.3f}'.format):
+        print(result_df.to_string(index=False))
@@ -0,0 +1,131 @@
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import pandas as pd
+import pyarrow.feather as feather
+sys.path.insert(0, '../common')
+from EventBuffer import EventBuffer
+from OutputEngine import OutputEngine
+
+# codec, compression level, categorical columns. first entry is the current default output
+CONFIGURATIONS = [('gzip', None, []),
+                  ('gzip', None, ['action', 'ns', 'user', 'local_case']),
+                  ('snappy', None, ['action', 'ns', 'user', 'local_case']),
+                  ('lz4', None, ['action', 'ns', 'user', 'local_case']),
+                  ('zstd', 1, ['action', 'ns', 'user', 'local_case']),
+                  ('zstd', 3, ['action', 'ns', 'user', 'local_case']),
+                  ('zstd', 9, ['action', 'ns', 'user', 'local_case'])]
+
+
+def synthetic_events(count: int, seed: int = 42) -> pd.DataFrame:
+    """Event log shaped like the connector outputs, with low cardinality action, user and ns columns"""
+    rng = random.Random(seed)
+    actions = ['gl_issue_created', 'gl_issue_closed', 'gl_mr_created', 'gl_mr_merged', 'gl_commit', 'gl_pl_success',
+               'gl_pl_failed', 'gl_mr_comment', 'gl_issue_comment', 'gl_branch_created']
+    users = ['user' + str(i) for i in range(200)]
+    projects = ['project' + str(i) for i in range(8)]
+    events = EventBuffer()
+    start = 1672531200
+    for i in range(count):
+        case_number = rng.randint(1, count // 20 + 1)
+        events.append({'id': str(i), 'action': rng.choice(actions),
+                       'time': pd.Timestamp(start + i * 60, unit='s', tz='UTC').isoformat(),
+                       'case': 'GLI' + str(case_number), 'user': rng.choice(users),
+                       'local_case': 'MR' + str(case_number),
+                       'info1': '', 'info2': 'sha' + str(rng.getrandbits(64)), 'ns': rng.choice(projects),
+                       'duration': rng.randint(0, 3600)})
+    df = events.to_dataframe()
+    df['time'] = pd.to_datetime(df['time'], utc=True).dt.tz_localize(None)
+    return df
+
+
+def path_size(path: str) -> int:
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+    return os.path.getsize(path)
+
+
+def measure(df: pd.DataFrame, output: OutputEngine, work_dir: str, repeat: int) -> dict:
+    """Best of the given number of runs, for writing and reading back the output"""
+    file_path_name = os.path.join(work_dir, 'events')
+    if not output.categorical_columns:
+        # earlier outputs were written with plain string columns
+        df = df.astype({column: object for column in df.columns if isinstance(df[column].dtype, pd.CategoricalDtype)})
+    write_times = []
+    read_times = []
+    paths = []
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        paths = output.write(df.copy(), file_path_name, ['time'])
+        write_times.append(time.perf_counter() - begin)
+        begin = time.perf_counter()
+        pd.read_parquet(paths[0])
+        read_times.append(time.perf_counter() - begin)
+    result = {'write_s': min(write_times), 'size_mb': path_size(paths[0]) / 1024 / 1024, 'read_s': min(read_times)}
+    for path in paths:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    return result
+
+
+def measure_arrow_ipc(df: pd.DataFrame, work_dir: str, repeat: int) -> dict:
+    """Uncompressed arrow ipc file, read back memory mapped"""
+    arrow_filename = os.path.join(work_dir, 'events' + OutputEngine.arrow_extension)
+    output = OutputEngine('none', None, ['action', 'ns', 'user', 'local_case'])
+    df = output.to_categorical(df.copy())
+    write_times = []
+    read_times = []
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        feather.write_feather(df, arrow_filename, compression='uncompressed')
+        write_times.append(time.perf_counter() - begin)
+        begin = time.perf_counter()
+        feather.read_table(arrow_filename, memory_map=True)
+        read_times.append(time.perf_counter() - begin)
+    result = {'write_s': min(write_times), 'size_mb': path_size(arrow_filename) / 1024 / 1024,
+              'read_s': min(read_times)}
+    os.remove(arrow_filename)
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compares write time, file size and read time of output formats')
+    parser.add_argument('--input', help='existing event log parquet file, synthetic events are used if not given')
+    parser.add_argument('--events', type=int, default=500000, help='number of synthetic events')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per configuration, best run is reported')
+    parser.add_argument('--partitioned', action='store_true', help='also measure hive partitioned datasets')
+    args = parser.parse_args()
+
+    if args.input is not None:
+        event_df = pd.read_parquet(args.input)
+    else:
+        event_df = synthetic_events(args.events)
+    print('events: ' + str(len(event_df)))
+    rows = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for compression, level, categorical_columns in CONFIGURATIONS:
+            engine = OutputEngine(compression, level, categorical_columns)
+            row = {'format': compression + ('' if level is None else '-' + str(level)),
+                   'categorical': bool(categorical_columns)}
+            row.update(measure(event_df, engine, temp_dir, args.repeat))
+            rows.append(row)
+            if args.partitioned:
+                engine.partitioned = True
+                row = {'format': row['format'] + ' dataset', 'categorical': bool(categorical_columns)}
+                row.update(measure(event_df, engine, temp_dir, args.repeat))
+                rows.append(row)
+        row = {'format': 'arrow ipc (mmap)', 'categorical': True}
+        row.update(measure_arrow_ipc(event_df, temp_dir, args.repeat))
+        rows.append(row)
+    result_df = pd.DataFrame(rows)
+    baseline = result_df.iloc[0]
+    result_df['write_speedup'] = baseline['write_s'] / result_df['write_s']
+    result_df['read_speedup'] = baseline['read_s'] / result_df['read_s']
+    with pd.option_context('display.width', 160, 'display.float_format', '{:.3f}'.format):
+        print(result_df.to_string(index=False))
@@ -0,0 +1,492 @@
+import json
+import re
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    # keep-alive, so that connection pooling of the clients is measured as well
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        # requests are counted by the server instead of being logged
+        pass
+
+    def do_GET(self):
+        self.server.dispatch(self, 'GET')
+
+    def do_POST(self):
+        self.server.dispatch(self, 'POST')
+
+    def do_OPTIONS(self):
+        self.server.dispatch(self, 'OPTIONS')
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # (method, path regex, name of the method answering the request), subclasses define their routes
+    routes = []
+
+    def __init__(self, data: dict = None, latency: float = 0, throttle_every: int = 0, retry_after: int = 1):
+        """Local http server answering a subset of a rest api from synthetic data. Each request is delayed by
+        latency seconds, and every throttle_every'th request is answered with 429 and Retry-After"""
+        super().__init__(('127.0.0.1', 0), StubRequestHandler)
+        self.data = data
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.compiled_routes = [(method, re.compile(pattern), name) for method, pattern, name in self.routes]
+        self.counter_lock = threading.Lock()
+        self.request_count = 0
+        self.throttled_count = 0
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        return 'http://127.0.0.1:' + str(self.server_address[1])
+
+    def start(self) -> 'StubServer':
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def reset_counters(self):
+        with self.counter_lock:
+            self.request_count = 0
+            self.throttled_count = 0
+
+    def dispatch(self, handler: StubRequestHandler, method: str):
+        parsed = urlparse(handler.path)
+        query = parse_qs(parsed.query)
+        length = int(handler.headers.get('Content-Length', 0))
+        body = json.loads(handler.rfile.read(length)) if length > 0 else None
+        with self.counter_lock:
+            self.request_count += 1
+            throttled = self.throttle_every > 0 and self.request_count % self.throttle_every == 0
+            if throttled:
+                self.throttled_count += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+        if throttled:
+            self.respond(handler, 429, {'message': 'rate limit exceeded'}, {'Retry-After': str(self.retry_after)})
+            return
+        for route_method, pattern, name in self.compiled_routes:
+            match = pattern.match(parsed.path)
+            if route_method == method and match is not None:
+                status, payload, headers = getattr(self, name)(handler, match, query, body)
+                self.respond(handler, status, payload, headers)
+                return
+        self.respond(handler, 404, {'message': 'not found: ' + method + ' ' + parsed.path}, {})
+
+    @classmethod
+    def respond(cls, handler: StubRequestHandler, status: int, payload, headers: dict):
+        content = json.dumps(payload).encode()
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json; charset=utf-8')
+        handler.send_header('Content-Length', str(len(content)))
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(content)
+
+    @classmethod
+    def param(cls, query: dict, name: str, default=None):
+        values = query.get(name)
+        if not values:
+            return default
+        return values[0]
+
+    @classmethod
+    def int_param(cls, query: dict, name: str, default: int) -> int:
+        return int(cls.param(query, name, default))
+
+
+class GitlabStub(StubServer):
+    routes = [('GET', r'^/api/v4/user$', 'get_user'),
+              ('GET', r'^/api/v4/projects/(\d+)$', 'get_project'),
+              ('GET', r'^/api/v4/projects/(\d+)/pipelines$', 'list_pipelines'),
+              ('GET', r'^/api/v4/projects/(\d+)/pipelines/(\d+)$', 'get_pipeline'),
+              ('GET', r'^/api/v4/projects/(\d+)/pipelines/(\d+)/jobs$', 'list_pipeline_jobs'),
+              ('GET', r'^/api/v4/projects/(\d+)/jobs$', 'list_jobs'),
+              ('GET', r'^/api/v4/projects/(\d+)/repository/branches$', 'list_branches'),
+              ('GET', r'^/api/v4/projects/(\d+)/merge_requests$', 'list_merge_requests'),
+              ('GET', r'^/api/v4/projects/(\d+)/merge_requests/(\d+)/commits$', 'list_mr_commits'),
+              ('GET', r'^/api/v4/projects/(\d+)/issues$', 'list_issues'),
+              ('GET', r'^/api/v4/projects/(\d+)/issues/(\d+)/notes$', 'list_notes'),
+              ('GET', r'^/api/v4/projects/(\d+)/issues/(\d+)/closed_by$', 'list_closed_by'),
+              ('POST', r'^/api/graphql$', 'graphql')]
+    # attributes of a pipeline which are only given by the pipeline api, not by the list api
+    pipeline_detail_keys = ['user', 'before_sha', 'finished_at', 'duration']
+
+    def offset_page(self, handler: StubRequestHandler, query: dict, items: list) -> tuple:
+        """Page of a list using page and per_page, with the pagination headers and next link of gitlab"""
+        page = self.int_param(query, 'page', 1)
+        per_page = min(self.int_param(query, 'per_page', 20), 100)
+        total_pages = max(1, -(-len(items) // per_page))
+        headers = {'X-Page': str(page), 'X-Per-Page': str(per_page), 'X-Total': str(len(items)),
+                   'X-Total-Pages': str(total_pages), 'X-Next-Page': '', 'X-Prev-Page': str(page - 1) if page > 1
+                   else ''}
+        if page < total_pages:
+            headers['X-Next-Page'] = str(page + 1)
+            headers['Link'] = self.link(handler, query, {'page': str(page + 1)})
+        return 200, items[(page - 1) * per_page:page * per_page], headers
+
+    def link(self, handler: StubRequestHandler, query: dict, changes: dict) -> str:
+        next_query = {name: values for name, values in query.items()}
+        next_query.update({name: [value] for name, value in changes.items()})
+        next_url = self.url + urlparse(handler.path).path + '?' + urlencode(next_query, doseq=True)
+        return '<' + next_url + '>; rel="next"'
+
+    def get_user(self, handler, match, query, body) -> tuple:
+        user = self.data['users'][0]
+        return 200, {'id': user['id'], 'username': user['username'], 'name': user['name']}, {}
+
+    def get_project(self, handler, match, query, body) -> tuple:
+        if int(match.group(1)) != self.data['project']['id']:
+            return 404, {'message': '404 Project Not Found'}, {}
+        return 200, self.data['project'], {}
+
+    def list_pipelines(self, handler, match, query, body) -> tuple:
+        pipelines = [{key: value for key, value in pipeline.items() if key not in self.pipeline_detail_keys}
+                     for pipeline in reversed(self.data['pipelines'])]
+        return self.offset_page(handler, query, pipelines)
+
+    def get_pipeline(self, handler, match, query, body) -> tuple:
+        # pipeline ids are assigned in order starting from 1
+        return 200, self.data['pipelines'][int(match.group(2)) - 1], {}
+
+    def list_pipeline_jobs(self, handler, match, query, body) -> tuple:
+        pipeline_id = int(match.group(2))
+        jobs = [job for job in self.data['jobs'] if job['pipeline']['id'] == pipeline_id]
+        return self.offset_page(handler, query, jobs)
+
+    def list_jobs(self, handler, match, query, body) -> tuple:
+        scopes = query.get('scope[]', [])
+        jobs = [job for job in reversed(self.data['jobs']) if not scopes or job['status'] in scopes]
+        if self.param(query, 'pagination') != 'keyset':
+            return self.offset_page(handler, query, jobs)
+        # keyset pages continue from the last id of the previous page, no totals are given
+        per_page = min(self.int_param(query, 'per_page', 20), 100)
+        id_before = self.int_param(query, 'id_before', 0)
+        if id_before > 0:
+            jobs = [job for job in jobs if job['id'] < id_before]
+        page = jobs[:per_page]
+        headers = {}
+        if len(jobs) > per_page:
+            headers['Link'] = self.link(handler, query, {'id_before': str(page[-1]['id'])})
+        return 200, page, headers
+
+    def list_branches(self, handler, match, query, body) -> tuple:
+        return self.offset_page(handler, query, sorted(self.data['branches'], key=lambda branch: branch['name']))
+
+    def list_merge_requests(self, handler, match, query, body) -> tuple:
+        return self.offset_page(handler, query, self.data['merge_requests'][::-1])
+
+    def list_mr_commits(self, handler, match, query, body) -> tuple:
+        return self.offset_page(handler, query, self.data['commits'].get(int(match.group(2)), []))
+
+    def list_issues(self, handler, match, query, body) -> tuple:
+        return self.offset_page(handler, query, self.data['issues'][::-1])
+
+    def list_notes(self, handler, match, query, body) -> tuple:
+        return self.offset_page(handler, query, self.data['notes'].get(int(match.group(2)), []))
+
+    def list_closed_by(self, handler, match, query, body) -> tuple:
+        return 200, self.data['closed_by'].get(int(match.group(2)), []), {}
+
+    @classmethod
+    def graphql_user(cls, user: dict) -> dict:
+        return {'id': 'gid://gitlab/User/' + str(user['id']), 'name': user['name']}
+
+    @classmethod
+    def graphql_page(cls, items: list, first: int, after: str) -> tuple:
+        """Page of a connection, cursors are positions in the list"""
+        start = int(after) if after else 0
+        end = start + first
+        return items[start:end], {'hasNextPage': end < len(items), 'endCursor': str(end)}
+
+    def graphql_notes(self, issue_iid: int, first: int, after: str = None) -> dict:
+        notes = [{'id': 'gid://gitlab/Note/' + str(note['id']), 'body': note['body'], 'system': note['system'],
+                  'createdAt': note['created_at'], 'author': self.graphql_user(note['author'])}
+                 for note in self.data['notes'].get(issue_iid, [])]
+        nodes, page_info = self.graphql_page(notes, first, after)
+        return {'pageInfo': page_info, 'nodes': nodes}
+
+    def graphql(self, handler, match, query, body) -> tuple:
+        """Answers the issues and notes queries of GitlabConnector, other queries are not supported"""
+        variables = body.get('variables') or {}
+        if 'issue(iid:' in body['query']:
+            notes = self.graphql_notes(int(variables['iid']), variables['first'], variables.get('after'))
+            return 200, {'data': {'project': {'issue': {'notes': notes}}}}, {}
+        issues, page_info = self.graphql_page(self.data['issues'][::-1], variables['first'], variables.get('after'))
+        nodes = [{'id': 'gid://gitlab/Issue/' + str(issue['id']), 'iid': str(issue['iid']), 'title': issue['title'],
+                  'description': issue['description'], 'createdAt': issue['created_at'],
+                  'updatedAt': issue['updated_at'], 'closedAt': issue['closed_at'], 'state': issue['state'],
+                  'type': issue['issue_type'].upper(), 'author': self.graphql_user(issue['author']),
+                  'notes': self.graphql_notes(issue['iid'], variables['notesFirst']),
+                  'closingMergeRequests': {'nodes': [{'mergeRequest': {'iid': str(link['iid'])}}
+                                                     for link in self.data['closed_by'].get(issue['iid'], [])]}}
+                 for issue in issues]
+        return 200, {'data': {'project': {'issues': {'pageInfo': page_info, 'nodes': nodes}}}}, {}
+
+
+class JiraStub(StubServer):
+    routes = [('GET', r'^/rest/api/3/search/jql$', 'search_by_token'),
+              ('GET', r'^/rest/api/3/search$', 'search_by_offset'),
+              ('GET', r'^/rest/api/3/issue/([A-Z][A-Z0-9]*-\d+)$', 'get_issue'),
+              ('GET', r'^/rest/api/3/issue/([A-Z][A-Z0-9]*-\d+)/changelog$', 'get_changelog'),
+              ('GET', r'^/rest/api/3/issue/([A-Z][A-Z0-9]*-\d+)/comment$', 'get_comments'),
+              ('POST', r'^/rest/api/3/changelog/bulkfetch$', 'bulk_changelog'),
+              ('GET', r'^/rest/api/3/user$', 'get_user'),
+              ('GET', r'^/rest/api/3/user/bulk$', 'get_users')]
+    # comments given within the issue fields, the rest is read using the comment api
+    comments_in_fields = 20
+    max_results = 100
+    bulk_max_results = 1000
+    user_max_results = 200
+
+    def __init__(self, data: dict = None, latency: float = 0, throttle_every: int = 0, retry_after: int = 1):
+        super().__init__(data, latency, throttle_every, retry_after)
+        self.issues_by_key = None
+
+    def issue(self, issue_key: str) -> dict | None:
+        if self.issues_by_key is None:
+            self.issues_by_key = {issue['key']: issue for issue in self.data['issues']}
+        return self.issues_by_key.get(issue_key)
+
+    def with_comments(self, issue: dict) -> dict:
+        comments = self.data['comments'].get(issue['key'], [])
+        fields = dict(issue['fields'])
+        fields['comment'] = {'comments': comments[:self.comments_in_fields], 'maxResults': self.comments_in_fields,
+                             'total': len(comments), 'startAt': 0}
+        return {**issue, 'fields': fields}
+
+    def search_by_token(self, handler, match, query, body) -> tuple:
+        """Issues are given in key order whatever the jql is"""
+        start = int(self.param(query, 'nextPageToken', 0))
+        end = start + min(self.int_param(query, 'maxResults', 50), self.max_results)
+        issues = [self.with_comments(issue) for issue in self.data['issues'][start:end]]
+        response = {'issues': issues, 'isLast': end >= len(self.data['issues'])}
+        if not response['isLast']:
+            response['nextPageToken'] = str(end)
+        return 200, response, {}
+
+    def search_by_offset(self, handler, match, query, body) -> tuple:
+        start = self.int_param(query, 'startAt', 0)
+        max_results = min(self.int_param(query, 'maxResults', 50), self.max_results)
+        issues = [self.with_comments(issue) for issue in self.data['issues'][start:start + max_results]]
+        return 200, {'issues': issues, 'startAt': start, 'maxResults': max_results,
+                     'total': len(self.data['issues'])}, {}
+
+    def get_issue(self, handler, match, query, body) -> tuple:
+        issue = self.issue(match.group(1))
+        if issue is None:
+            return 404, {'errorMessages': ['Issue does not exist or you do not have permission to see it.']}, {}
+        return 200, self.with_comments(issue), {}
+
+    def get_changelog(self, handler, match, query, body) -> tuple:
+        histories = self.data['changelogs'].get(match.group(1), [])
+        start = self.int_param(query, 'startAt', 0)
+        max_results = min(self.int_param(query, 'maxResults', 50), self.max_results)
+        values = histories[start:start + max_results]
+        return 200, {'values': values, 'startAt': start, 'maxResults': max_results, 'total': len(histories),
+                     'isLast': start + max_results >= len(histories)}, {}
+
+    def get_comments(self, handler, match, query, body) -> tuple:
+        comments = self.data['comments'].get(match.group(1), [])
+        start = self.int_param(query, 'startAt', 0)
+        max_results = min(self.int_param(query, 'maxResults', 50), self.max_results)
+        return 200, {'comments': comments[start:start + max_results], 'startAt': start, 'maxResults': max_results,
+                     'total': len(comments)}, {}
+
+    def bulk_changelog(self, handler, match, query, body) -> tuple:
+        """Histories of the requested issues are paged together, an issue may span pages"""
+        histories = []
+        for id_or_key in body['issueIdsOrKeys']:
+            issue = self.issue(id_or_key)
+            if issue is None:
+                issue = next((issue for issue in self.data['issues'] if issue['id'] == str(id_or_key)), None)
+            if issue is not None:
+                histories += [(issue['id'], history) for history in self.data['changelogs'].get(issue['key'], [])]
+        start = int(body.get('nextPageToken', 0))
+        end = start + min(body.get('maxResults', self.bulk_max_results), self.bulk_max_results)
+        change_logs = {}
+        for issue_id, history in histories[start:end]:
+            change_logs.setdefault(issue_id, []).append(history)
+        response = {'issueChangeLogs': [{'issueId': issue_id, 'changeHistories': issue_histories}
+                                        for issue_id, issue_histories in change_logs.items()]}
+        if end < len(histories):
+            response['nextPageToken'] = str(end)
+        return 200, response, {}
+
+    def get_user(self, handler, match, query, body) -> tuple:
+        user = self.data['users'].get(self.param(query, 'accountId'))
+        if user is None:
+            return 404, {'errorMessages': ['user not found']}, {}
+        return 200, user, {}
+
+    def get_users(self, handler, match, query, body) -> tuple:
+        # unknown account ids are left out, as done by jira
+        users = [self.data['users'][account_id] for account_id in query.get('accountId', [])
+                 if account_id in self.data['users']]
+        start = self.int_param(query, 'startAt', 0)
+        end = start + min(self.int_param(query, 'maxResults', 10), self.user_max_results)
+        return 200, {'startAt': start, 'maxResults': end - start, 'total': len(users), 'isLast': end >= len(users),
+                     'values': users[start:end]}, {}
+
+
+class AZDStub(StubServer):
+    organization = 'benchmark-org'
+    # resource locations given to the sdk, which builds request urls from their route templates
+    locations = [('e81700f7-3be2-46de-8624-2eb35882fcaa', 'Location', 'ResourceAreas', '_apis/{resource}/{areaId}'),
+                 ('603fe2ac-9723-48b9-88ad-09305aa6c6e1', 'core', 'projects', '_apis/{resource}/{*projectId}'),
+                 ('d8f96f24-8ea7-4cb6-baab-2df8fc515665', 'Release', 'definitions',
+                  '{project}/_apis/{area}/{resource}/{definitionId}'),
+                 ('a166fde7-27ad-408e-ba75-703c2cc9d500', 'Release', 'releases',
+                  '{project}/_apis/{area}/{resource}/{releaseId}'),
+                 ('dbeaf647-6167-421a-bda9-c9327b25e2e6', 'build', 'Definitions',
+                  '{project}/_apis/{area}/{resource}/{definitionId}'),
+                 ('0cd358e1-9217-4d94-8269-1c1ee6f93dcf', 'build', 'Builds',
+                  '{project}/_apis/{area}/{resource}/{buildId}'),
+                 ('a5d28130-9cd2-40fa-9f08-902e7daa9efb', 'git', 'pullRequests', '{project}/_apis/{area}/{resource}'),
+                 ('ab6e2e5d-a0b7-4153-b64a-a4efe0d49449', 'git', 'pullRequestThreads',
+                  '{project}/_apis/{area}/repositories/{repositoryId}/pullRequests/{pullRequestId}/threads/{threadId}'),
+                 ('52823034-34a8-4576-922c-8d8b77e9e4c4', 'git', 'pullRequestCommits',
+                  '{project}/_apis/{area}/repositories/{repositoryId}/pullRequests/{pullRequestId}/commits'),
+                 ('1a9c53f7-f243-4447-b110-35ef023636e4', 'wit', 'wiql',
+                  '{project}/{team}/_apis/{area}/{resource}/{id}'),
+                 ('72c7ddf8-2cdc-4f60-90cd-ab71c14a399b', 'wit', 'workitems', '{project}/_apis/{area}/{resource}'),
+                 ('a00c85a5-80fa-4565-99c3-bcd2181434bb', 'wit', 'revisions',
+                  '{project}/_apis/{area}/workItems/{id}/{resource}/{revisionNumber}'),
+                 ('f828fe59-dd87-495d-a17c-7a8d6211ca6c', 'wit', 'workItemRevisions',
+                  '{project}/_apis/{area}/reporting/{resource}')]
+    routes = [('OPTIONS', r'^/[^/]+/_apis$', 'get_locations'),
+              ('GET', r'^/[^/]+/_apis/ResourceAreas$', 'get_resource_areas'),
+              ('GET', r'^/[^/]+/_apis/projects/([^/]+)$', 'get_project'),
+              ('GET', r'^/[^/]+/[^/]+/_apis/Release/definitions$', 'list_release_definitions'),
+              ('GET', r'^/[^/]+/[^/]+/_apis/Release/releases$', 'list_releases'),
+              ('GET', r'^/[^/]+/[^/]+/_apis/Release/releases/(\d+)$', 'get_release'),
+              ('GET', r'^/[^/]+/[^/]+/_apis/build/Definitions$', 'list_build_definitions'),
+              ('GET', r'^/[^/]+/[^/]+/_apis/build/Builds$', 'list_builds'),
+              ('GET', r'^/[^/]+/[^/]+/_apis/git/pullRequests$', 'list_pull_requests'),
+              ('GET', r'^/[^/]+/[^/]+/_apis/git/repositories/[^/]+/pullRequests/(\d+)/threads$', 'list_threads'),
+              ('GET', r'^/[^/]+/[^/]+/_apis/git/repositories/[^/]+/pullRequests/(\d+)/commits$', 'list_pr_commits'),
+              ('POST', r'^/[^/]+(/[^/]+)?/_apis/wit/wiql$', 'query_wiql'),
+              ('GET', r'^/[^/]+/[^/]+/_apis/wit/workitems$', 'list_work_items'),
+              ('GET', r'^/[^/]+/[^/]+/_apis/wit/workItems/(\d+)/revisions$', 'list_revisions'),
+              ('GET', r'^/[^/]+/[^/]+/_apis/wit/reporting/workItemRevisions$', 'list_reporting_revisions')]
+    reporting_page_size = 1000
+
+    @property
+    def organization_url(self) -> str:
+        return self.url + '/' + self.organization
+
+    @classmethod
+    def collection(cls, values: list) -> dict:
+        return {'count': len(values), 'value': values}
+
+    @classmethod
+    def parse_time(cls, value: str) -> datetime:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+    def get_locations(self, handler, match, query, body) -> tuple:
+        return 200, self.collection([{'id': location_id, 'area': area, 'resourceName': resource,
+                                      'routeTemplate': template, 'resourceVersion': 9, 'minVersion': 1.0,
+                                      'maxVersion': 7.1, 'releasedVersion': '7.1'}
+                                     for location_id, area, resource, template in self.locations]), {}
+
+    def get_resource_areas(self, handler, match, query, body) -> tuple:
+        # an empty list makes the sdk send all requests to the organization url, as done for on premise servers
+        return 200, self.collection([]), {}
+
+    def get_project(self, handler, match, query, body) -> tuple:
+        return 200, self.data['project'], {}
+
+    def list_release_definitions(self, handler, match, query, body) -> tuple:
+        return 200, self.collection(self.data['release_definitions']), {}
+
+    def list_releases(self, handler, match, query, body) -> tuple:
+        """Releases newest first. Continuation token is the release id to continue from, inclusive. Listed
+        releases come without deploy steps, same as the service"""
+        releases = self.data['releases'][::-1]
+        token = self.param(query, 'continuationToken')
+        if token is not None:
+            releases = [release for release in releases if release['id'] <= int(token)]
+        page = releases[:self.int_param(query, '$top', 50)]
+        listed = [{**release, 'environments': [{key: value for key, value in environment.items()
+                                                if key != 'deploySteps'} for environment in release['environments']]}
+                  for release in page]
+        headers = {}
+        if len(releases) > len(page):
+            headers['x-ms-continuationtoken'] = str(releases[len(page)]['id'])
+        return 200, self.collection(listed), headers
+
+    def get_release(self, handler, match, query, body) -> tuple:
+        return 200, self.data['releases'][int(match.group(1)) - 1], {}
+
+    def list_build_definitions(self, handler, match, query, body) -> tuple:
+        return 200, self.collection(self.data['build_definitions']), {}
+
+    def list_builds(self, handler, match, query, body) -> tuple:
+        """Builds ordered by queryOrder, latest queued first by default. minTime and maxTime filter on the time
+        the builds are ordered by"""
+        order = self.param(query, 'queryOrder', 'queueTimeDescending')
+        time_key = order[:order.index('Time')] + 'Time'
+        builds = sorted(self.data['builds'], key=lambda build: self.parse_time(build[time_key]),
+                        reverse=order.endswith('Descending'))
+        min_time = self.param(query, 'minTime')
+        max_time = self.param(query, 'maxTime')
+        if min_time is not None:
+            builds = [build for build in builds if self.parse_time(build[time_key]) >= self.parse_time(min_time)]
+        if max_time is not None:
+            builds = [build for build in builds if self.parse_time(build[time_key]) <= self.parse_time(max_time)]
+        per_definition = self.param(query, 'maxBuildsPerDefinition')
+        if per_definition is not None:
+            counts = {}
+            limited = []
+            for build in builds:
+                counts[build['definition']['id']] = counts.get(build['definition']['id'], 0) + 1
+                if counts[build['definition']['id']] <= int(per_definition):
+                    limited.append(build)
+            builds = limited
+        return 200, self.collection(builds[:self.int_param(query, '$top', 1000)]), {}
+
+    def list_pull_requests(self, handler, match, query, body) -> tuple:
+        return 200, self.collection(self.data['pull_requests']), {}
+
+    def list_threads(self, handler, match, query, body) -> tuple:
+        return 200, self.collection(self.data['threads'].get(int(match.group(1)), [])), {}
+
+    def list_pr_commits(self, handler, match, query, body) -> tuple:
+        return 200, self.collection(self.data['pr_commits'].get(int(match.group(1)), [])), {}
+
+    def query_wiql(self, handler, match, query, body) -> tuple:
+        """Supports the id window queries of AZDConnector, other conditions are ignored"""
+        id_match = re.search(r'\[System\.Id\] > (\d+)', body['query'])
+        last_id = int(id_match.group(1)) if id_match is not None else 0
+        top = self.int_param(query, '$top', 20000)
+        ids = [item['id'] for item in self.data['work_items'] if item['id'] > last_id][:top]
+        return 200, {'queryType': 'flat', 'asOf': datetime.now().isoformat(),
+                     'workItems': [{'id': item_id, 'url': 'workItems/' + str(item_id)} for item_id in ids]}, {}
+
+    def list_work_items(self, handler, match, query, body) -> tuple:
+        ids = [int(item_id) for item_id in self.param(query, 'ids', '').split(',') if item_id]
+        # work item ids are assigned in order starting from 1
+        return 200, self.collection([self.data['work_items'][item_id - 1] for item_id in ids]), {}
+
+    def list_revisions(self, handler, match, query, body) -> tuple:
+        return 200, self.collection(self.data['revisions'].get(int(match.group(1)), [])), {}
+
+    def list_reporting_revisions(self, handler, match, query, body) -> tuple:
+        revisions = [revision for item_revisions in self.data['revisions'].values() for revision in item_revisions]
+        start = int(self.param(query, 'continuationToken', 0))
+        end = start + self.reporting_page_size
+        return 200, {'values': revisions[start:end], 'continuationToken': str(end),
+                     'isLastBatch': end >= len(revisions)}, {}
@@ -0,0 +1,288 @@
+import hashlib
+import random
+from datetime import datetime, timedelta, timezone
+
+# first entity is created at this time, later ones follow in creation order
+START_TIME = datetime(2024, 1, 1, tzinfo=timezone.utc)
+ISSUE_STATES = ['To Do', 'In Progress', 'In Review', 'Done']
+WORK_ITEM_STATES = ['New', 'Active', 'Resolved', 'Closed']
+PR_VOTES = [10, 5, -5, -10]
+
+
+def iso_time(seconds: float) -> str:
+    return (START_TIME + timedelta(seconds=seconds)).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+
+def jira_time(seconds: float) -> str:
+    return (START_TIME + timedelta(seconds=seconds)).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + '+0000'
+
+
+def sha(*parts) -> str:
+    return hashlib.sha1('-'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def gitlab_data(issues: int, merge_requests: int, commits: int, pipelines: int, jobs: int, users: int = 50,
+                seed: int = 42) -> dict:
+    """Entities of a single gitlab project in rest api format. Issues have assign, branch and MR mention notes,
+    MRs close issues, pipelines run on MR commits"""
+    rng = random.Random(seed)
+    project = {'id': 1, 'path_with_namespace': 'benchmark/project-1', 'name': 'project-1',
+               'web_url': 'https://gitlab.example.com/benchmark/project-1'}
+    user_list = [{'id': i + 1, 'name': 'User ' + str(i + 1), 'username': 'user' + str(i + 1),
+                  'email': 'user' + str(i + 1) + '@example.com'} for i in range(users)]
+    data = {'project': project, 'users': user_list, 'issues': [], 'notes': {}, 'closed_by': {}, 'branches': [],
+            'merge_requests': [], 'commits': {}, 'pipelines': [], 'jobs': []}
+
+    def author() -> dict:
+        user = rng.choice(user_list)
+        return {'id': user['id'], 'name': user['name'], 'username': user['username']}
+
+    for iid in range(1, merge_requests + 1):
+        created = iid * 3600 + 1800
+        source_branch = str(iid) + '-feature'
+        mr_commits = []
+        for position in range(commits):
+            user = rng.choice(user_list)
+            mr_commits.append({'id': sha('commit', iid, position), 'short_id': sha('commit', iid, position)[:8],
+                               'title': 'Change ' + str(position), 'author_name': user['name'],
+                               'author_email': user['email'], 'created_at': iso_time(created + position * 60),
+                               'message': 'Merge branch \'' + source_branch + '\'' if position == commits - 1
+                               else 'Change ' + str(position) + ' for BENCH-' + str(iid)})
+        data['commits'][iid] = mr_commits
+        merged = rng.random() < 0.7
+        closed = not merged and rng.random() < 0.5
+        data['merge_requests'].append({
+            'id': 100000 + iid, 'iid': iid, 'project_id': project['id'], 'title': 'Resolve BENCH-' + str(iid),
+            'description': 'Closes #' + str(iid) if iid <= issues else None, 'author': author(),
+            'created_at': iso_time(created), 'updated_at': iso_time(created + 7200),
+            'merged_at': iso_time(created + 7200) if merged else None,
+            'merge_user': author() if merged else None,
+            'closed_at': iso_time(created + 7200) if closed else None, 'closed_by': author() if closed else None,
+            'state': 'merged' if merged else 'closed' if closed else 'opened',
+            'sha': mr_commits[-1]['id'] if mr_commits else sha('head', iid),
+            'merge_commit_sha': sha('merge', iid) if merged else None,
+            'source_branch': source_branch, 'target_branch': 'main'})
+    for iid in range(1, issues + 1):
+        created = iid * 3600
+        closed = iid <= merge_requests and data['merge_requests'][iid - 1]['state'] == 'merged'
+        data['issues'].append({
+            'id': 200000 + iid, 'iid': iid, 'project_id': project['id'], 'title': 'Issue ' + str(iid),
+            'description': 'Reported in BENCH-' + str(iid) if rng.random() < 0.5 else None, 'state':
+            'closed' if closed else 'opened', 'issue_type': 'issue', 'author': author(),
+            'created_at': iso_time(created), 'updated_at': iso_time(created + 9000),
+            'closed_at': iso_time(created + 9000) if closed else None, 'closed_by': author() if closed else None})
+        notes = [{'id': iid * 10 + 1, 'body': 'assigned to @' + rng.choice(user_list)['username'], 'system': True,
+                  'created_at': iso_time(created + 60), 'author': author()}]
+        if iid <= merge_requests:
+            notes.append({'id': iid * 10 + 2, 'body': 'created branch `' + str(iid) + '-feature` to address this',
+                          'system': True, 'created_at': iso_time(created + 120), 'author': author()})
+            notes.append({'id': iid * 10 + 3, 'body': 'mentioned in merge request !' + str(iid), 'system': True,
+                          'created_at': iso_time(created + 1800), 'author': author()})
+        notes.append({'id': iid * 10 + 4, 'body': 'Looks good', 'system': False,
+                      'created_at': iso_time(created + 3000), 'author': author()})
+        if closed:
+            notes.append({'id': iid * 10 + 5, 'body': 'closed', 'system': True,
+                          'created_at': iso_time(created + 9000), 'author': data['issues'][-1]['closed_by']})
+        # notes are listed newest first
+        data['notes'][iid] = notes[::-1]
+        data['closed_by'][iid] = [{'iid': iid, 'id': 100000 + iid}] if closed else []
+    branch_names = ['main'] + [mr['source_branch'] for mr in data['merge_requests'] if mr['state'] == 'opened']
+    for position, name in enumerate(branch_names):
+        user = rng.choice(user_list)
+        data['branches'].append({'name': name, 'commit': {
+            'id': sha('branch', name), 'short_id': sha('branch', name)[:8], 'author_email': user['email'],
+            'author_name': user['name'], 'created_at': iso_time(position * 3600)}})
+    # pipelines run on MR heads, merge commits or on commits without a MR
+    all_shas = [mr['sha'] for mr in data['merge_requests']] + [mr['merge_commit_sha'] for mr in
+                                                              data['merge_requests'] if mr['merge_commit_sha']]
+    job_id = 1
+    for pipeline_id in range(1, pipelines + 1):
+        created = pipeline_id * 1800
+        status = rng.choice(['success', 'success', 'success', 'failed'])
+        user = author()
+        data['pipelines'].append({
+            'id': pipeline_id, 'iid': pipeline_id, 'project_id': project['id'],
+            'sha': rng.choice(all_shas) if all_shas and rng.random() < 0.9 else sha('pipeline', pipeline_id),
+            'before_sha': sha('before', pipeline_id), 'ref': 'main', 'status': status, 'source': 'push',
+            'created_at': iso_time(created), 'updated_at': iso_time(created + 600),
+            'finished_at': iso_time(created + 600), 'duration': 600, 'user': user})
+        for position in range(jobs):
+            data['jobs'].append({'id': job_id, 'name': 'job-' + str(position),
+                                 'stage': ['build', 'test', 'deploy'][position % 3],
+                                 'status': status if position == jobs - 1 else 'success',
+                                 'created_at': iso_time(created), 'started_at': iso_time(created + position * 60),
+                                 'user': user, 'pipeline': {'id': pipeline_id, 'project_id': project['id']}})
+            job_id += 1
+    return data
+
+
+def jira_data(jira_url: str, issues: int, comments: int, changes: int, users: int = 50, seed: int = 42,
+              project_key: str = 'BENCH') -> dict:
+    """Issues of a jira project in rest api v3 format, with comments and changelog histories. Some users hide
+    their email, so that account lookups are needed. Descriptions and comments link other issues of jira_url"""
+    rng = random.Random(seed)
+    user_list = [{'accountId': 'account-' + str(i + 1), 'displayName': 'User ' + str(i + 1),
+                  'emailAddress': 'user' + str(i + 1) + '@example.com', 'active': True} for i in range(users)]
+    data = {'users': {user['accountId']: user for user in user_list}, 'issues': [], 'comments': {}, 'changelogs': {}}
+
+    def author() -> dict:
+        user = rng.choice(user_list)
+        if rng.random() < 0.3:
+            # email is not visible due to privacy settings of the user
+            return {'accountId': user['accountId'], 'displayName': user['displayName']}
+        return dict(user)
+
+    def document(text: str, mention: int = 0) -> dict:
+        content = [{'type': 'text', 'text': text}]
+        if mention > 0:
+            content.append({'type': 'inlineCard', 'attrs': {'url': jira_url + '/browse/' + project_key + '-'
+                                                                   + str(mention)}})
+        return {'type': 'doc', 'version': 1, 'content': [{'type': 'paragraph', 'content': content}]}
+
+    for number in range(1, issues + 1):
+        key = project_key + '-' + str(number)
+        created = number * 3600
+        fields = {'project': {'key': project_key, 'name': 'Benchmark'}, 'created': jira_time(created),
+                  'issuetype': {'name': rng.choice(['Story', 'Bug', 'Task'])}, 'creator': author(),
+                  'timetracking': {'timeSpentSeconds': 3600} if rng.random() < 0.3 else {},
+                  'description': document('Issue ' + str(number), rng.randint(1, number) if number > 1 else 0)}
+        if number > 1 and rng.random() < 0.2:
+            fields['parent'] = {'key': project_key + '-' + str(rng.randint(1, number - 1))}
+            fields['issuetype'] = {'name': 'Sub-task'}
+        data['issues'].append({'id': str(10000 + number), 'key': key, 'fields': fields})
+        issue_comments = []
+        for position in range(comments):
+            comment = {'id': str(number * 1000 + position), 'author': author(),
+                       'created': jira_time(created + (position + 1) * 300),
+                       'body': document('Comment ' + str(position),
+                                        rng.randint(1, issues) if rng.random() < 0.2 else 0)}
+            if position > 0 and rng.random() < 0.3:
+                comment['parentId'] = issue_comments[-1]['id']
+            issue_comments.append(comment)
+        data['comments'][key] = issue_comments
+        histories = []
+        for position in range(changes):
+            item = rng.choice([{'field': 'status', 'fieldtype': 'jira', 'from': None, 'fromString': None,
+                                'to': None, 'toString': ISSUE_STATES[position % len(ISSUE_STATES)]},
+                               {'field': 'assignee', 'fieldtype': 'jira', 'from': None, 'fromString': None,
+                                'to': rng.choice(user_list)['accountId'], 'toString': 'User'},
+                               {'field': 'timespent', 'fieldtype': 'jira', 'from': None, 'fromString': None,
+                                'to': '1800', 'toString': '1800'}])
+            histories.append({'id': str(number * 1000 + 500 + position), 'author': author(),
+                              'created': jira_time(created + (position + 1) * 600), 'items': [item]})
+        data['changelogs'][key] = histories
+    return data
+
+
+def azure_devops_data(work_items: int, revisions: int, merge_requests: int, commits: int, pipelines: int,
+                      releases: int, definitions: int = 5, users: int = 50, seed: int = 42) -> dict:
+    """Entities of a single azure devops project in rest api 7.1 format. Work item revisions change state
+    and mention PRs, PR threads hold votes and status updates, builds and releases run on PR commits"""
+    rng = random.Random(seed)
+    project = {'id': '6ce954b1-ce1f-45d1-b94d-e6bf2464ba2c', 'name': 'benchmark', 'state': 'wellFormed'}
+    repository = {'id': '5febef5a-833d-4e14-b9c0-14cb638f91e6', 'name': 'benchmark',
+                  'project': {'id': project['id'], 'name': project['name']}}
+    user_list = [{'id': 'identity-' + str(i + 1), 'displayName': 'User ' + str(i + 1),
+                  'uniqueName': 'user' + str(i + 1) + '@example.com'} for i in range(users)]
+    data = {'project': project, 'repository': repository, 'work_items': [], 'revisions': {},
+            'pull_requests': [], 'threads': {}, 'pr_commits': {}, 'build_definitions': [], 'builds': [],
+            'release_definitions': [], 'releases': []}
+
+    def identity() -> dict:
+        return dict(rng.choice(user_list))
+
+    for item_id in range(1, work_items + 1):
+        created = item_id * 3600
+        creator = identity()
+        item_revisions = []
+        for rev in range(1, revisions + 1):
+            fields = {'System.Id': item_id, 'System.Rev': rev,
+                      'System.State': WORK_ITEM_STATES[min(rev - 1, len(WORK_ITEM_STATES) - 1)],
+                      'System.ChangedBy': creator if rev == 1 else identity(),
+                      'System.ChangedDate': iso_time(created + (rev - 1) * 900)}
+            if rev > 1 and rng.random() < 0.4:
+                fields['System.History'] = ('Fixed in pullrequest/' + str(rng.randint(1, merge_requests))
+                                            if merge_requests > 0 and rng.random() < 0.5 else 'Comment ' + str(rev))
+            item_revisions.append({'id': item_id, 'rev': rev, 'fields': fields})
+        data['revisions'][item_id] = item_revisions
+        latest = item_revisions[-1]['fields'] if item_revisions else {'System.State': 'New',
+                                                                      'System.ChangedDate': iso_time(created)}
+        relations = []
+        if item_id > 1 and rng.random() < 0.3:
+            relations.append({'rel': 'System.LinkTypes.Hierarchy-Reverse', 'url': 'workItems/' +
+                              str(rng.randint(1, item_id - 1)), 'attributes': {'name': 'Parent', 'isLocked': False}})
+        if item_id > 1 and rng.random() < 0.3:
+            linked = rng.randint(1, item_id - 1)
+            relations.append({'rel': 'System.LinkTypes.Related', 'url': 'workItems/' + str(linked),
+                              'attributes': {'name': 'Related', 'isLocked': False,
+                                             'comment': 'mentioned work item #' + str(linked)}})
+        data['work_items'].append({'id': item_id, 'rev': len(item_revisions), 'relations': relations, 'fields': {
+            'System.Id': item_id, 'System.TeamProject': project['name'],
+            'System.WorkItemType': rng.choice(['User Story', 'Bug', 'Task']), 'System.State': latest['System.State'],
+            'System.Title': 'Work item ' + str(item_id), 'System.Description': 'Work item ' + str(item_id),
+            'System.CreatedBy': creator, 'System.CreatedDate': iso_time(created),
+            'System.ChangedDate': latest['System.ChangedDate']}})
+    for pr_id in range(1, merge_requests + 1):
+        created = pr_id * 3600 + 1800
+        status = rng.choice(['completed', 'completed', 'abandoned', 'active'])
+        pr_commits = [{'commitId': sha('azd-commit', pr_id, position), 'comment': 'Change ' + str(position),
+                       'author': {'name': user['displayName'], 'email': user['uniqueName'],
+                                  'date': iso_time(created + position * 60)}}
+                      for position, user in enumerate(rng.choice(user_list) for _ in range(commits))]
+        data['pr_commits'][pr_id] = pr_commits
+        comments = []
+        for position in range(3):
+            reviewer = identity()
+            vote = rng.choice(PR_VOTES)
+            comments.append({'id': position + 1, 'author': reviewer, 'commentType': 'system',
+                             'content': reviewer['displayName'] + ' voted ' + str(vote),
+                             'publishedDate': iso_time(created + (position + 1) * 600)})
+        if status != 'active':
+            comments.append({'id': 4, 'author': identity(), 'commentType': 'system',
+                             'content': 'User updated the pull request status to ' + status.capitalize(),
+                             'publishedDate': iso_time(created + 3000)})
+        data['threads'][pr_id] = [{'id': pr_id * 10 + position, 'comments': [comment],
+                                   'publishedDate': comment['publishedDate'], 'isDeleted': False}
+                                  for position, comment in enumerate(comments)]
+        head = pr_commits[-1]['commitId'] if pr_commits else sha('azd-head', pr_id)
+        pull_request = {'pullRequestId': pr_id, 'repository': repository, 'status': status,
+                        'createdBy': identity(), 'creationDate': iso_time(created),
+                        'title': 'Resolve BENCH-' + str(pr_id), 'description': 'Work item #' + str(pr_id),
+                        'sourceRefName': 'refs/heads/feature-' + str(pr_id), 'targetRefName': 'refs/heads/main',
+                        'lastMergeSourceCommit': {'commitId': head},
+                        'lastMergeCommit': {'commitId': sha('azd-merge', pr_id)}}
+        data['pull_requests'].append(pull_request)
+    # newest pull requests are listed first
+    data['pull_requests'].reverse()
+    all_shas = ([pr['lastMergeSourceCommit']['commitId'] for pr in data['pull_requests']]
+                + [pr['lastMergeCommit']['commitId'] for pr in data['pull_requests']])
+    for definition_id in range(1, definitions + 1):
+        data['build_definitions'].append({'id': definition_id, 'name': 'pipeline-' + str(definition_id),
+                                          'createdDate': iso_time(definition_id * 60), 'authoredBy': identity(),
+                                          'project': {'id': project['id'], 'name': project['name']}})
+        data['release_definitions'].append({'id': definition_id, 'name': 'release-' + str(definition_id),
+                                            'createdOn': iso_time(definition_id * 60), 'createdBy': identity()})
+    for build_id in range(1, pipelines + 1):
+        started = build_id * 1800
+        data['builds'].append({'id': build_id, 'buildNumber': str(build_id),
+                               'definition': {'id': rng.randint(1, definitions)},
+                               'status': 'completed', 'result': rng.choice(['succeeded', 'failed']),
+                               'queueTime': iso_time(started - 30), 'startTime': iso_time(started),
+                               'finishTime': iso_time(started + rng.randint(60, 1200)),
+                               'requestedFor': identity(), 'sourceBranch': 'refs/heads/main',
+                               'sourceVersion': rng.choice(all_shas) if all_shas else sha('azd-build', build_id)})
+    for release_id in range(1, releases + 1):
+        created = release_id * 3600
+        finished = iso_time(created + rng.randint(60, 1800))
+        environments = [{'id': release_id * 10 + position, 'name': stage, 'status': 'succeeded', 'deploySteps': [
+            {'releaseDeployPhases': [{'deploymentJobs': [{'job': {'finishTime': finished}}]}]}]}
+                        for position, stage in enumerate(['staging', 'production'])]
+        data['releases'].append({
+            'id': release_id, 'name': 'Release-' + str(release_id), 'status': 'active',
+            'reason': 'continuousIntegration',
+            'releaseDefinition': {'id': rng.randint(1, definitions)}, 'createdOn': iso_time(created),
+            'createdBy': identity(), 'environments': environments,
+            'artifacts': [{'type': 'Git', 'isPrimary': True, 'alias': 'source', 'definitionReference': {
+                'version': {'id': rng.choice(all_shas) if all_shas else sha('azd-release', release_id)},
+                'branch': {'id': 'refs/heads/main', 'name': 'refs/heads/main'}}}]})
+    return data
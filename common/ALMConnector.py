@@ -1,16 +1,24 @@
-import re
 import traceback
+import pandas as pd
 from DevOpsConnector import DevOpsConnector
+from EventBuffer import EventBuffer
+from LMPUtils import LMPUtils
+from MentionExtractor import MentionExtractor
 
 
 class ALMConnector(DevOpsConnector):
+    checkpoint_attributes = DevOpsConnector.checkpoint_attributes + [
+        'mr_issue_link_dict', 'mr_issue_mention_dict', 'issue_created_dict', 'mr_case_id', 'mr_created_dict',
+        'commit_mr_pre_merge_dict', 'commit_mr_post_merge_dict', 'commit_info', 'commit_mr_commits_dict',
+        'commit_case_id', 'mr_latest_issue', 'mr_list', 'commit_list', 'pl_list', 'rel_list']
+
     def __init__(self, namespace: str, ext_issue_ref_regex: str, api_delay: int, case_type_prefixes: dict):
         DevOpsConnector.__init__(self, namespace, api_delay)
         self.case_type_prefixes = case_type_prefixes
         self.action_prefix = self.case_type_prefixes['action_prefix']
         # this should be overwritten by subclasses
         self.project_id = 0
-        self.ext_issue_regex = re.compile(ext_issue_ref_regex)
+        self.ext_issue_mentions = MentionExtractor({'ext_issue': ext_issue_ref_regex})
         # -------------------------------------------
         # -- dicts for fast ref
         # -------------------------------------------
@@ -33,19 +41,25 @@ class ALMConnector(DevOpsConnector):
         self.commit_mr_commits_dict = {}
         # input - commit hash, out - case id
         self.commit_case_id = {}
+        # input mr iid, out - latest linked issue iid. resolved in batch before MRs are read
+        self.mr_latest_issue = {}
         self.mr_list = []
         self.commit_list = []
         self.pl_list = []
         self.rel_list = []
 
-    def analyse_commit_events(self, prod_run: bool = False) -> list[dict]:
+    def analyse_commit_events(self, prod_run: bool = False) -> EventBuffer:
         """Analyses commit events already read from various sources and admits them as events"""
         self.logger.info('analysing commit list for project id: ' + str(self.project_id))
         # iterate through the mr commits dict which contains already read commits
         # hence prod run is just a placeholder and is not implemented
+        resolved = self.resolve_commit_case_ids(list(self.commit_info))
         for commit_sha, commit in self.commit_info.items():
             try:
-                case_id, link_type, mr_iid = self.find_case_id_for_commit(commit_sha)
+                if commit_sha in resolved:
+                    case_id, link_type, mr_iid = resolved[commit_sha]
+                else:
+                    case_id, link_type, mr_iid = self.find_case_id_for_commit(commit_sha)
                 self.commit_case_id[commit_sha] = case_id
                 local_case = self.generate_case_id(commit_sha[:6], 'commit')
                 action = self.action_prefix + '_commit'
@@ -62,7 +76,53 @@ class ALMConnector(DevOpsConnector):
                 self.logger.error('Error occurred retrieving data for: ' + str(commit_sha) + ' moving to next.')
                 traceback.print_exc()
         self.logger.info('number of commit events found: ' + str(self.added_event_count()))
-        return self.event_logs
+        return self.events
+
+    def load_relations(self, issue_df: pd.DataFrame, mr_df: pd.DataFrame, commit_df: pd.DataFrame):
+        """Rehydrates relation dicts using outputs of a previous run, so that incremental runs can link
+        new events to entities which were not updated since then"""
+        own_projects = {str(self.project_id), str(self.namespace)}
+        issue_df = self.filter_project_records(issue_df, own_projects)
+        mr_df = self.filter_project_records(mr_df, own_projects)
+        commit_df = self.filter_project_records(commit_df, own_projects)
+        # gitlab uses project scoped iid for relations, other sources use id
+        issue_key = 'iid' if 'iid' in issue_df.columns else 'id'
+        for record in issue_df.to_dict('records'):
+            self.issue_created_dict[record[issue_key]] = LMPUtils.datetime64_to_iso(record['created_time'])
+        mr_key = 'iid' if 'iid' in mr_df.columns else 'id'
+        for record in mr_df.to_dict('records'):
+            mr_iid = record[mr_key]
+            self.mr_case_id[mr_iid] = record['case_id']
+            self.mr_created_dict[mr_iid] = LMPUtils.datetime64_to_iso(record['created_time'])
+            for issue_iid in self.as_set(record.get('linked_issues')):
+                self.add_link(self.mr_issue_link_dict, mr_iid, issue_iid)
+            for issue_iid in self.as_set(record.get('mentioned_issues')):
+                self.add_link(self.mr_issue_mention_dict, mr_iid, issue_iid)
+        for record in commit_df.to_dict('records'):
+            commit_sha = record['id']
+            self.commit_case_id[commit_sha] = record['case_id']
+            for mr_iid in self.as_set(record.get('pre_merge')):
+                self.add_link(self.commit_mr_pre_merge_dict, commit_sha, mr_iid)
+            for mr_iid in self.as_set(record.get('post_merge')):
+                self.add_link(self.commit_mr_post_merge_dict, commit_sha, mr_iid)
+            for mr_iid in self.as_set(record.get('commit_list')):
+                self.add_link(self.commit_mr_commits_dict, commit_sha, mr_iid)
+        self.logger.info('relations loaded from previous outputs, issues: ' + str(len(issue_df)) + ', MRs: '
+                         + str(len(mr_df)) + ', commits: ' + str(len(commit_df)))
+
+    @classmethod
+    def filter_project_records(cls, df: pd.DataFrame, own_projects: set) -> pd.DataFrame:
+        """Gives records of the given project(s) only, as outputs contain all projects of a run"""
+        if df.empty or 'project_id' not in df.columns:
+            return pd.DataFrame()
+        return df[df['project_id'].astype(str).isin(own_projects)]
+
+    @classmethod
+    def as_set(cls, value) -> set:
+        """Sets are read back from parquet as arrays, or None when empty"""
+        if value is None:
+            return set()
+        return set(value)
 
     def generate_case_id(self, value, prefix_type: str) -> str:
         """Case id will be generated according to case_type_prefixes"""
@@ -108,12 +168,38 @@ class ALMConnector(DevOpsConnector):
             self.logger.warn('did not find a relation to an MR for commit: ' + str(commit_sha))
         return case_id, link_type, str(mr_iid)
 
+    def resolve_commit_case_ids(self, commit_shas: list) -> dict:
+        """Batch version of find_case_id_for_commit. Gives commit hash to (case_id, link_type, mr_iid) for commits
+        linked to an MR. Commits which cannot be resolved here are left to find_case_id_for_commit"""
+        link_dicts = [(self.commit_mr_pre_merge_dict, 'pre_merge'), (self.commit_mr_post_merge_dict, 'post_merge'),
+                      (self.commit_mr_commits_dict, 'commit_related')]
+        resolved = {}
+        pending = commit_shas
+        for link_dict, link_type in link_dicts:
+            linked = [commit_sha for commit_sha in pending if len(link_dict.get(commit_sha, ())) > 0]
+            latest_mrs = self.get_max_timed_ids(link_dict, self.mr_created_dict, linked)
+            for commit_sha in linked:
+                mr_iid = latest_mrs.get(commit_sha)
+                if mr_iid in self.mr_case_id:
+                    resolved[commit_sha] = (self.mr_case_id[mr_iid], link_type, str(mr_iid))
+            # links of a later dict are only used if earlier ones are missing
+            linked = set(linked)
+            pending = [commit_sha for commit_sha in pending if commit_sha not in linked]
+        return resolved
+
+    def resolve_mr_issue_links(self):
+        """Resolves the latest linked issue of all MRs in batch, used by find_case_id_for_mr"""
+        self.mr_latest_issue = self.get_max_timed_ids(self.mr_issue_link_dict, self.issue_created_dict)
+
     def find_case_id_for_mr(self, mr_str: int) -> tuple[str, str]:
         """Get the case id for a given MR. Returns case_id, link_type as tuple"""
         linked = self.mr_issue_link_dict
         mentioned = self.mr_issue_mention_dict
         if (mr_str in linked) and len(linked[mr_str]) > 0:
-            latest_issue = self.get_max_timed_id(linked[mr_str], self.issue_created_dict)
+            if mr_str in self.mr_latest_issue:
+                latest_issue = self.mr_latest_issue[mr_str]
+            else:
+                latest_issue = self.get_max_timed_id(linked[mr_str], self.issue_created_dict)
             case_id = self.generate_case_id(latest_issue, 'issue')
             link_type = 'mr_link'
         elif (mr_str in mentioned) and len(mentioned[mr_str]) == 1:
@@ -127,13 +213,10 @@ class ALMConnector(DevOpsConnector):
             link_type = 'undefined'
         return case_id, link_type
 
-    def find_ext_issue_id(self, input_text: str) -> str:
-        """Find external system issued ticket id using regex"""
+    def find_ext_issue_id(self, *input_texts: str | None) -> str:
+        """Find external system issued ticket id using regex. texts are searched in order, None is skipped"""
         # we are considering the first match only
-        result = self.ext_issue_regex.search(input_text)
-        if result is None:
-            return ''
-        else:
-            match = result.group(1)
+        match = self.ext_issue_mentions.first('ext_issue', *input_texts)
+        if match != '':
             self.logger.debug('found reference to external issue id: ' + match)
-            return match
+        return match
@@ -0,0 +1,118 @@
+import gzip
+import json
+import logging
+import os
+import re
+import time
+from datetime import datetime, timezone
+from EventBuffer import EventBuffer
+
+
+class CheckpointStore:
+    # bumped when the layout of the saved state changes, checkpoints of other versions are ignored
+    format_version = 2
+    extension = '.ckpt.json.gz'
+    # key marking json objects which hold a value of a type json does not have, ex: {"__type__": "set", ...}
+    type_key = '__type__'
+    # key of the run level state, ex: start time of the run which is stored as the watermark
+    run_key = '_run'
+
+    def __init__(self, directory: str, source: str, interval_seconds: float = 300):
+        """Saves connector state of long extraction runs, one gzip compressed json file per project, so that a failed
+        run can be resumed. interval_seconds is the minimum time between checkpoints taken in the middle of a stage.
+        json is used instead of pickle, so that reading a checkpoint cannot run code"""
+        self.logger = logging.getLogger('scriptLogger')
+        self.directory = directory
+        self.source = source
+        self.interval = interval_seconds
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, project: str) -> str:
+        # project names may contain characters which are not allowed in file names
+        return os.path.join(self.directory, self.source + '_' + re.sub(r'[^\w.-]', '_', str(project)) + self.extension)
+
+    def save(self, project: str, state: dict):
+        """Writes the state of a project. Written to a temp file first, so that a crash while saving keeps the
+        previous checkpoint"""
+        checkpoint = {'version': self.format_version, 'source': self.source, 'project': str(project),
+                      'saved_at': datetime.now(timezone.utc).isoformat(), 'state': self.encode(state)}
+        checkpoint_path = self.path(project)
+        begin = time.perf_counter()
+        with gzip.open(checkpoint_path + '.tmp', 'wt', compresslevel=3, encoding='utf-8') as checkpoint_file:
+            json.dump(checkpoint, checkpoint_file, separators=(',', ':'))
+        os.replace(checkpoint_path + '.tmp', checkpoint_path)
+        self.logger.debug('checkpoint saved for ' + self.source + ' project ' + str(project) + ' in '
+                          + str(round(time.perf_counter() - begin, 2)) + 's')
+
+    def load(self, project: str) -> dict | None:
+        """Gives the saved state of a project, None if there is no usable checkpoint"""
+        checkpoint_path = self.path(project)
+        if not os.path.exists(checkpoint_path):
+            return None
+        try:
+            with gzip.open(checkpoint_path, 'rt', encoding='utf-8') as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+        except (OSError, EOFError, ValueError):
+            self.logger.warning('cannot read checkpoint ' + checkpoint_path + ', project is extracted again')
+            return None
+        if checkpoint.get('version') != self.format_version:
+            self.logger.warning('checkpoint ' + checkpoint_path + ' has format version '
+                                + str(checkpoint.get('version')) + ', expected ' + str(self.format_version)
+                                + '. project is extracted again')
+            return None
+        self.logger.info('resuming from checkpoint ' + checkpoint_path + ' saved at ' + checkpoint['saved_at'])
+        try:
+            return self.decode(checkpoint['state'])
+        except (KeyError, TypeError, ValueError):
+            self.logger.warning('cannot decode checkpoint ' + checkpoint_path + ', project is extracted again')
+            return None
+
+    @classmethod
+    def encode(cls, value):
+        """Converts state to json values. Sets, tuples, datetimes, event buffers and dicts having keys other than
+        str are kept as tagged objects, so that decode gives them back with their types"""
+        if value is None or isinstance(value, (str, bool, int, float)):
+            return value
+        if isinstance(value, list):
+            return [cls.encode(item) for item in value]
+        if isinstance(value, dict):
+            if all(isinstance(key, str) for key in value) and cls.type_key not in value:
+                return {key: cls.encode(item) for key, item in value.items()}
+            return {cls.type_key: 'dict', 'items': [[cls.encode(key), cls.encode(item)] for key, item in value.items()]}
+        if isinstance(value, (set, frozenset)):
+            return {cls.type_key: 'set', 'items': [cls.encode(item) for item in value]}
+        if isinstance(value, tuple):
+            return {cls.type_key: 'tuple', 'items': [cls.encode(item) for item in value]}
+        if isinstance(value, datetime):
+            return {cls.type_key: 'datetime', 'value': value.isoformat()}
+        if isinstance(value, EventBuffer):
+            return {cls.type_key: 'events', 'value': value.to_state()}
+        raise TypeError('cannot save ' + type(value).__name__ + ' in a checkpoint')
+
+    @classmethod
+    def decode(cls, value):
+        """Gives back the state converted by encode"""
+        if isinstance(value, list):
+            return [cls.decode(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+        match value.get(cls.type_key):
+            case None:
+                return {key: cls.decode(item) for key, item in value.items()}
+            case 'dict':
+                return {cls.decode(key): cls.decode(item) for key, item in value['items']}
+            case 'set':
+                return {cls.decode(item) for item in value['items']}
+            case 'tuple':
+                return tuple(cls.decode(item) for item in value['items'])
+            case 'datetime':
+                return datetime.fromisoformat(value['value'])
+            case 'events':
+                return EventBuffer.from_state(value['value'])
+        raise ValueError('unknown type in checkpoint: ' + str(value[cls.type_key]))
+
+    def clear(self):
+        """Removes all checkpoints of the source, once the outputs of a run are saved"""
+        for file_name in os.listdir(self.directory):
+            if file_name.startswith(self.source + '_') and file_name.endswith(self.extension):
+                os.remove(os.path.join(self.directory, file_name))
@@ -1,12 +1,21 @@
 import logging
 import datetime
 import re
+import threading
+import time
+import numpy as np
 import pandas as pd
 from LMPLogger import LMPLogger
 from LMPUtils import LMPUtils
+from EventBuffer import EventBuffer
+from OutputEngine import OutputEngine
+from RunMetrics import RunMetrics
 
 
 class DevOpsConnector:
+    # attributes holding extracted state, saved in checkpoints. subclasses extend the list
+    checkpoint_attributes = ['user_ref', 'issue_list', 'events', 'event_counter', 'temp_event_count']
+
     def __init__(self, namespace: str, api_delay: int):
         logger = logging.getLogger('scriptLogger')
         self.logger = LMPLogger(str(namespace), logger)
@@ -17,19 +26,39 @@ class DevOpsConnector:
         self.user_ref = {}
         # pandas convertible issue list
         self.issue_list = []
-        # event logs will only keep method scope and should be emptied when new method starts
-        self.event_logs = []
+        # events are kept column wise, event_logs gives the list of dicts form when needed
+        self.events = EventBuffer()
         # global event count
         self.event_counter = 0
         # temp event count, calling added_event_count method will reset it
         self.temp_event_count = 0
         # iso 8601 regex, also supporting space instead of T
         self.iso8601_re = re.compile(r'\d{4}-\d{2}-\d{2}[T ]')
+        # guards shared state when events are added from concurrent workers
+        self.lock = threading.RLock()
+        # input - attribute name of events or an entity list, out - ParquetStreamWriter. empty if not streaming
+        self.streams = {}
+        self.stream_batch_size = 0
+        # iso8601 watermark for incremental runs, only entities updated after this are read. None reads all
+        self.updated_after = None
+        # codec and layout of the published outputs
+        self.output = OutputEngine()
+        # CheckpointStore and project key, None if checkpoints are not taken
+        self.checkpoints = None
+        self.checkpoint_key = None
+        self.last_checkpoint = 0
+        # event methods of get_all_events are the stages of a run
+        self.completed_stages = []
+        self.current_stage = None
+        # input - stage, out - ids of the items completed when the last checkpoint was taken
+        self.stage_progress = {}
+        # (monotonic time, completed items, event count) at the start of progress tracking, for throughput and eta
+        self.progress_start = None
 
     def add_event(self, event_id, action, iso8601_time, case, user, user_ref, local_case, info1: str = '', info2: str = '',
-                  ns: str = '', duration: int = 0) -> dict:
+                  ns: str = '', duration: int = 0) -> bool:
         """Appends an event to event queue, there is no unique validation here.
-        If needed use the return as well to get event dict in standard form"""
+        Returns whether the event was added"""
         fields_ok = True
         # carry out None checks
         for i in event_id, action, iso8601_time, case, user, user_ref, local_case:
@@ -47,30 +76,142 @@ class DevOpsConnector:
             time = str(iso8601_time)
             if not self.iso8601_re.search(time):
                 self.logger.warn(action + ' event rejected as not a valid iso8601 datetime: ' + time)
-                return {}
+                return False
             # note: none of these id values have a continuous function meaning, hence str
-            event_dict = {'id': str(event_id), 'action': str(action),
-                          'time': time, 'case': str(case),
-                          'user': str(user), 'local_case': local_case,
-                          'info1': info1, 'info2': info2, 'ns': str(ns), 'duration': duration}
-            self.event_logs.append(event_dict)
-            self.event_counter += 1
-            self.temp_event_count += 1
-            return event_dict
-
-    def get_all_events(self, event_get_method_list: list, prod_run: bool = False) -> list[dict]:
+            # values in the order of EventBuffer.columns, appended without building an event dict
+            with self.lock:
+                self.events.append_row((str(event_id), str(action), time, str(case), str(user), local_case,
+                                        info1, info2, str(ns), duration))
+                self.event_counter += 1
+                self.temp_event_count += 1
+            if self.streams and len(self.events) >= self.stream_batch_size:
+                self.flush_streams()
+            return True
+        return False
+
+    @property
+    def event_logs(self) -> list[dict]:
+        """Compatibility view giving events as a list of dicts. This copies all events, use events if possible"""
+        return self.events.to_list()
+
+    def get_all_events(self, event_get_method_list: list, prod_run: bool = False) -> EventBuffer:
         """Umbrella method to retrieve all events if event_logs reset is NOT in place"""
         for method in event_get_method_list:
-            getattr(self, method)(prod_run)
-        return self.event_logs
+            if method in self.completed_stages:
+                self.logger.info('skipping ' + method + ', completed before the checkpoint')
+                continue
+            self.current_stage = method
+            # completed items are known at the first progress line, resumed stages start counting from there
+            self.progress_start = (time.monotonic(), None, self.event_counter)
+            with RunMetrics.get().stage(self.namespace, method) as stage:
+                getattr(self, method)(prod_run)
+                stage['events'] = self.event_counter - self.progress_start[2]
+            self.progress_start = None
+            self.completed_stages.append(method)
+            self.stage_progress.pop(method, None)
+            self.save_checkpoint(True)
+        self.current_stage = None
+        self.flush_streams(True)
+        return self.events
+
+    def enable_checkpoints(self, checkpoints, checkpoint_key: str):
+        """State is saved to the given CheckpointStore after each stage, and periodically within stages"""
+        self.checkpoints = checkpoints
+        self.checkpoint_key = checkpoint_key
+        self.last_checkpoint = time.monotonic()
+
+    def checkpoint_state(self) -> dict:
+        state = {attribute: getattr(self, attribute) for attribute in self.checkpoint_attributes}
+        state['completed_stages'] = self.completed_stages
+        state['stage_progress'] = self.stage_progress
+        return state
+
+    def restore_checkpoint(self, state: dict):
+        """Restores state saved by checkpoint_state. Completed stages are skipped and the stage in progress
+        continues after its completed items"""
+        for attribute in self.checkpoint_attributes:
+            setattr(self, attribute, state[attribute])
+        self.completed_stages = state['completed_stages']
+        self.stage_progress = state['stage_progress']
+
+    def save_checkpoint(self, force: bool = False):
+        """Saves state if checkpoints are enabled and the interval has passed since the last one, or always if
+        forced. Needs to be called at points where all completed items are fully added"""
+        if self.checkpoints is None:
+            return
+        if not force and time.monotonic() - self.last_checkpoint < self.checkpoints.interval:
+            return
+        with self.lock:
+            self.checkpoints.save(self.checkpoint_key, self.checkpoint_state())
+        self.last_checkpoint = time.monotonic()
 
-    def log_status(self, current_count: int, total_count: int = 0):
+    def resume_items(self, items, item_id) -> tuple:
+        """Skips items of the current stage which were completed before the checkpoint being resumed. item_id gives
+        the id of an item, items are matched by id as lists may have changed since the failed run. Needs to be
+        applied before detail requests of items are made. Gives the number of completed items, which counters
+        continue from, and the remaining items"""
+        completed = self.stage_progress.get(self.current_stage)
+        if not completed:
+            return 0, items
+        self.logger.info('resuming ' + self.current_stage + ' after ' + str(len(completed)) + ' completed items')
+        remaining = (item for item in items if item_id(item) not in completed)
+        if isinstance(items, list):
+            return len(completed), list(remaining)
+        return len(completed), remaining
+
+    def enable_streaming(self, streams: dict, batch_size: int):
+        """Events and entity records are written to the given stream writers in batches, instead of being kept
+        until the end of the run. streams - attribute name ('events', 'issue_list' etc.) to ParquetStreamWriter"""
+        self.streams = streams
+        self.stream_batch_size = batch_size
+
+    def flush_streams(self, force: bool = False):
+        """Writes buffered events and entity records once batch size is reached, or always if forced"""
+        if not self.streams:
+            return
+        with self.lock:
+            for attribute, writer in self.streams.items():
+                buffer = getattr(self, attribute)
+                if len(buffer) == 0 or (len(buffer) < self.stream_batch_size and not force):
+                    continue
+                if isinstance(buffer, EventBuffer):
+                    df = buffer.to_dataframe()
+                    buffer.clear()
+                else:
+                    # entity lists may be appended by concurrent workers, only written records are removed
+                    records = buffer[:]
+                    del buffer[:len(records)]
+                    df = pd.DataFrame(records)
+                writer.write_df(df)
+
+    def log_status(self, current_count: int, total_count: int = 0, item_id=None):
+        """Logs progress after an item is completed. item_id is recorded for the checkpoint of the stage in
+        progress, so that a resumed stage can skip the item"""
+        self.flush_streams()
+        if self.current_stage is not None and item_id is not None:
+            self.stage_progress.setdefault(self.current_stage, set()).add(item_id)
+            self.save_checkpoint()
+        now = time.monotonic()
+        if self.progress_start is None:
+            self.progress_start = (now, current_count, self.event_counter)
+        elif self.progress_start[1] is None:
+            self.progress_start = (self.progress_start[0], current_count - 1, self.progress_start[2])
+        started, start_count, start_events = self.progress_start
         cur_progress = str(self.event_counter)
         if total_count == 0:
             completion = str(current_count)
         else:
             completion = str(round(current_count / total_count * 100, 2)) + '%'
-        self.logger.info('Events found so far ' + cur_progress + ', items completed: ' + completion)
+        throughput = ''
+        elapsed = now - started
+        if elapsed > 0 and current_count > start_count:
+            item_rate = (current_count - start_count) / elapsed
+            throughput = (', ' + str(round(item_rate, 2)) + ' items/s, '
+                          + str(round((self.event_counter - start_events) / elapsed, 2)) + ' events/s')
+            if total_count > current_count:
+                eta = datetime.timedelta(seconds=round((total_count - current_count) / item_rate))
+                throughput += ', ETA ' + str(eta)
+        self.logger.info('Events found so far ' + cur_progress + ', items completed: ' + completion + throughput)
 
     def added_event_count(self) -> int:
         """Gives event count added from the last time this was called and resets"""
@@ -79,20 +220,39 @@ class DevOpsConnector:
         return added_count
 
     def publish_df(self, df: pd.DataFrame, time_columns: list,
-                   preserve_timezone: bool, entity_name: str, file_path_name: str):
-        """Gives info and saves dataframe as parquet"""
+                   preserve_timezone: bool, entity_name: str, file_path_name: str, merge_keys: list = None):
+        """Gives info and saves dataframe as parquet.
+        If merge_keys are given, records are upserted into the existing output using those columns as the key"""
+        begin = time.perf_counter()
         self.logger.set_prefix(['DF', entity_name])
         self.logger.info('================= ' + entity_name + ' =================')
         for i in time_columns:
             self.logger.debug('Transforming time fields in column: ' + i)
             df[i] = LMPUtils.iso_to_datetime64(df[i], preserve_timezone)
+        if merge_keys is not None:
+            previous_df = self.load_df(file_path_name, self.output)
+            self.logger.info('Merging ' + str(len(df)) + ' records into ' + str(len(previous_df)) + ' existing')
+            # newer records replace the existing ones having the same key
+            df = pd.concat([previous_df, df], ignore_index=True)
+            df = df.drop_duplicates(subset=merge_keys, keep='last').reset_index(drop=True)
         self.logger.info('Glance of the records: ')
         print(df)
         self.logger.info('Summary: ')
         print(df.info())
-        parquet_filename = file_path_name + '.parquet.gz'
-        df.to_parquet(parquet_filename, compression='gzip')
-        self.logger.info('Pandas Dataframe written to ' + parquet_filename)
+        for path in self.output.write(df, file_path_name, time_columns):
+            self.logger.info('Pandas Dataframe written to ' + path)
+        RunMetrics.get().record_stage(self.namespace, 'publish_df', time.perf_counter() - begin, len(df),
+                                      entity_name)
+
+    @classmethod
+    def load_df(cls, file_path_name: str, output: OutputEngine = None) -> pd.DataFrame:
+        """Reads a dataframe previously saved by publish_df, gives an empty dataframe if not available"""
+        if output is None:
+            output = OutputEngine()
+        path = output.existing_output(file_path_name)
+        if path is None:
+            return pd.DataFrame()
+        return pd.read_parquet(path)
 
     @classmethod
     def add_link(cls, target_dict: dict, key, value):
@@ -124,3 +284,47 @@ class DevOpsConnector:
                 latest_time = itime
                 latest_id = i
         return latest_id
+
+    @classmethod
+    def get_max_timed_ids(cls, link_dict: dict, dt_dict_to_lookup: dict, keys=None) -> dict:
+        """Batch version of get_max_timed_id, gives the latest id for each key of a link dict.
+        Times are parsed once into int64 epochs and the latest id per key is chosen in a single vectorized pass.
+        Keys linked to an id without a readable time are left out, so that get_max_timed_id can report them"""
+        if keys is None:
+            keys = link_dict.keys()
+        key_list = []
+        key_codes = []
+        id_list = []
+        for key in keys:
+            input_ids = link_dict.get(key)
+            if not input_ids:
+                continue
+            # ids are kept in set iteration order, which decides ties the same way as get_max_timed_id
+            for i in input_ids:
+                key_codes.append(len(key_list))
+                id_list.append(i)
+            key_list.append(key)
+        if len(id_list) == 0:
+            return {}
+        key_codes = np.array(key_codes, dtype=np.int64)
+        # timezone naive times are considered UTC. unknown ids become NaT, same as unreadable times
+        times = pd.Series([None if i not in dt_dict_to_lookup else str(dt_dict_to_lookup[i]) for i in id_list],
+                          dtype=object)
+        parsed = pd.to_datetime(times, format='ISO8601', utc=True, errors='coerce')
+        valid = parsed.notna().to_numpy()
+        epochs = np.zeros(len(id_list), dtype=np.int64)
+        epochs[valid] = parsed[valid].dt.tz_localize(None).to_numpy(dtype='datetime64[us]').astype(np.int64)
+        unreadable_keys = set(key_codes[~valid].tolist())
+        # only times after this are considered, same as get_max_timed_id
+        min_epoch = np.datetime64('2000-01-01T00:00:00', 'us').astype(np.int64)
+        candidates = np.flatnonzero(valid & (epochs > min_epoch))
+        # stable order by key, latest time first, then position in the set. first row of each key is the latest
+        order = candidates[np.lexsort((candidates, -epochs[candidates], key_codes[candidates]))]
+        first_codes, first_rows = np.unique(key_codes[order], return_index=True)
+        latest = dict(zip(first_codes.tolist(), order[first_rows].tolist()))
+        result = {}
+        for code, key in enumerate(key_list):
+            if code in unreadable_keys:
+                continue
+            result[key] = id_list[latest[code]] if code in latest else 0
+        return result
@@ -0,0 +1,158 @@
+from array import array
+from typing import Iterator
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+
+class EventBuffer:
+    # column order of the event log, rows given to append_row follow it
+    columns = ['id', 'action', 'time', 'case', 'user', 'local_case', 'info1', 'info2', 'ns', 'duration']
+    # low cardinality columns are stored as int32 codes of a per column dictionary
+    dictionary_columns = ['action', 'case', 'user', 'ns']
+
+    def __init__(self):
+        """Column oriented event store. Keeps one append array per column instead of one dict per event"""
+        self.values = {}
+        self.codes = {}
+        # input - column value, out - code. insertion order of the dict gives the categories
+        self.dictionaries = {}
+        # (position in a row, column) of dictionary and plain columns, rows are appended without building a dict
+        self.dictionary_positions = [(self.columns.index(column), column) for column in self.dictionary_columns]
+        self.value_positions = [(position, column) for position, column in enumerate(self.columns)
+                                if column not in self.dictionary_columns]
+        self.length = 0
+        self.clear()
+
+    def clear(self):
+        """Removes all events, dictionaries are reset as well"""
+        for column in self.columns:
+            if column in self.dictionary_columns:
+                self.codes[column] = array('i')
+                self.dictionaries[column] = {}
+            elif column == 'duration':
+                self.values[column] = array('q')
+            else:
+                self.values[column] = []
+        self.length = 0
+
+    def __len__(self) -> int:
+        return self.length
+
+    def append(self, event: dict):
+        """Appends an event dict having the standard event columns"""
+        self.append_row(tuple(event[column] for column in self.columns))
+
+    def append_row(self, row: tuple):
+        """Appends an event given as values in the order of columns"""
+        for position, column in self.dictionary_positions:
+            dictionary = self.dictionaries[column]
+            value = row[position]
+            code = dictionary.get(value)
+            if code is None:
+                code = len(dictionary)
+                dictionary[value] = code
+            self.codes[column].append(code)
+        values = self.values
+        for position, column in self.value_positions:
+            values[column].append(row[position])
+        self.length += 1
+
+    def extend(self, other: 'EventBuffer'):
+        """Appends all events of another buffer, translating its dictionary codes to the ones of this buffer"""
+        for column in self.dictionary_columns:
+            dictionary = self.dictionaries[column]
+            translation = np.empty(len(other.dictionaries[column]), dtype=np.int32)
+            for value, other_code in other.dictionaries[column].items():
+                code = dictionary.get(value)
+                if code is None:
+                    code = len(dictionary)
+                    dictionary[value] = code
+                translation[other_code] = code
+            other_codes = np.array(other.codes[column], dtype=np.int32)
+            self.codes[column].frombytes(translation[other_codes].tobytes())
+        for column, column_values in self.values.items():
+            column_values.extend(other.values[column])
+        self.length += len(other)
+
+    def replace_values(self, column: str, replacements: dict):
+        """Replaces values of a dictionary column, ex: placeholders resolved after events were added. Only the
+        dictionary is changed, codes are translated if a replacement is already a value of the column"""
+        dictionary = {}
+        translation = np.empty(len(self.dictionaries[column]), dtype=np.int32)
+        for value, code in self.dictionaries[column].items():
+            translation[code] = dictionary.setdefault(replacements.get(value, value), len(dictionary))
+        if len(dictionary) < len(self.dictionaries[column]):
+            codes = np.array(self.codes[column], dtype=np.int32)
+            self.codes[column] = array('i', translation[codes].tobytes())
+        self.dictionaries[column] = dictionary
+
+    def to_state(self) -> dict:
+        """Gives the buffer as plain lists and dicts, ex: to be saved as json"""
+        return {'codes': {column: codes.tolist() for column, codes in self.codes.items()},
+                'categories': {column: self.categories(column) for column in self.dictionary_columns},
+                'values': {column: list(column_values) for column, column_values in self.values.items()}}
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'EventBuffer':
+        """Builds a buffer from the output of to_state"""
+        buffer = cls()
+        for column in cls.dictionary_columns:
+            buffer.codes[column] = array('i', state['codes'][column])
+            buffer.dictionaries[column] = {value: code for code, value in enumerate(state['categories'][column])}
+        for column in buffer.values:
+            if column == 'duration':
+                buffer.values[column] = array('q', state['values'][column])
+            else:
+                buffer.values[column] = state['values'][column]
+        buffer.length = len(state['values']['id'])
+        return buffer
+
+    def categories(self, column: str) -> list:
+        return list(self.dictionaries[column].keys())
+
+    def column(self, column: str) -> list:
+        """Gives decoded values of a column"""
+        if column in self.dictionary_columns:
+            categories = self.categories(column)
+            return [categories[code] for code in self.codes[column]]
+        return list(self.values[column])
+
+    def rows(self) -> Iterator[dict]:
+        """Iterates events as dicts, for code which still expects the list of dicts form"""
+        decoded = {column: self.column(column) for column in self.columns}
+        for i in range(self.length):
+            yield {column: decoded[column][i] for column in self.columns}
+
+    def to_list(self) -> list[dict]:
+        return list(self.rows())
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Builds the dataframe from the column arrays. Dictionary columns become categoricals built from
+        the codes, no intermediate list of dicts is created"""
+        data = {}
+        for column in self.columns:
+            if column in self.dictionary_columns:
+                # arrays are copied, a view would block further appends to the buffer
+                codes = np.array(self.codes[column], dtype=np.int32)
+                data[column] = pd.Categorical.from_codes(codes, categories=pd.Index(self.categories(column),
+                                                                                    dtype=object))
+            elif column == 'duration':
+                data[column] = np.array(self.values[column], dtype=np.int64)
+            else:
+                data[column] = pd.Series(self.values[column], dtype=object)
+        return pd.DataFrame(data, columns=self.columns)
+
+    def to_arrow(self) -> pa.Table:
+        """Builds an arrow table, with dictionary encoded arrays for dictionary columns"""
+        arrays = []
+        for column in self.columns:
+            if column in self.dictionary_columns:
+                indices = pa.array(np.array(self.codes[column], dtype=np.int32))
+                arrays.append(pa.DictionaryArray.from_arrays(indices, pa.array(self.categories(column),
+                                                                                 type=pa.string())))
+            elif column == 'duration':
+                arrays.append(pa.array(np.array(self.values[column], dtype=np.int64)))
+            else:
+                arrays.append(pa.array(self.values[column]))
+        return pa.Table.from_arrays(arrays, names=self.columns)
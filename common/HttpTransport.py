@@ -0,0 +1,176 @@
+import importlib.util
+import json
+import logging
+import random
+import time
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from ResponseCache import ResponseCache
+from RateLimiter import HostRateLimiter
+from RunMetrics import RunMetrics
+
+
+class TransportAdapter(HTTPAdapter):
+    # throttled or unavailable, the request was not processed and can be sent again whatever the method is
+    retry_statuses = [429, 503]
+    # gateway errors may come after the request was processed, only sent again for idempotent methods
+    idempotent_retry_statuses = [502, 504]
+    idempotent_methods = ['GET', 'HEAD', 'OPTIONS']
+
+    def __init__(self, cache: ResponseCache = None, retries: int = 5, backoff: float = 1, max_backoff: float = 60,
+                 requests_per_second: float = 0, adaptive_rate: bool = True, **kwargs):
+        """Connection pooling adapter which revalidates cached GET responses using If-None-Match.
+        Requests are paced by the rate limiter of their host, and throttled or failed requests are sent again
+        after Retry-After or a jittered exponential backoff"""
+        self.logger = logging.getLogger('scriptLogger')
+        self.cache = cache
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.requests_per_second = requests_per_second
+        self.adaptive_rate = adaptive_rate
+        super().__init__(**kwargs)
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Full jitter exponential backoff, so that concurrent workers do not retry at the same instant"""
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        limiter = HostRateLimiter.for_host(urlparse(request.url).netloc, self.requests_per_second,
+                                           self.adaptive_rate)
+        metrics = RunMetrics.get()
+        idempotent = request.method in self.idempotent_methods
+        attempt = 0
+        while True:
+            waited = limiter.acquire()
+            begin = time.perf_counter()
+            try:
+                response = self.send_cached(request, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as error:
+                metrics.record_request(request.url, request.method, 0, time.perf_counter() - begin, 0, attempt > 0,
+                                       False, waited)
+                if not idempotent or attempt >= self.retries:
+                    raise
+                delay = self.backoff_delay(attempt)
+                self.logger.warning(type(error).__name__ + ' for ' + request.method + ' ' + str(request.url)
+                                    + ', retrying in ' + str(round(delay, 1)) + 's')
+                time.sleep(delay)
+                attempt += 1
+                continue
+            retry_after = limiter.update(response.headers)
+            # streamed bodies are read by the caller later, their bytes are counted as they are read
+            streamed = kwargs.get('stream') and response._content is False
+            size = 0 if streamed else len(response.content)
+            metrics.record_request(request.url, request.method, response.status_code, time.perf_counter() - begin,
+                                   size, attempt > 0, response.status_code == 429, waited)
+            retry = response.status_code in self.retry_statuses or (
+                    idempotent and response.status_code in self.idempotent_retry_statuses)
+            if not retry or attempt >= self.retries:
+                if streamed:
+                    self.count_streamed_bytes(request, response)
+                return response
+            delay = retry_after if retry_after is not None else self.backoff_delay(attempt)
+            self.logger.warning('received ' + str(response.status_code) + ' for ' + request.method + ' '
+                                + str(request.url) + ', retrying in ' + str(round(delay, 1)) + 's')
+            response.close()
+            if response.status_code == 429:
+                # throttling applies to all requests to the host, not only to this one
+                limiter.block(delay)
+            else:
+                time.sleep(delay)
+            attempt += 1
+
+    @classmethod
+    def count_streamed_bytes(cls, request: requests.PreparedRequest, response: requests.Response):
+        """Adds the decoded bytes of a streamed body to the metrics of the request once the caller has read it"""
+        raw_stream = response.raw.stream
+
+        def stream(*args, **kwargs):
+            size = 0
+            try:
+                for chunk in raw_stream(*args, **kwargs):
+                    size += len(chunk)
+                    yield chunk
+            finally:
+                RunMetrics.get().record_bytes(request.url, request.method, size)
+        response.raw.stream = stream
+
+    def send_cached(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        """Sends a GET with If-None-Match of the cached entry, 304 is answered from the cache. Streamed requests,
+        ex: all requests of the azure devops sdk, are cached as well. Their body is read here only if the
+        response has an ETag, other streamed responses are left to the caller"""
+        if self.cache is None or request.method != 'GET':
+            return super().send(request, **kwargs)
+        key = self.cache.key(request.method, request.url, request.headers)
+        entry = self.cache.get(key)
+        if entry is not None:
+            request.headers['If-None-Match'] = entry['etag']
+        response = super().send(request, **kwargs)
+        if response.status_code == 304 and entry is not None:
+            self.cache.record(True)
+            response.close()
+            return self.cache.build_response(entry, request, self)
+        self.cache.record(False)
+        etag = response.headers.get('ETag')
+        if response.status_code == 200 and etag is not None:
+            self.cache.put(key, etag, response)
+        return response
+
+
+class HttpTransport:
+    def __init__(self, connect_timeout: float = 10, read_timeout: float = 60, pool_size: int = 10,
+                 headers: dict = None, auth=None, cache: ResponseCache = None, retry_settings: dict = None,
+                 rate_limit_settings: dict = None):
+        """Persistent http session with keep-alive connection pooling, compression, timeouts, per host rate
+        limiting and retries. Optionally serves unchanged GET responses from an on-disk cache"""
+        self.session = requests.Session()
+        self.timeout = (connect_timeout, read_timeout)
+        self.session.headers.update({'Accept-Encoding': self.accept_encoding()})
+        if headers is not None:
+            self.session.headers.update(headers)
+        self.session.auth = auth
+        self.cache = cache
+        retry_settings = retry_settings if retry_settings is not None else {}
+        rate_limit_settings = rate_limit_settings if rate_limit_settings is not None else {}
+        # pool size should be at least the number of workers sharing this transport
+        self.adapter = TransportAdapter(cache, retry_settings.get('max_retries', 5),
+                                        retry_settings.get('backoff_seconds', 1),
+                                        retry_settings.get('max_backoff_seconds', 60),
+                                        rate_limit_settings.get('requests_per_second', 0),
+                                        rate_limit_settings.get('adaptive', True),
+                                        pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount(self.session)
+
+    @classmethod
+    def from_settings(cls, http_settings: dict, headers: dict = None, auth=None) -> 'HttpTransport':
+        """Creates a transport using the 'http' section of settings.json"""
+        cache = None
+        cache_settings = http_settings.get('cache', {})
+        if cache_settings.get('enabled', False):
+            cache = ResponseCache.open(cache_settings['path'], cache_settings['max_size_mb'])
+        return cls(http_settings.get('connect_timeout', 10), http_settings.get('read_timeout', 60),
+                   http_settings.get('pool_size', 10), headers, auth, cache, http_settings.get('retry'),
+                   http_settings.get('rate_limit'))
+
+    def mount(self, session: requests.Session):
+        """Mounts the adapter of this transport on a session, which can also be a session owned by a library"""
+        session.mount('http://', self.adapter)
+        session.mount('https://', self.adapter)
+
+    @classmethod
+    def accept_encoding(cls) -> str:
+        """brotli is only advertised if a decoder is installed, otherwise br responses cannot be read"""
+        encodings = 'gzip, deflate'
+        if importlib.util.find_spec('brotli') is not None or importlib.util.find_spec('brotlicffi') is not None:
+            encodings += ', br'
+        return encodings
+
+    def request(self, method: str, url: str, params: dict = None, payload: dict = None) -> requests.Response:
+        """Sends the request through the pooled session, payload is sent as json body"""
+        return self.session.request(method, url, params=params, json=payload, timeout=self.timeout)
+
+    @classmethod
+    def parse_json(cls, response: requests.Response) -> dict:
+        """Parses json directly from response bytes, skipping the text decoding step"""
+        return json.loads(response.content)
@@ -0,0 +1,53 @@
+import json
+import os
+import threading
+import time
+
+
+class IdentityCache:
+    def __init__(self, cache_file: str, ttl_hours: float = 168):
+        """Persisted identities of user accounts, ex: email of a jira account id, warm starting the next run.
+        Entries older than ttl_hours are not given, so that they are looked up again"""
+        self.cache_file = cache_file
+        self.ttl = ttl_hours * 3600
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # input - account id, out - {'value': identity, 'time': unix time of the lookup}
+        self.entries = {}
+        if os.path.exists(cache_file):
+            try:
+                with open(cache_file, 'r') as identity_file:
+                    self.entries = json.load(identity_file)
+            except (OSError, ValueError):
+                # a broken cache only costs lookups
+                self.entries = {}
+
+    def get(self, account_id: str) -> str | None:
+        """Gives the identity of an account, None if not cached or expired"""
+        with self.lock:
+            entry = self.entries.get(account_id)
+            if entry is None or time.time() - entry['time'] > self.ttl:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry['value']
+
+    def put(self, account_id: str, value: str):
+        with self.lock:
+            self.entries[account_id] = {'value': value, 'time': time.time()}
+
+    def save(self):
+        """Writes the cache, expired entries are dropped. File is replaced at once, so that a failing run never
+        leaves a partially written cache"""
+        now = time.time()
+        with self.lock:
+            entries = {account_id: entry for account_id, entry in self.entries.items()
+                       if now - entry['time'] <= self.ttl}
+        with open(self.cache_file + '.tmp', 'w') as identity_file:
+            json.dump(entries, identity_file)
+        os.replace(self.cache_file + '.tmp', self.cache_file)
+
+    def summary(self) -> str:
+        return ('identity cache hits: ' + str(self.hits) + ', misses: ' + str(self.misses) + ', entries: ' +
+                str(len(self.entries)))
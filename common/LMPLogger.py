@@ -1,16 +1,27 @@
 import logging
+import threading
 
 
 class LMPLogger:
     def __init__(self, init_prefix: str, logger: logging.Logger):
         self.logger = logger
         self.init_prefix = '[' + init_prefix + ']'
+        # prefix is kept per thread, so that concurrent workers of a connector do not overwrite each other
+        self.local = threading.local()
         self.prefix = str(self.init_prefix)
         # calling instance method from init - just to test
         self.info('LMPLogger v0.0.1 initialised')
         # TODO: use record factory for better logging
         #  https://stackoverflow.com/questions/17558552/how-do-i-add-custom-field-to-python-log-format-string
 
+    @property
+    def prefix(self) -> str:
+        return getattr(self.local, 'prefix', self.init_prefix)
+
+    @prefix.setter
+    def prefix(self, value: str):
+        self.local.prefix = value
+
     def set_prefix(self, arg_list: list[str]):
         """Set all arguments as a list"""
         prefix = ''
@@ -40,4 +51,4 @@ class LMPLogger:
 
     def error(self, message: str):
         full_message = self.prefix + message
-        self.logger.error(full_message)
\ No newline at end of file
+        self.logger.error(full_message)
@@ -1,4 +1,9 @@
+import json
 import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from datetime import datetime
 import pandas as pd
 
@@ -15,6 +20,25 @@ class LMPUtils:
         print('[DEBUG] ' + env_bool_str + ' is set to ' + str(bool_value))
         return bool_value
 
+    @classmethod
+    def load_settings(cls, tool: str, path: str = '../common/settings.json') -> dict:
+        """Gives the settings of a tool. Sections of 'common' are shared by all tools, a tool section can override
+        their keys"""
+        with open(path, 'r') as settings_file:
+            settings = json.load(settings_file)
+        return cls.merge_settings(settings.get('common', {}), settings[tool])
+
+    @classmethod
+    def merge_settings(cls, defaults: dict, overrides: dict) -> dict:
+        """Merges nested settings, values of overrides win"""
+        merged = dict(defaults)
+        for key, value in overrides.items():
+            if isinstance(value, dict) and isinstance(merged.get(key), dict):
+                merged[key] = cls.merge_settings(merged[key], value)
+            else:
+                merged[key] = value
+        return merged
+
     @classmethod
     def rfc2822_to_iso(cls, rfc2822_string: str) -> datetime:
         """converts Thu, 26 Sep 2024 09:37:22 +0530 like date to 2024-09-26 09:37:22+05:30"""
@@ -35,6 +59,15 @@ class LMPUtils:
             converted_series = pd.to_datetime(series, format='ISO8601', utc=True).dt.tz_localize(None)
         return converted_series
 
+    @classmethod
+    def datetime64_to_iso(cls, value) -> str:
+        """converts a value read back from a published dataframe to iso8601 string.
+        timezone naive values are considered UTC, as publish_df converts to UTC when not preserving timezone"""
+        timestamp = pd.Timestamp(value)
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.tz_localize('UTC')
+        return timestamp.isoformat()
+
     @classmethod
     def get_seconds_difference_same_zone(cls, start, end):
         """
@@ -44,3 +77,63 @@ class LMPUtils:
         dt1 = datetime.fromisoformat(str(start))
         dt2 = datetime.fromisoformat(str(end))
         return int((dt2 - dt1).total_seconds())
+
+    @classmethod
+    def ordered_map(cls, func, items, workers: int = 1, pool_type: str = 'thread', initializer=None):
+        """Runs func over items using a bounded thread or process pool and yields results in input order.
+        Falls back to a plain loop when workers is 1 or less"""
+        if workers <= 1:
+            for item in items:
+                yield func(item)
+            return
+        executor_class = ProcessPoolExecutor if pool_type == 'process' else ThreadPoolExecutor
+        with executor_class(max_workers=workers, initializer=initializer) as executor:
+            # keep only a limited number of items in flight so large inputs are not submitted at once
+            pending = deque()
+            for item in items:
+                pending.append(executor.submit(func, item))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    @classmethod
+    def prefetch(cls, items, buffer_size: int = 100):
+        """Reads items on a background thread, keeping up to buffer_size items ahead of the caller.
+        Paged api iterators fetch their next page while the current one is processed.
+        Errors of the background thread are raised to the caller"""
+        buffer = queue.Queue(maxsize=buffer_size)
+        stopped = threading.Event()
+        end_marker = object()
+
+        def put(value) -> bool:
+            # gives up once the caller stopped reading, so that the thread does not block forever
+            while not stopped.is_set():
+                try:
+                    buffer.put(value, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def read():
+            try:
+                for item in items:
+                    if not put((item, None)):
+                        return
+                put((end_marker, None))
+            except Exception as e:
+                put((end_marker, e))
+
+        thread = threading.Thread(target=read, daemon=True)
+        thread.start()
+        try:
+            while True:
+                item, error = buffer.get()
+                if error is not None:
+                    raise error
+                if item is end_marker:
+                    return
+                yield item
+        finally:
+            stopped.set()
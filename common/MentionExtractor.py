@@ -0,0 +1,77 @@
+import re
+from typing import Iterable
+
+
+class MentionExtractor:
+    # keys of atlassian document format nodes holding text, ex: text nodes, inlineCard urls and link mark hrefs
+    adf_text_keys = {'text', 'url', 'href'}
+
+    def __init__(self, patterns: dict[str, str]):
+        """Finds mentions of several kinds with a single combined regex. patterns - input kind, out regex.
+        The first group of a regex is given as the mention, the whole match if it has no groups.
+        Matches do not overlap, patterns of an extractor should not match the same text"""
+        alternatives = []
+        # input - group index of the kind in the combined regex, out - (kind, group index of the mention)
+        self.groups = {}
+        group_index = 1
+        for kind, pattern in patterns.items():
+            inner_groups = re.compile(pattern).groups
+            self.groups[group_index] = (kind, group_index + 1 if inner_groups > 0 else group_index)
+            alternatives.append('(' + pattern + ')')
+            group_index += inner_groups + 1
+        self.kinds = list(patterns)
+        self.regex = re.compile('|'.join(alternatives))
+
+    def find(self, text: str | None) -> dict[str, list[str]]:
+        """Gives mentions of each kind found in text, in the order they appear"""
+        mentions = {kind: [] for kind in self.kinds}
+        if not text:
+            return mentions
+        for match in self.regex.finditer(text):
+            # lastindex is the group closed last, the enclosing group of the matched pattern
+            kind, mention_group = self.groups[match.lastindex]
+            mentions[kind].append(match.group(mention_group))
+        return mentions
+
+    def first(self, kind: str, *texts: str | None) -> str:
+        """Gives the first mention of a kind in texts, empty string if there is none"""
+        for text in texts:
+            if not text:
+                continue
+            for match in self.regex.finditer(text):
+                match_kind, mention_group = self.groups[match.lastindex]
+                if match_kind == kind:
+                    return match.group(mention_group)
+        return ''
+
+    @classmethod
+    def adf_texts(cls, node) -> list[str]:
+        """Gives texts and urls of a document in atlassian document format, without serializing the tree"""
+        texts = []
+        text_keys = cls.adf_text_keys
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, dict):
+                for key, value in node.items():
+                    if key in text_keys and isinstance(value, str):
+                        texts.append(value)
+                    elif isinstance(value, (dict, list)):
+                        stack.append(value)
+            elif isinstance(node, list):
+                # reversed, so that texts are given in document order
+                stack.extend(reversed(node))
+        return texts
+
+    def find_in_document(self, document) -> dict[str, list[str]]:
+        """Gives mentions found in an atlassian document format tree, or in a plain text body"""
+        if isinstance(document, str):
+            return self.find(document)
+        if document is None:
+            return self.find(None)
+        return self.find('\n'.join(self.adf_texts(document)))
+
+    def find_many(self, bodies: Iterable, documents: bool = False) -> list[dict[str, list[str]]]:
+        """Gives mentions of each body, in the order of bodies. documents - bodies are adf trees or plain text"""
+        find = self.find_in_document if documents else self.find
+        return [find(body) for body in bodies]
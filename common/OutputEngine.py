@@ -0,0 +1,102 @@
+import logging
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+
+
+class OutputEngine:
+    # file extension per parquet codec. gzip keeps the names of earlier outputs
+    extensions = {'gzip': '.parquet.gz', 'zstd': '.parquet.zst', 'snappy': '.parquet.snappy', 'lz4': '.parquet.lz4',
+                  'none': '.parquet'}
+    dataset_extension = '.dataset'
+    arrow_extension = '.arrow'
+
+    def __init__(self, compression: str = 'gzip', compression_level: int = None, categorical_columns: list = None,
+                 partitioned: bool = False, partition_columns: list = None, arrow_ipc: bool = False):
+        """Writes dataframes as parquet using the configured codec, optionally as a hive partitioned dataset
+        and as an uncompressed arrow ipc (feather) file, which can be memory mapped"""
+        if compression not in self.extensions:
+            raise ValueError('unsupported parquet compression: ' + compression)
+        self.logger = logging.getLogger('scriptLogger')
+        self.compression = compression
+        self.compression_level = compression_level
+        # low cardinality string columns, written as dictionary encoded columns
+        self.categorical_columns = categorical_columns if categorical_columns is not None else []
+        self.partitioned = partitioned
+        # 'month' is derived from the first time column, columns missing in a dataframe are skipped
+        self.partition_columns = partition_columns if partition_columns is not None else ['ns', 'month']
+        self.arrow_ipc = arrow_ipc
+
+    @classmethod
+    def from_settings(cls, output_settings: dict) -> 'OutputEngine':
+        """Creates an output engine using the 'output' section of settings.json"""
+        return cls(output_settings.get('compression', 'gzip'), output_settings.get('compression_level'),
+                   output_settings.get('categorical_columns'), output_settings.get('partitioned', False),
+                   output_settings.get('partition_columns'), output_settings.get('arrow_ipc', False))
+
+    @property
+    def codec(self):
+        """Codec name as expected by pyarrow"""
+        return None if self.compression == 'none' else self.compression
+
+    def parquet_filename(self, file_path_name: str) -> str:
+        return file_path_name + self.extensions[self.compression]
+
+    def existing_output(self, file_path_name: str):
+        """Gives the path of an earlier output, written with any of the codecs or as a dataset. None if not found"""
+        dataset_path = file_path_name + self.dataset_extension
+        # configured format is preferred, so that the latest output is read after a codec change
+        candidates = [dataset_path] if self.partitioned else [self.parquet_filename(file_path_name)]
+        candidates += [file_path_name + extension for extension in self.extensions.values()] + [dataset_path]
+        for candidate in candidates:
+            if os.path.exists(candidate):
+                return candidate
+        return None
+
+    def to_categorical(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Types the configured low cardinality columns as categoricals"""
+        for column in self.categorical_columns:
+            if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].astype('category')
+        return df
+
+    def write(self, df: pd.DataFrame, file_path_name: str, time_columns: list) -> list:
+        """Writes the dataframe and gives the list of written paths"""
+        df = self.to_categorical(df)
+        paths = []
+        if self.partitioned:
+            paths.append(self.write_dataset(df, file_path_name, time_columns))
+        else:
+            parquet_filename = self.parquet_filename(file_path_name)
+            df.to_parquet(parquet_filename, compression=self.codec, compression_level=self.compression_level)
+            paths.append(parquet_filename)
+        if self.arrow_ipc:
+            # kept uncompressed, compressed buffers cannot be memory mapped
+            arrow_filename = file_path_name + self.arrow_extension
+            feather.write_feather(df, arrow_filename, compression='uncompressed')
+            paths.append(arrow_filename)
+        return paths
+
+    def write_dataset(self, df: pd.DataFrame, file_path_name: str, time_columns: list) -> str:
+        """Writes a hive partitioned dataset, ex: AZD_event_log_x.dataset/ns=proj/month=2025-01/part-0.parquet"""
+        df = df.copy()
+        partition_columns = []
+        for column in self.partition_columns:
+            if column == 'month' and time_columns:
+                # derived again on every write, records merged from a previous dataset already have a month
+                df[column] = df[time_columns[0]].dt.strftime('%Y-%m')
+            if column in df.columns:
+                # partition values become directory names, missing values are kept in their own directory
+                df[column] = df[column].astype(object).where(df[column].notna(), 'na').astype(str)
+                partition_columns.append(column)
+        dataset_path = file_path_name + self.dataset_extension
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        file_options = ds.ParquetFileFormat().make_write_options(compression=self.codec,
+                                                                 compression_level=self.compression_level)
+        # partitions are rewritten as a whole, previous records are already merged into the dataframe
+        ds.write_dataset(table, dataset_path, format='parquet', file_options=file_options,
+                         partitioning=partition_columns or None, partitioning_flavor='hive',
+                         existing_data_behavior='delete_matching')
+        return dataset_path
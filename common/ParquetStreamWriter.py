@@ -0,0 +1,73 @@
+import logging
+import threading
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from LMPUtils import LMPUtils
+from OutputEngine import OutputEngine
+
+
+class ParquetStreamWriter:
+    def __init__(self, file_path_name: str, time_columns: list, preserve_timezone: bool, output: OutputEngine = None):
+        """Writes batches of records as row groups of a single parquet file, keeping memory usage flat.
+        Schema is taken from the first batch, columns without any value in it are written as strings"""
+        self.logger = logging.getLogger('scriptLogger')
+        # codec and categorical columns are taken from the output engine, datasets and arrow files are not streamed
+        self.output = output if output is not None else OutputEngine()
+        self.parquet_filename = self.output.parquet_filename(file_path_name)
+        self.time_columns = time_columns
+        self.preserve_timezone = preserve_timezone
+        self.writer = None
+        self.schema = None
+        self.rows_written = 0
+        # writers are shared by connectors running in parallel threads
+        self.lock = threading.Lock()
+
+    @classmethod
+    def stable_schema(cls, schema: pa.Schema) -> pa.Schema:
+        """Replaces null types, which cannot hold values of later batches, with strings.
+        Dictionary indices are widened, as pandas picks the smallest code type per batch"""
+        fields = []
+        for field in schema:
+            if pa.types.is_null(field.type):
+                field = field.with_type(pa.string())
+            elif pa.types.is_dictionary(field.type):
+                value_type = pa.string() if pa.types.is_null(field.type.value_type) else field.type.value_type
+                field = field.with_type(pa.dictionary(pa.int32(), value_type))
+            elif pa.types.is_list(field.type) and pa.types.is_null(field.type.value_type):
+                field = field.with_type(pa.list_(pa.string()))
+            fields.append(field)
+        return pa.schema(fields, metadata=schema.metadata)
+
+    def write_df(self, df: pd.DataFrame):
+        """Converts time columns of the batch and appends it as a row group"""
+        if df.empty:
+            return
+        for i in self.time_columns:
+            df[i] = LMPUtils.iso_to_datetime64(df[i], self.preserve_timezone)
+        df = self.output.to_categorical(df)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with self.lock:
+            if self.writer is None:
+                self.schema = self.stable_schema(table.schema)
+                self.writer = pq.ParquetWriter(self.parquet_filename, self.schema, compression=self.output.codec,
+                                              compression_level=self.output.compression_level)
+            # columns missing in this batch are filled with nulls
+            for field in self.schema:
+                if field.name not in table.column_names:
+                    table = table.append_column(field.name, pa.nulls(len(table), field.type))
+            table = table.select(self.schema.names).cast(self.schema)
+            self.writer.write_table(table)
+            self.rows_written += len(table)
+        self.logger.debug('[DF] ' + str(len(table)) + ' records written to ' + self.parquet_filename)
+
+    def write_records(self, records: list[dict]):
+        self.write_df(pd.DataFrame(records))
+
+    def close(self):
+        """Writes the parquet footer. File cannot be read until the writer is closed"""
+        with self.lock:
+            if self.writer is not None:
+                self.writer.close()
+                self.writer = None
+        self.logger.info('[DF] ' + str(self.rows_written) + ' records streamed to ' + self.parquet_filename)
@@ -0,0 +1,144 @@
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float = 1):
+        """Thread safe token bucket. Tokens refill at rate per second up to capacity.
+        A rate of 0 or less disables limiting"""
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, api_delay: float, requests_per_second: float = 0, burst: float = 1) -> 'TokenBucket':
+        """Creates a bucket using requests per second if given, else using api delay in seconds between calls"""
+        if requests_per_second > 0:
+            rate = requests_per_second
+        elif api_delay > 0:
+            rate = 1 / api_delay
+        else:
+            rate = 0
+        return cls(rate, burst)
+
+    def acquire(self) -> float:
+        """Takes a token, sleeping until it is available. Returns the time waited in seconds"""
+        if self.rate <= 0:
+            return 0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # token is reserved even if not available yet, so that waiting threads are served in order
+            self.tokens -= 1
+            wait = 0 if self.tokens >= 0 else -self.tokens / self.rate
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class HostRateLimiter:
+    # one limiter per host, shared by all transports of a process, as rate limits are enforced per host and user
+    instances = {}
+    instances_lock = threading.Lock()
+    # rate limit headers of gitlab (RateLimit-*), azure devops and jira (X-RateLimit-*)
+    header_prefixes = ['RateLimit-', 'X-RateLimit-']
+
+    def __init__(self, host: str, requests_per_second: float = 0, adaptive: bool = True):
+        """Paces requests to a host. Rate limit headers of responses slow the pace down when the remaining quota
+        would not last until the quota is reset, and Retry-After blocks requests until the given time.
+        requests_per_second is the pace while the quota is not low, 0 or less sends requests without waiting"""
+        self.host = host
+        self.base_rate = requests_per_second
+        self.adaptive = adaptive
+        self.bucket = TokenBucket(requests_per_second)
+        # monotonic time until which no requests are sent
+        self.blocked_until = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def for_host(cls, host: str, requests_per_second: float = 0, adaptive: bool = True) -> 'HostRateLimiter':
+        """Gives the limiter of a host, creating it if needed"""
+        with cls.instances_lock:
+            if host not in cls.instances:
+                cls.instances[host] = cls(host, requests_per_second, adaptive)
+            return cls.instances[host]
+
+    def acquire(self) -> float:
+        """Waits until a request can be sent. Returns the time waited in seconds"""
+        with self.lock:
+            wait = max(0.0, self.blocked_until - time.monotonic())
+        if wait > 0:
+            time.sleep(wait)
+        return wait + self.bucket.acquire()
+
+    def block(self, seconds: float):
+        """No requests are sent to the host for the given seconds, ex: after a 429 response"""
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    @classmethod
+    def retry_after(cls, headers) -> float | None:
+        """Seconds given by a Retry-After header, either as a number or as an http date"""
+        value = headers.get('Retry-After')
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return None
+
+    @classmethod
+    def reset_seconds(cls, value: str) -> float | None:
+        """Seconds until the quota is reset. Reset is given as epoch seconds by gitlab and azure devops,
+        and as an iso8601 time by jira"""
+        try:
+            return float(value) - time.time()
+        except ValueError:
+            pass
+        try:
+            return (datetime.fromisoformat(value.replace('Z', '+00:00')) - datetime.now(timezone.utc)).total_seconds()
+        except ValueError:
+            return None
+
+    def update(self, headers) -> float | None:
+        """Adapts the pace using the rate limit headers of a response. Gives the Retry-After seconds if given"""
+        retry_after = self.retry_after(headers)
+        if retry_after is not None:
+            self.block(retry_after)
+        if not self.adaptive:
+            return retry_after
+        for prefix in self.header_prefixes:
+            remaining = headers.get(prefix + 'Remaining')
+            reset = headers.get(prefix + 'Reset')
+            if remaining is None or reset is None:
+                continue
+            limit = headers.get(prefix + 'Limit')
+            try:
+                remaining = float(remaining)
+                limit = float(limit) if limit is not None else None
+            except ValueError:
+                continue
+            seconds = self.reset_seconds(reset)
+            if seconds is None or seconds <= 0:
+                continue
+            if remaining <= 0:
+                # quota is used up, nothing can be sent until it is reset
+                self.block(seconds)
+            elif limit is not None and remaining > limit / 2:
+                # plenty of quota left, back to the configured pace
+                self.bucket.rate = self.base_rate
+            else:
+                # spread the remaining quota until the reset
+                quota_rate = remaining / seconds
+                self.bucket.rate = quota_rate if self.base_rate <= 0 else min(self.base_rate, quota_rate)
+            break
+        return retry_after
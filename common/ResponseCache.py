@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+
+class ResponseCache:
+    # one cache object per directory, so that all transports of a process share hit counts and lru order
+    instances = {}
+
+    # request headers changing the response, responses of different tokens or formats are kept apart
+    identity_headers = ['Authorization', 'PRIVATE-TOKEN', 'Accept']
+
+    def __init__(self, cache_dir: str, max_size_mb: float = 1024):
+        """Size bounded on-disk cache of GET responses having an ETag. Least recently used entries are evicted.
+        File modification time is used as the access time, hence no separate index is kept.
+        An entry file is a json line of metadata followed by the raw body, nothing in it is executed when read"""
+        self.cache_dir = cache_dir
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        # input - cache key, out - size of the entry file. ordered from least to most recently used
+        self.index = OrderedDict()
+        entries = []
+        for file_name in os.listdir(cache_dir):
+            if file_name.endswith('.entry'):
+                stat = os.stat(os.path.join(cache_dir, file_name))
+                entries.append((stat.st_mtime, file_name[:-6], stat.st_size))
+        for _, key, size in sorted(entries):
+            self.index[key] = size
+        self.size = sum(self.index.values())
+
+    @classmethod
+    def open(cls, cache_dir: str, max_size_mb: float = 1024) -> 'ResponseCache':
+        """Gives the cache object of a directory, creating it if needed"""
+        cache_path = os.path.abspath(cache_dir)
+        if cache_path not in cls.instances:
+            cls.instances[cache_path] = cls(cache_dir, max_size_mb)
+        return cls.instances[cache_path]
+
+    @classmethod
+    def key(cls, method: str, url: str, headers: dict = None) -> str:
+        """Cache key using method, url and the identity headers of the request. Prepared urls already contain the
+        query params. Only the hash is stored, hence tokens are not written to disk"""
+        headers = headers if headers is not None else {}
+        parts = [method, url] + [name + ': ' + str(headers.get(name, '')) for name in cls.identity_headers]
+        return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + '.entry')
+
+    def get(self, key: str) -> dict | None:
+        """Gives the stored entry with etag, status, headers and body. None if not cached"""
+        with self.lock:
+            if key not in self.index:
+                return None
+            self.index.move_to_end(key)
+        try:
+            with open(self.entry_path(key), 'rb') as entry_file:
+                entry = json.loads(entry_file.readline())
+                entry['body'] = entry_file.read()
+            if len(entry['body']) != entry['size']:
+                raise ValueError('truncated cache entry')
+            # mark as recently used for the next run
+            os.utime(self.entry_path(key))
+            return entry
+        except (OSError, ValueError, TypeError, KeyError):
+            # entries of older versions or broken files are dropped
+            self.remove(key)
+            return None
+
+    def put(self, key: str, etag: str, response: requests.Response):
+        """Stores the body and headers of a response. Body is already decoded, hence encoding headers are dropped"""
+        headers = {name: value for name, value in response.headers.items()
+                   if name.lower() not in ('content-encoding', 'content-length', 'transfer-encoding')}
+        body = response.content
+        metadata = {'etag': etag, 'status': response.status_code, 'reason': response.reason, 'headers': headers,
+                    'size': len(body)}
+        # json escapes line breaks, hence the first line holds the whole metadata
+        data = json.dumps(metadata).encode('utf-8') + b'\n' + body
+        if len(data) > self.max_size:
+            return
+        # write and rename, so that a partially written entry is never read
+        temp_path = self.entry_path(key) + '.' + str(threading.get_ident()) + '.tmp'
+        with open(temp_path, 'wb') as entry_file:
+            entry_file.write(data)
+        os.replace(temp_path, self.entry_path(key))
+        with self.lock:
+            self.size += len(data) - self.index.get(key, 0)
+            self.index[key] = len(data)
+            self.index.move_to_end(key)
+            evicted = []
+            while self.size > self.max_size and len(self.index) > 0:
+                old_key, old_size = self.index.popitem(last=False)
+                self.size -= old_size
+                evicted.append(old_key)
+            self.evictions += len(evicted)
+        for old_key in evicted:
+            self.delete_file(old_key)
+
+    def remove(self, key: str):
+        with self.lock:
+            if key in self.index:
+                self.size -= self.index.pop(key)
+        self.delete_file(key)
+
+    def delete_file(self, key: str):
+        try:
+            os.remove(self.entry_path(key))
+        except OSError:
+            pass
+
+    def record(self, hit: bool):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    @classmethod
+    def build_response(cls, entry: dict, request: requests.PreparedRequest, adapter) -> requests.Response:
+        """Creates a response from a cached entry, as if it was received from the server"""
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.reason = entry['reason']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = entry['body']
+        # body is already read, iter_content gives it from memory instead of the raw stream
+        response._content_consumed = True
+        response.url = request.url
+        response.request = request
+        response.connection = adapter
+        return response
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'entries': len(self.index),
+                'size_mb': round(self.size / 1024 / 1024, 2)}
+
+    def summary(self) -> str:
+        stats = self.stats()
+        return ('http cache ' + self.cache_dir + ' hits: ' + str(stats['hits']) + ', misses: ' + str(stats['misses'])
+                + ', evictions: ' + str(stats['evictions']) + ', entries: ' + str(stats['entries'])
+                + ', size: ' + str(stats['size_mb']) + ' MB')
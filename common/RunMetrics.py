@@ -0,0 +1,222 @@
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+try:
+    import resource
+except ImportError:
+    # not available on windows, peak memory is not reported there
+    resource = None
+
+
+class RunMetrics:
+    # upper bounds of the latency histogram buckets in seconds, same as the prometheus client defaults
+    latency_buckets = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+    # ids in url paths are replaced, so that calls of the same endpoint are counted together
+    path_patterns = [(re.compile(r'^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$'),
+                      '{guid}'),
+                     (re.compile(r'^\d+$'), '{id}'),
+                     (re.compile(r'^[0-9a-f]{7,40}$'), '{sha}'),
+                     (re.compile(r'^[A-Z][A-Z0-9]+-\d+$'), '{key}'),
+                     (re.compile(r'%2F', re.IGNORECASE), '{path}')]
+    metric_prefix = 'devops_logger_'
+    instance = None
+    instance_lock = threading.Lock()
+
+    def __init__(self):
+        """Performance metrics of a run. Api calls are recorded per endpoint by the http transport, stages
+        (event methods and publish_df) are recorded per connector"""
+        self.lock = threading.Lock()
+        self.started = time.time()
+        # input - (host, method, path), out - counters of the endpoint
+        self.endpoints = {}
+        self.stages = []
+
+    @classmethod
+    def get(cls) -> 'RunMetrics':
+        """Gives the metrics of the process, shared by all connectors and transports"""
+        with cls.instance_lock:
+            if cls.instance is None:
+                cls.instance = cls()
+            return cls.instance
+
+    @classmethod
+    def endpoint_path(cls, url: str) -> str:
+        segments = []
+        for segment in urlparse(url).path.split('/'):
+            for pattern, replacement in cls.path_patterns:
+                if pattern.search(segment):
+                    segment = replacement
+                    break
+            segments.append(segment)
+        return '/'.join(segments)
+
+    @classmethod
+    def peak_memory(cls) -> int:
+        """Peak resident memory of the process in bytes, 0 if not known"""
+        if resource is None:
+            return 0
+        # linux reports kilobytes
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def record_request(self, url: str, method: str, status: int, seconds: float, size: int, retry: bool = False,
+                       throttled: bool = False, waited: float = 0):
+        """Records a single http exchange. status is 0 if no response was received"""
+        key = (urlparse(url).netloc, method, self.endpoint_path(url))
+        with self.lock:
+            endpoint = self.endpoints.get(key)
+            if endpoint is None:
+                endpoint = {'calls': 0, 'errors': 0, 'latency_sum': 0.0, 'latency_max': 0.0,
+                            'buckets': [0] * (len(self.latency_buckets) + 1), 'bytes': 0, 'retries': 0,
+                            'throttled': 0, 'wait_seconds': 0.0}
+                self.endpoints[key] = endpoint
+            endpoint['calls'] += 1
+            if status == 0 or status > 399:
+                endpoint['errors'] += 1
+            endpoint['latency_sum'] += seconds
+            endpoint['latency_max'] = max(endpoint['latency_max'], seconds)
+            bucket = 0
+            while bucket < len(self.latency_buckets) and seconds > self.latency_buckets[bucket]:
+                bucket += 1
+            endpoint['buckets'][bucket] += 1
+            endpoint['bytes'] += size
+            endpoint['retries'] += int(retry)
+            endpoint['throttled'] += int(throttled)
+            endpoint['wait_seconds'] += waited
+
+    def record_bytes(self, url: str, method: str, size: int):
+        """Adds bytes of a response body read after its request was recorded, ex: streamed bodies"""
+        key = (urlparse(url).netloc, method, self.endpoint_path(url))
+        with self.lock:
+            endpoint = self.endpoints.get(key)
+            if endpoint is not None:
+                endpoint['bytes'] += size
+
+    @contextmanager
+    def stage(self, connector: str, stage: str, entity: str = ''):
+        """Records wall time of a stage. The caller sets 'events' of the yielded dict to the number of events
+        or records produced by the stage"""
+        record = {'events': 0}
+        begin = time.perf_counter()
+        try:
+            yield record
+        finally:
+            self.record_stage(connector, stage, time.perf_counter() - begin, record['events'], entity)
+
+    def record_stage(self, connector: str, stage: str, seconds: float, events: int, entity: str = ''):
+        record = {'connector': str(connector), 'stage': stage, 'entity': entity, 'events': events,
+                  'seconds': seconds, 'events_per_second': events / seconds if seconds > 0 else 0,
+                  'peak_memory_bytes': self.peak_memory()}
+        with self.lock:
+            self.stages.append(record)
+
+    def take(self) -> dict:
+        """Gives the recorded metrics and resets them. Used to pass metrics of worker processes to the main one"""
+        with self.lock:
+            state = {'endpoints': self.endpoints, 'stages': self.stages}
+            self.endpoints = {}
+            self.stages = []
+        return state
+
+    def merge(self, state: dict):
+        """Adds metrics taken from another process"""
+        with self.lock:
+            for key, other in state['endpoints'].items():
+                endpoint = self.endpoints.get(key)
+                if endpoint is None:
+                    self.endpoints[key] = other
+                    continue
+                for counter in ['calls', 'errors', 'latency_sum', 'bytes', 'retries', 'throttled', 'wait_seconds']:
+                    endpoint[counter] += other[counter]
+                endpoint['latency_max'] = max(endpoint['latency_max'], other['latency_max'])
+                endpoint['buckets'] = [count + other_count for count, other_count in
+                                       zip(endpoint['buckets'], other['buckets'])]
+            self.stages.extend(state['stages'])
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            endpoints = [{'host': host, 'method': method, 'endpoint': path, **endpoint,
+                          'latency_avg': endpoint['latency_sum'] / endpoint['calls'] if endpoint['calls'] else 0}
+                         for (host, method, path), endpoint in sorted(self.endpoints.items())]
+            stages = list(self.stages)
+        return {'started': datetime.fromtimestamp(self.started, timezone.utc).isoformat(),
+                'seconds': time.time() - self.started, 'peak_memory_bytes': self.peak_memory(),
+                'latency_buckets': self.latency_buckets, 'endpoints': endpoints, 'stages': stages}
+
+    @classmethod
+    def labels(cls, **labels) -> str:
+        escaped = [name + '="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+                   for name, value in labels.items()]
+        return '{' + ','.join(escaped) + '}'
+
+    def prometheus_lines(self, source: str) -> list[str]:
+        """Metrics in prometheus text exposition format, to be read by the node exporter textfile collector"""
+        metrics = self.to_dict()
+        prefix = self.metric_prefix
+        lines = []
+        endpoint_counters = [('requests_total', 'calls', 'http requests sent, retries included'),
+                             ('request_errors_total', 'errors', 'http requests failed or answered with an error'),
+                             ('response_bytes_total', 'bytes', 'bytes of response bodies'),
+                             ('request_retries_total', 'retries', 'http requests sent again'),
+                             ('request_throttled_total', 'throttled', 'http requests throttled by the server'),
+                             ('rate_limit_wait_seconds_total', 'wait_seconds', 'time waited by the rate limiter')]
+        for name, counter, description in endpoint_counters:
+            lines += ['# HELP ' + prefix + name + ' ' + description, '# TYPE ' + prefix + name + ' counter']
+            for endpoint in metrics['endpoints']:
+                labels = self.labels(source=source, host=endpoint['host'], method=endpoint['method'],
+                                     endpoint=endpoint['endpoint'])
+                lines.append(prefix + name + labels + ' ' + str(endpoint[counter]))
+        name = prefix + 'request_duration_seconds'
+        lines += ['# HELP ' + name + ' latency of http requests', '# TYPE ' + name + ' histogram']
+        for endpoint in metrics['endpoints']:
+            label_values = {'source': source, 'host': endpoint['host'], 'method': endpoint['method'],
+                            'endpoint': endpoint['endpoint']}
+            cumulative = 0
+            for upper, count in zip(self.latency_buckets + ['+Inf'], endpoint['buckets']):
+                cumulative += count
+                lines.append(name + '_bucket' + self.labels(**label_values, le=upper) + ' ' + str(cumulative))
+            lines.append(name + '_sum' + self.labels(**label_values) + ' ' + str(endpoint['latency_sum']))
+            lines.append(name + '_count' + self.labels(**label_values) + ' ' + str(endpoint['calls']))
+        # stages may run more than once for a connector, ex: publish_df of each entity, hence summed
+        stages = {}
+        for stage in metrics['stages']:
+            key = (stage['connector'], stage['stage'], stage['entity'])
+            total = stages.setdefault(key, {'seconds': 0, 'events': 0, 'peak_memory_bytes': 0})
+            total['seconds'] += stage['seconds']
+            total['events'] += stage['events']
+            total['peak_memory_bytes'] = max(total['peak_memory_bytes'], stage['peak_memory_bytes'])
+        stage_gauges = [('stage_duration_seconds', 'wall time of the stage'),
+                        ('stage_events', 'events or records produced by the stage'),
+                        ('stage_events_per_second', 'events or records produced per second'),
+                        ('stage_peak_memory_bytes', 'peak resident memory of the process at the end of the stage')]
+        for name, description in stage_gauges:
+            lines += ['# HELP ' + prefix + name + ' ' + description, '# TYPE ' + prefix + name + ' gauge']
+            for (connector, stage, entity), total in sorted(stages.items()):
+                values = {'stage_duration_seconds': total['seconds'], 'stage_events': total['events'],
+                          'stage_events_per_second': total['events'] / total['seconds'] if total['seconds'] else 0,
+                          'stage_peak_memory_bytes': total['peak_memory_bytes']}
+                labels = self.labels(source=source, connector=connector, stage=stage, entity=entity)
+                lines.append(prefix + name + labels + ' ' + str(values[name]))
+        for name, value, description in [('run_duration_seconds', metrics['seconds'], 'wall time of the run'),
+                                         ('run_start_time_seconds', self.started, 'start of the run as unix time'),
+                                         ('run_peak_memory_bytes', metrics['peak_memory_bytes'],
+                                          'peak resident memory of the process')]:
+            lines += ['# HELP ' + prefix + name + ' ' + description, '# TYPE ' + prefix + name + ' gauge',
+                      prefix + name + self.labels(source=source) + ' ' + str(value)]
+        return lines
+
+    def write(self, source: str, json_file: str = None, prometheus_file: str = None):
+        """Writes metrics as json and as a prometheus textfile. Files are replaced at once, so that a collector
+        never reads a partially written file"""
+        if json_file:
+            with open(json_file + '.tmp', 'w') as metrics_file:
+                json.dump({'source': source, **self.to_dict()}, metrics_file, indent=2)
+            os.replace(json_file + '.tmp', json_file)
+        if prometheus_file:
+            with open(prometheus_file + '.tmp', 'w') as metrics_file:
+                metrics_file.write('\n'.join(self.prometheus_lines(source)) + '\n')
+            os.replace(prometheus_file + '.tmp', prometheus_file)
@@ -0,0 +1,36 @@
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+
+class WatermarkState:
+    def __init__(self, state_file: str, overlap_minutes: int = 0):
+        """Persisted per source / per project watermarks used by incremental runs.
+        Watermarks are moved back by overlap_minutes when read, duplicates are removed when outputs are merged"""
+        self.state_file = state_file
+        self.overlap = timedelta(minutes=overlap_minutes)
+        self.state = {}
+        if os.path.exists(state_file):
+            with open(state_file, 'r') as watermark_file:
+                self.state = json.load(watermark_file)
+
+    @classmethod
+    def now(cls) -> str:
+        """Gives current UTC time in iso8601 format, to be stored as the watermark once a run completes"""
+        return datetime.now(timezone.utc).isoformat()
+
+    def get(self, source: str, project: str) -> str | None:
+        """Gives the watermark of a project as iso8601 string, None if the project was never extracted"""
+        watermark = self.state.get(source, {}).get(str(project))
+        if watermark is None:
+            return None
+        return (datetime.fromisoformat(watermark) - self.overlap).isoformat()
+
+    def set(self, source: str, project: str, watermark: str):
+        if source not in self.state:
+            self.state[source] = {}
+        self.state[source][str(project)] = watermark
+
+    def save(self):
+        with open(self.state_file, 'w') as watermark_file:
+            json.dump(self.state, watermark_file, indent=2)
@@ -1,19 +1,65 @@
 # from gitlab.v4.objects import ProjectIssue
 import gitlab
+import logging
 import re
+from datetime import datetime, timedelta
+from functools import partial
+from itertools import islice
+from typing import Iterator
 import traceback
 import sys
 sys.path.insert(0, '../common')
 from ALMConnector import ALMConnector
+from HttpTransport import HttpTransport
+from EventBuffer import EventBuffer
+from LMPUtils import LMPUtils
+from MentionExtractor import MentionExtractor
 
 
 class GitlabConnector(ALMConnector):
+    checkpoint_attributes = ALMConnector.checkpoint_attributes + ['issue_iid_dict', 'issue_mr_link_dict',
+                                                                 'issue_mr_mention_dict', 'branch_case_id']
+    # system notes of issues. branch name is the first quoted text, MRs of other projects are prefixed by the path
+    note_mentions = MentionExtractor({'assigned': 'assigned to', 'branch': r'created branch [^`]*`([^`]*)`',
+                                      'mr': r'mentioned in merge request [^!\s]*!(\d+)'})
+    graphql_issues_query = """
+    query($fullPath: ID!, $first: Int, $after: String, $notesFirst: Int, $updatedAfter: Time) {
+      project(fullPath: $fullPath) {
+        issues(first: $first, after: $after, updatedAfter: $updatedAfter, sort: CREATED_DESC) {
+          pageInfo { hasNextPage endCursor }
+          nodes {
+            id iid title description createdAt updatedAt closedAt state type
+            author { id name }
+            notes(first: $notesFirst) {
+              pageInfo { hasNextPage endCursor }
+              nodes { id body system createdAt author { id name } }
+            }
+            closingMergeRequests { nodes { mergeRequest { iid } } }
+          }
+        }
+      }
+    }"""
+    graphql_notes_query = """
+    query($fullPath: ID!, $iid: String!, $first: Int, $after: String) {
+      project(fullPath: $fullPath) {
+        issue(iid: $iid) {
+          notes(first: $first, after: $after) {
+            pageInfo { hasNextPage endCursor }
+            nodes { id body system createdAt author { id name } }
+          }
+        }
+      }
+    }"""
+
     def __init__(self, base_url: str, pvt_token: str, project_id: str, ext_issue_ref_regex: str,
-                 case_type_prefixes: dict, api_delay: int = 0):
+                 case_type_prefixes: dict, api_delay: int = 0, gl: gitlab.Gitlab = None,
+                 http_settings: dict = None):
         ALMConnector.__init__(self, project_id, ext_issue_ref_regex,  api_delay, case_type_prefixes)
-        self.logger.info('Running test auth to: ' + base_url)
-        self.gl = gitlab.Gitlab(base_url, private_token=pvt_token)
-        self.gl.auth()
+        if gl is None:
+            gl = self.create_client(base_url, pvt_token, http_settings)
+        else:
+            self.logger.info('Using shared client for: ' + base_url)
+        self.gl = gl
         self.project_id = int(project_id)
         self.project_object = self.gl.projects.get(self.project_id)
         self.logger.info('==================================================================')
@@ -34,21 +80,75 @@ class GitlabConnector(ALMConnector):
         self.user_email_map = {}
         # input - branch name, out - case id
         self.branch_case_id = {}
+        # when enabled, jobs are listed once per project and joined to pipelines, instead of listed per pipeline
+        self.bulk_jobs = False
+        # workers reading pipeline details concurrently in bulk mode
+        self.pipeline_workers = 1
+        # items read from each list in non-production runs, same as a single default page
+        self.nonprod_limit = 20
+        # page size of streamed lists, the next page is read while the current one is processed
+        self.page_size = 100
+        # 'rest' reads notes and closing MRs per issue, 'graphql' reads them together with a page of issues
+        self.issue_engine = 'rest'
+        self.graphql_page_size = 20
+        self.graphql_notes_page_size = 100
+
+    @classmethod
+    def create_client(cls, base_url: str, pvt_token: str, http_settings: dict = None) -> gitlab.Gitlab:
+        """Creates and authenticates a gitlab client which can be shared among connectors of the same host.
+        The client uses the pooled session of HttpTransport, including its response cache if enabled"""
+        logging.getLogger('scriptLogger').info('Running test auth to: ' + base_url)
+        if http_settings is None:
+            http_settings = {}
+        transport = HttpTransport.from_settings(http_settings)
+        gl = gitlab.Gitlab(base_url, private_token=pvt_token, session=transport.session, timeout=transport.timeout)
+        # 429 responses are retried by the transport adapter, with its backoff and rate limit. python-gitlab would
+        # retry them again after the adapter gives up, up to 10 times per request, hence its own retry is disabled
+        gl.http_request = partial(gl.http_request, obey_rate_limit=False)
+        gl.auth()
+        return gl
+
+    def list_filters(self) -> dict:
+        """Gives filters to be passed to list calls. Only updated entities are listed in incremental runs"""
+        if self.updated_after is None:
+            return {}
+        return {'updated_after': self.updated_after}
+
+    def iterate_list(self, manager, prod_run: bool, keyset: bool = False, **filters) -> tuple:
+        """Streams a list endpoint page by page instead of reading all pages up front. Gives an iterator over the
+        objects and the total count, which is 0 if gitlab does not give it (above 10000 objects or keyset).
+        Keyset pagination should be used on endpoints supporting it, as offset pagination slows down on later pages"""
+        if keyset:
+            filters.update({'pagination': 'keyset', 'order_by': 'id', 'sort': 'desc'})
+        objects = manager.list(iterator=True, per_page=self.page_size, **filters)
+        total = objects.total or 0
+        items = LMPUtils.prefetch(objects, self.page_size)
+        if not prod_run:
+            items = islice(items, self.nonprod_limit)
+            total = min(total, self.nonprod_limit)
+        return items, total
 
-    def get_pipeline_events(self, prod_run: bool = False) -> list[dict]:
+    def get_pipeline_events(self, prod_run: bool = False) -> EventBuffer:
         """Extract pipeline and job events from the repo"""
         project = self.project_object
-        pipelines = project.pipelines.list(get_all=prod_run)
-        self.logger.info('number of pipelines found for project: ' + str(len(pipelines)))
-        pl_counter = 0
-        for pipeline in pipelines:
+        pipelines, pl_total = self.iterate_list(project.pipelines, prod_run, **self.list_filters())
+        self.logger.info('number of pipelines found for project: ' + str(pl_total))
+        jobs_by_pipeline = None
+        workers = 1
+        if self.bulk_jobs:
+            # all pipeline ids are needed to join jobs
+            pipelines = list(pipelines)
+            jobs_by_pipeline = self.get_jobs_by_pipeline(pipelines)
+            workers = self.pipeline_workers
+        pl_counter, pipelines = self.resume_items(pipelines, lambda pl: pl.id)
+        # Pulling pl again due to https://python-gitlab.readthedocs.io/en/v4.4.0/faq.html#attribute-error-list
+        # list api does not give user, finished_at, duration and before_sha
+        for pl in LMPUtils.ordered_map(self.get_pipeline, pipelines, workers):
             pl_counter += 1
             try:
                 # For pipelines, standard is to use global id
-                self.logger.set_arg_only('GLPL-' + str(pipeline.id))
+                self.logger.set_arg_only('GLPL-' + str(pl.id))
                 self.logger.debug('reading data for pipeline')
-                # Pulling pl again due to https://python-gitlab.readthedocs.io/en/v4.4.0/faq.html#attribute-error-list
-                pl = project.pipelines.get(pipeline.id)
                 case_id = self.find_case_id_for_pl(pl.sha, pl.id)
                 local_case = self.generate_case_id(pl.id, 'pipeline')
                 # TODO: create the PL list
@@ -59,7 +159,10 @@ class GitlabConnector(ALMConnector):
                 self.add_event(pl.id, self.action_prefix + '_PL_completed', pl.finished_at, case_id, pl.user['id'],
                                pl.user['name'], local_case, '', '', str(self.project_id))
                 # get pipeline jobs
-                jobs = pl.jobs.list(get_all=prod_run)
+                if jobs_by_pipeline is None:
+                    jobs = pl.jobs.list(get_all=prod_run)
+                else:
+                    jobs = jobs_by_pipeline.get(pl.id, [])
                 self.logger.debug('jobs found for pipeline: ' + str(len(jobs)))
                 # TODO: better strategy would be to find when the first job of each stage started,
                 #  and have one event per stage
@@ -78,19 +181,44 @@ class GitlabConnector(ALMConnector):
                            'author': pl.user['id'], 'created_time': pl.created_at, 'updated_time': pl.updated_at,
                            'duration': duration, 'status': pl.status, 'case_id': case_id, 'project_id': self.project_id}
                 self.pl_list.append(pl_dict)
-                self.log_status(pl_counter, len(pipelines))
+                self.log_status(pl_counter, pl_total, pl.id)
             except (TypeError, KeyError):
-                self.logger.error('Error occurred retrieving data for: ' + str(pipeline.id) + ' moving to next.')
+                self.logger.error('Error occurred retrieving data for: ' + str(pl.id) + ' moving to next.')
                 traceback.print_exc()
             self.logger.reset_prefix()
         self.logger.info('number of pipeline related events found: ' + str(self.added_event_count()))
-        return self.event_logs
+        return self.events
+
+    def get_pipeline(self, pipeline):
+        """Reads pipeline details, as pipelines given by list api miss some attributes"""
+        return self.project_object.pipelines.get(pipeline.id)
+
+    def get_jobs_by_pipeline(self, pipelines: list) -> dict:
+        """Lists finished jobs of the project in a single paged request and groups them by pipeline id.
+        Only failed and successful jobs are listed, same as the ones used for job events"""
+        jobs_by_pipeline = {}
+        if len(pipelines) == 0:
+            return jobs_by_pipeline
+        pipeline_ids = {pipeline.id for pipeline in pipelines}
+        # jobs are listed newest first. jobs created before the oldest pipeline cannot belong to any of them,
+        # a margin is kept as pipeline and job creation times are not written at the same instant
+        oldest_time = min(datetime.fromisoformat(pipeline.created_at) for pipeline in pipelines) - timedelta(hours=1)
+        job_counter = 0
+        jobs, _ = self.iterate_list(self.project_object.jobs, True, True, scope=['failed', 'success'])
+        for job in jobs:
+            if datetime.fromisoformat(job.created_at) < oldest_time:
+                break
+            job_counter += 1
+            if job.pipeline['id'] in pipeline_ids:
+                jobs_by_pipeline.setdefault(job.pipeline['id'], []).append(job)
+        self.logger.info('number of jobs read for pipelines: ' + str(job_counter))
+        return jobs_by_pipeline
 
-    def get_branch_events(self, prod_run: bool = False) -> list[dict]:
+    def get_branch_events(self, prod_run: bool = False) -> EventBuffer:
         """Extract branch creation events from repo"""
         project = self.project_object
         self.logger.info('scanning branches in project_id: ' + str(self.project_id))
-        branches = project.branches.list(get_all=prod_run)
+        branches, _ = self.iterate_list(project.branches, prod_run)
         for br in branches:
             try:
                 if br.name in self.branch_case_id:
@@ -110,16 +238,18 @@ class GitlabConnector(ALMConnector):
                 self.logger.error('Error occurred retrieving data for: ' + br.name + ' moving to next.')
                 traceback.print_exc()
         self.logger.info('number of branch events found: ' + str(self.added_event_count()))
-        return self.event_logs
+        return self.events
 
-    def get_mrs_events(self, prod_run: bool = False) -> list[dict]:
+    def get_mrs_events(self, prod_run: bool = False) -> EventBuffer:
         """Extract MR events from repo and analyse relations to issues"""
         self.logger.info('scanning MRs in project_id: ' + str(self.project_id))
         merge_commit_regex = re.compile('Merge branch')
         project = self.project_object
-        merge_requests = project.mergerequests.list(get_all=prod_run)
-        self.logger.info('number of MRs found for project: ' + str(len(merge_requests)))
-        mr_counter = 0
+        merge_requests, mr_total = self.iterate_list(project.mergerequests, prod_run, **self.list_filters())
+        # latest linked issue of each MR is chosen in batch, issue links are known at this point
+        self.resolve_mr_issue_links()
+        self.logger.info('number of MRs found for project: ' + str(mr_total))
+        mr_counter, merge_requests = self.resume_items(merge_requests, lambda mr: mr.id)
         for mr in merge_requests:
             mr_counter += 1
             try:
@@ -168,10 +298,7 @@ class GitlabConnector(ALMConnector):
                     # merge pipelines could be launched from any commit related to MR
                     self.add_link(self.commit_mr_commits_dict, commit.id, mr.iid)
                 # Try to find an external issue id. description can be null
-                if mr.description is not None:
-                    ext_issue_id = self.find_ext_issue_id(mr.title + ' ' + mr.description)
-                else:
-                    ext_issue_id = self.find_ext_issue_id(mr.title)
+                ext_issue_id = self.find_ext_issue_id(mr.title, mr.description)
                 linked = set()
                 mentioned = set()
                 if mr.iid in self.mr_issue_link_dict:
@@ -186,101 +313,183 @@ class GitlabConnector(ALMConnector):
                            'linked_issues': linked, 'mentioned_issues': mentioned, 'case_id': case_id,
                            'link_type': link_type}
                 self.mr_list.append(mr_dict)
-                self.log_status(mr_counter, len(merge_requests))
+                self.log_status(mr_counter, mr_total, mr.id)
             except (TypeError, KeyError):
                 self.logger.error('Error occurred retrieving data for: ' + str(mr.iid) + ' moving to next.')
                 traceback.print_exc()
             self.logger.reset_prefix()
         self.logger.info('number of MR related events found: ' + str(self.added_event_count()))
-        return self.event_logs
+        return self.events
 
-    def get_issues_events(self, prod_run: bool = False) -> list[dict]:
+    def get_issues_events(self, prod_run: bool = False) -> EventBuffer:
         """Get gitlab issue related events, find relations to MRs and external issues"""
         self.logger.info('scanning issues in project_id: ' + str(self.project_id))
-        # --initialising values---
-        branch_create_regex = re.compile('created branch')
-        assigned_regex = re.compile('assigned to')
-        mr_regex = re.compile('mentioned in merge request')
-        # ----------
-        project = self.project_object
-        issues = project.issues.list(get_all=prod_run)
-        self.logger.info('number of issues found for project: ' + str(len(issues)))
-        issue_counter = 0
-        for issue in issues:
-            try:
-                issue_counter += 1
-                self.logger.set_arg_only('GLI-' + str(issue.iid))
-                linked_mrs = set()
-                mentioned_mrs = set()
-                self.logger.debug('reading data for issue')
-                # update internal reference dict
-                self.issue_iid_dict[issue.iid] = {}
-                self.issue_iid_dict[issue.iid]['id'] = issue.id
-                self.issue_iid_dict[issue.iid]['branches'] = []
-                self.issue_created_dict[issue.iid] = issue.created_at
-                case_id = self.generate_case_id(issue.iid, 'issue')
-                # read through notes to find assign events and branch creation
-                notes = issue.notes.list(get_all=prod_run)
-                self.logger.debug('notes found for issue: ' + str(len(notes)))
-                for note in notes:
-                    # TODO: issue comments are not supported yet
-                    # check whether there's assigned note
-                    if re.search(assigned_regex, note.body) is not None:
-                        # add assigned event
-                        self.add_event(note.id, self.action_prefix + '_issue_assigned', note.created_at, case_id,
-                                       note.author['id'], note.author['name'], case_id, note.body, '',
-                                       str(self.project_id))
-                    # check whether there's branch creation
-                    if re.search(branch_create_regex, note.body) is not None:
-                        # get branch name as string
-                        issue_branch = note.body.split('`')[1]
-                        self.issue_iid_dict[issue.iid]['branches'].append(issue_branch)
-                        # Don't add branch create event here, just add branch issue reference
-                        # this is because we are pulling the entire list anyway
-                        self.branch_case_id[issue_branch] = case_id
-                    # identify any merge requests linked
-                    if re.search(mr_regex, note.body) is not None:
-                        # get MR iid and add as int
-                        mentioned_mr = int(note.body.split('!')[1])
-                        # add to set
-                        mentioned_mrs.add(mentioned_mr)
-                        self.add_link(self.mr_issue_mention_dict, mentioned_mr, issue.iid)
-                # find issues directly related
-                mr_links = issue.closed_by()
-                for mr_link in mr_links:
-                    link_iid = mr_link['iid']
-                    linked_mrs.add(link_iid)
-                    self.add_link(self.mr_issue_link_dict, link_iid, issue.iid)
-                # add links and mentions to dictionary as well
-                self.issue_mr_link_dict[issue.iid] = linked_mrs
-                self.issue_mr_mention_dict[issue.iid] = mentioned_mrs
-                # create event log for create issue event
-                self.add_event(issue.id, self.action_prefix + '_issue_created',
-                               issue.created_at, case_id, issue.author['id'], issue.author['name'], case_id,
-                               issue.issue_type, '', str(self.project_id))
-                # closed event
-                if issue.closed_at is not None:
-                    # issue.closed_by is a method which does something else
-                    # see https://github.com/python-gitlab/python-gitlab/issues/2590
-                    self.add_event(issue.id, self.action_prefix + '_issue_closed', issue.closed_at, case_id,
-                                   issue.asdict()['closed_by']['id'], issue.asdict()['closed_by']['name'], case_id,
-                                   '', '', str(self.project_id))
-                # Try to find an external issue id. description can be null
-                if issue.description is not None:
-                    ext_issue_id = self.find_ext_issue_id(issue.title + ' ' + issue.description)
-                else:
-                    ext_issue_id = self.find_ext_issue_id(issue.title)
-                # id is the global id, iid is project specific id
-                issue_dict = {'id': issue.id, 'iid': issue.iid, 'title': issue.title, 'author_id': issue.author['id'],
-                              'created_time': issue.created_at, 'type': issue.issue_type,
-                              'updated_time': issue.updated_at, 'state': issue.state, 'project_id': issue.project_id,
-                              'ext_issue_id': ext_issue_id, 'linked_mrs': linked_mrs, 'mentioned_mrs': mentioned_mrs}
-                self.issue_list.append(issue_dict)
-                self.log_status(issue_counter, len(issues))
-            except (TypeError, KeyError):
-                self.logger.error('Error occurred retrieving data for: ' + str(issue.iid) + ' moving to next.')
-                traceback.print_exc()
-            self.logger.reset_prefix()
+        # issues completed before a resumed checkpoint are skipped before their notes are read
+        if self.issue_engine == 'graphql':
+            nodes = self.iterate_graphql_issues(prod_run)
+            issue_total = 0
+            issue_counter, nodes = self.resume_items(nodes, lambda node: int(node['iid']))
+            issues = (self.read_graphql_issue(node) for node in nodes)
+        else:
+            issues, issue_total = self.iterate_list(self.project_object.issues, prod_run, **self.list_filters())
+            issue_counter, issues = self.resume_items(issues, lambda issue: issue.iid)
+            issues = (self.read_rest_issue(issue, prod_run) for issue in issues)
+        self.logger.info('number of issues found for project: ' + str(issue_total))
+        for issue, notes, closing_mrs in issues:
+            issue_counter += 1
+            self.add_issue(issue, notes, closing_mrs)
+            self.log_status(issue_counter, issue_total, issue['iid'])
         self.logger.info('number of issue related events found: ' + str(self.added_event_count()))
-        return self.event_logs
+        return self.events
+
+    @classmethod
+    def read_rest_issue(cls, issue, prod_run: bool) -> tuple:
+        """Reads notes and closing MRs of an issue listed via rest api, with separate requests.
+        Gives (issue, notes, closing MR iids) as dicts"""
+        notes = [note.asdict() for note in issue.notes.list(get_all=prod_run)]
+        closing_mrs = [mr_link['iid'] for mr_link in issue.closed_by()]
+        return issue.asdict(), notes, closing_mrs
+
+    def add_issue(self, issue: dict, notes: list[dict], closing_mrs: list[int]):
+        """Adds events of an issue and its notes. Issue and notes are dicts in rest api format"""
+        issue_iid = issue['iid']
+        try:
+            self.logger.set_arg_only('GLI-' + str(issue_iid))
+            linked_mrs = set()
+            mentioned_mrs = set()
+            self.logger.debug('reading data for issue')
+            # update internal reference dict
+            self.issue_iid_dict[issue_iid] = {}
+            self.issue_iid_dict[issue_iid]['id'] = issue['id']
+            self.issue_iid_dict[issue_iid]['branches'] = []
+            self.issue_created_dict[issue_iid] = issue['created_at']
+            case_id = self.generate_case_id(issue_iid, 'issue')
+            # read through notes to find assign events and branch creation
+            self.logger.debug('notes found for issue: ' + str(len(notes)))
+            for note in notes:
+                # TODO: issue comments are not supported yet
+                # all kinds of system notes are found in a single pass over the body
+                note_mentions = self.note_mentions.find(note['body'])
+                # check whether there's assigned note
+                if note_mentions['assigned']:
+                    # add assigned event
+                    self.add_event(note['id'], self.action_prefix + '_issue_assigned', note['created_at'], case_id,
+                                   note['author']['id'], note['author']['name'], case_id, note['body'], '',
+                                   str(self.project_id))
+                # check whether there's branch creation
+                for issue_branch in note_mentions['branch']:
+                    self.issue_iid_dict[issue_iid]['branches'].append(issue_branch)
+                    # Don't add branch create event here, just add branch issue reference
+                    # this is because we are pulling the entire list anyway
+                    self.branch_case_id[issue_branch] = case_id
+                # identify any merge requests linked
+                for mr_mention in note_mentions['mr']:
+                    # get MR iid and add as int
+                    mentioned_mr = int(mr_mention)
+                    # add to set
+                    mentioned_mrs.add(mentioned_mr)
+                    self.add_link(self.mr_issue_mention_dict, mentioned_mr, issue_iid)
+            # find issues directly related
+            for link_iid in closing_mrs:
+                linked_mrs.add(link_iid)
+                self.add_link(self.mr_issue_link_dict, link_iid, issue_iid)
+            # add links and mentions to dictionary as well
+            self.issue_mr_link_dict[issue_iid] = linked_mrs
+            self.issue_mr_mention_dict[issue_iid] = mentioned_mrs
+            # create event log for create issue event
+            self.add_event(issue['id'], self.action_prefix + '_issue_created',
+                           issue['created_at'], case_id, issue['author']['id'], issue['author']['name'], case_id,
+                           issue['issue_type'], '', str(self.project_id))
+            # closed event
+            if issue['closed_at'] is not None:
+                self.add_event(issue['id'], self.action_prefix + '_issue_closed', issue['closed_at'], case_id,
+                               issue['closed_by']['id'], issue['closed_by']['name'], case_id,
+                               '', '', str(self.project_id))
+            # Try to find an external issue id. description can be null
+            ext_issue_id = self.find_ext_issue_id(issue['title'], issue['description'])
+            # id is the global id, iid is project specific id
+            issue_dict = {'id': issue['id'], 'iid': issue_iid, 'title': issue['title'],
+                          'author_id': issue['author']['id'], 'created_time': issue['created_at'],
+                          'type': issue['issue_type'], 'updated_time': issue['updated_at'], 'state': issue['state'],
+                          'project_id': issue['project_id'], 'ext_issue_id': ext_issue_id, 'linked_mrs': linked_mrs,
+                          'mentioned_mrs': mentioned_mrs}
+            self.issue_list.append(issue_dict)
+        except (TypeError, KeyError):
+            self.logger.error('Error occurred retrieving data for: ' + str(issue_iid) + ' moving to next.')
+            traceback.print_exc()
+        self.logger.reset_prefix()
+
+    def graphql(self, query: str, variables: dict) -> dict:
+        """Sends a query to the graphql api of the gitlab instance using the rest client session"""
+        response = self.gl.http_post(self.gl.url + '/api/graphql', post_data={'query': query, 'variables': variables})
+        if 'errors' in response:
+            self.logger.error('graphql query returned errors: ' + str(response['errors']))
+        if response.get('data') is None:
+            raise gitlab.exceptions.GitlabGetError('graphql query did not return data')
+        return response['data']
+
+    def iterate_graphql_issues(self, prod_run: bool) -> Iterator[dict]:
+        """Reads pages of issues via graphql, together with their notes, author and closing MRs in one query per
+        page. Yields issue nodes, read_graphql_issue converts them to rest api format"""
+        variables = {'fullPath': self.project_object.path_with_namespace, 'first': self.graphql_page_size,
+                     'notesFirst': self.graphql_notes_page_size, 'updatedAfter': self.updated_after, 'after': None}
+        if not prod_run:
+            variables['first'] = self.nonprod_limit
+        while True:
+            data = self.graphql(self.graphql_issues_query, variables)
+            issues = data['project']['issues']
+            yield from issues['nodes']
+            if not prod_run or not issues['pageInfo']['hasNextPage']:
+                break
+            variables['after'] = issues['pageInfo']['endCursor']
+
+    def read_graphql_issue(self, node: dict) -> tuple:
+        """Reads remaining notes of an issue node. Gives (issue, notes, closing MR iids) in rest api format"""
+        notes = node['notes']['nodes']
+        if node['notes']['pageInfo']['hasNextPage']:
+            notes += self.get_graphql_notes(node['iid'], node['notes']['pageInfo']['endCursor'])
+        return self.graphql_to_rest_issue(node, notes)
+
+    def get_graphql_notes(self, issue_iid: str, after: str) -> list[dict]:
+        """Reads remaining notes of an issue having more notes than the ones given in the issue page"""
+        variables = {'fullPath': self.project_object.path_with_namespace, 'iid': issue_iid,
+                     'first': self.graphql_notes_page_size, 'after': after}
+        notes = []
+        while True:
+            data = self.graphql(self.graphql_notes_query, variables)
+            page = data['project']['issue']['notes']
+            notes += page['nodes']
+            if not page['pageInfo']['hasNextPage']:
+                return notes
+            variables['after'] = page['pageInfo']['endCursor']
+
+    @classmethod
+    def graphql_id(cls, global_id: str) -> int:
+        """Converts a global id like gid://gitlab/Issue/123 to the id used by rest api"""
+        return int(global_id.split('/')[-1])
+
+    @classmethod
+    def graphql_to_rest_user(cls, user: dict):
+        if user is None:
+            return None
+        return {'id': cls.graphql_id(user['id']), 'name': user['name']}
+
+    def graphql_to_rest_issue(self, node: dict, graphql_notes: list[dict]) -> tuple:
+        """Converts an issue node to the dicts given by rest api. graphql has no closed_by for issues, the closer is
+        taken from the latest 'closed' system note instead"""
+        notes = []
+        closed_by = None
+        for note in graphql_notes:
+            author = self.graphql_to_rest_user(note['author'])
+            notes.append({'id': self.graphql_id(note['id']), 'body': note['body'], 'created_at': note['createdAt'],
+                          'author': author, 'system': note['system']})
+            if note['system'] and note['body'].startswith('closed'):
+                closed_by = author
+        issue = {'id': self.graphql_id(node['id']), 'iid': int(node['iid']), 'title': node['title'],
+                 'description': node['description'], 'created_at': node['createdAt'],
+                 'updated_at': node['updatedAt'], 'closed_at': node['closedAt'], 'state': node['state'],
+                 'issue_type': node['type'].lower(), 'project_id': self.project_id,
+                 'author': self.graphql_to_rest_user(node['author']), 'closed_by': closed_by}
+        closing_mrs = [int(link['mergeRequest']['iid']) for link in node['closingMergeRequests']['nodes']]
+        return issue, notes, closing_mrs
 
@@ -1,13 +1,23 @@
+import argparse
 import pandas as pd
 from GitlabConnector import GitlabConnector
 import json
 import csv
 import logging.config
+import multiprocessing
 import os
 import sys
+from functools import partial
 sys.path.insert(0, '../common')
 from LMPUtils import LMPUtils
 from DevOpsConnector import DevOpsConnector
+from EventBuffer import EventBuffer
+from WatermarkState import WatermarkState
+from ResponseCache import ResponseCache
+from ParquetStreamWriter import ParquetStreamWriter
+from OutputEngine import OutputEngine
+from CheckpointStore import CheckpointStore
+from RunMetrics import RunMetrics
 
 
 def load_user_email_map(file_path_to_file: str, target_dict: dict):
@@ -19,11 +29,59 @@ def load_user_email_map(file_path_to_file: str, target_dict: dict):
             target_dict[row[1]] = row[0]
 
 
+def init_worker():
+    """Logging needs to be configured again inside worker processes"""
+    logging.config.fileConfig('../common/logging.conf')
+
+
+def extract_project(project_id: str, config: dict) -> dict:
+    """Runs all event methods for a single project and returns its results.
+    Runs in worker threads or processes, hence config is passed explicitly and results are picklable"""
+    checkpoints = config.get('checkpoints')
+    state = None
+    if checkpoints is not None and config['resume']:
+        state = checkpoints.load(project_id)
+        if state is not None and 'result' in state:
+            # project was completed before the run failed
+            return state['result']
+    glc = GitlabConnector(config['base_url'], config['private_token'], project_id, config['ext_issue_ref_regex'],
+                          config['case_type_prefixes'], gl=config.get('gl'), http_settings=config['http'])
+    glc.user_email_map = config['user_email_map']
+    glc.bulk_jobs = config['pipelines']['bulk_jobs']
+    glc.pipeline_workers = config['pipelines']['workers']
+    glc.issue_engine = config['issues']['engine']
+    glc.graphql_page_size = config['issues']['page_size']
+    glc.graphql_notes_page_size = config['issues']['notes_page_size']
+    if config['incremental']:
+        # only entities updated after the watermark are read, older relations come from previous outputs
+        glc.updated_after = config['updated_after'][project_id]
+        glc.load_relations(*config['previous_outputs'])
+    if config.get('streams'):
+        glc.enable_streaming(config['streams'], config['stream_batch_size'])
+    if checkpoints is not None:
+        if state is not None:
+            glc.restore_checkpoint(state)
+        glc.enable_checkpoints(checkpoints, project_id)
+    events = glc.get_all_events(config['get_all_events_order'], config['production_run'])
+    result = {'event_logs': events, 'issue_list': glc.issue_list, 'mr_list': glc.mr_list, 'pl_list': glc.pl_list,
+              'commit_list': glc.commit_list, 'user_ref': glc.user_ref}
+    if checkpoints is not None:
+        # results of completed projects are kept, so that a resumed run does not extract them again
+        checkpoints.save(project_id, {'result': result})
+    if multiprocessing.parent_process() is not None:
+        # metrics of worker processes are merged into the ones of the main process
+        result['metrics'] = RunMetrics.get().take()
+    return result
+
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Extracts gitlab events of the projects given in GITLAB_REPO_IDS')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue a failed run from its checkpoints, completed work is not extracted again')
+    args = parser.parse_args()
     # ===== configurations ============
     # read main config
-    with open('../common/settings.json', 'r') as settings_file:
-        settings = json.load(settings_file)['gitlab']
+    settings = LMPUtils.load_settings('gitlab')
     # read config from environment vars
     gitlab_base_url = os.environ['GITLAB_BASE_URL']
     gitlab_private_token = os.environ['GITLAB_PRIVATE_TOKEN']
@@ -47,7 +105,7 @@ if __name__ == '__main__':
     # ======= start of code ===============
     # ----- running code ------------
     # initialize global var
-    event_logs = []
+    event_logs = EventBuffer()
     issue_list = []
     mr_list = []
     pl_list = []
@@ -61,41 +119,144 @@ if __name__ == '__main__':
     # you can get project id by going to project id page and click on right hand side context menu
     if gitlab_id_email_csv != 'None':
         load_user_email_map(gitlab_id_email_csv, user_email_map)
-    for project_id in gitlab_project_id_list:
-        glc = GitlabConnector(gitlab_base_url, gitlab_private_token, project_id, external_issue_ref_regex,
-                              settings['case_type_prefixes'])
-        glc.user_email_map = user_email_map
-        events = glc.get_all_events(settings['get_all_events_order'], production_run)
-        event_logs.extend(events)
-        issue_list.extend(glc.issue_list)
-        mr_list.extend(glc.mr_list)
-        pl_list.extend(glc.pl_list)
-        commit_list.extend(glc.commit_list)
-        # dictionary merge
-        user_dict = {**user_dict, **glc.user_ref}
-    logger.info('====== Saving data======')
+    project_config = {'base_url': gitlab_base_url, 'private_token': gitlab_private_token,
+                      'ext_issue_ref_regex': external_issue_ref_regex,
+                      'case_type_prefixes': settings['case_type_prefixes'],
+                      'get_all_events_order': settings['get_all_events_order'],
+                      'production_run': production_run, 'http': settings['http'],
+                      'incremental': settings['incremental']['enabled'], 'user_email_map': user_email_map,
+                      'pipelines': settings['pipelines'], 'issues': settings['issues']}
+    # codec, categorical columns and layout of the outputs
+    output = OutputEngine.from_settings(settings['output'])
+    # incremental runs only read entities updated after the last successful run of each project
+    incremental = settings['incremental']
+    run_started = WatermarkState.now()
+    watermarks = WatermarkState(incremental['state_file'], incremental['overlap_minutes'])
+    # merge keys are used to upsert records into existing outputs
+    event_keys = None
+    entity_keys = None
+    if incremental['enabled']:
+        logger.info('incremental run, state file: ' + incremental['state_file'])
+        project_config['updated_after'] = {}
+        for project in gitlab_project_id_list:
+            project_config['updated_after'][project] = watermarks.get('gitlab', project)
+        project_config['previous_outputs'] = (DevOpsConnector.load_df('gitlab_issues_' + parquet_suffix, output),
+                                              DevOpsConnector.load_df('gitlab_MRs_' + parquet_suffix, output),
+                                              DevOpsConnector.load_df('gitlab_commits_' + parquet_suffix, output))
+        # event ids are not unique on their own, ex: MR created and merged events share the MR id
+        event_keys = ['id', 'action', 'time']
+        entity_keys = ['id', 'project_id']
     preserve_timezone = settings['preserve_timezone']
-    # stub devops connector. this is a hack as glc connector is not available outside the loop
-    devops = DevOpsConnector('gitlab', 1)
-    # converting to pandas dataframes
-    event_df = pd.DataFrame(event_logs)
-    devops.publish_df(event_df, ['time'], preserve_timezone,  'event_logs',
-                      'gitlab_event_log_' + parquet_suffix)
-    # use pm4py.format_dataframe and then pm4py.convert_to_event_log to convert this to an event log
-    # please use utils/process_mining.py for this task
-    issue_df = pd.DataFrame(issue_list)
-    devops.publish_df(issue_df, ['created_time', 'updated_time'], preserve_timezone,  'issues',
-                      'gitlab_issues_' + parquet_suffix)
-    mr_df = pd.DataFrame(mr_list)
-    devops.publish_df(mr_df, ['created_time', 'updated_time'], preserve_timezone,
-                      'merge requests', 'gitlab_MRs_' + parquet_suffix)
-    commit_df = pd.DataFrame(commit_list)
-    devops.publish_df(commit_df, ['created_time'], preserve_timezone,  'commits',
-                      'gitlab_commits_' + parquet_suffix)
-    pl_df = pd.DataFrame(pl_list)
-    devops.publish_df(pl_df, ['created_time', 'updated_time'], preserve_timezone,
-                      'pipelines', 'gitlab_pipelines_' + parquet_suffix)
+    # streaming writes events and entity records in batches during extraction, keeping memory usage flat
+    streaming = settings['streaming']
+    streams = {}
+    if streaming['enabled']:
+        if incremental['enabled']:
+            logger.warning('streaming is disabled for incremental runs, as outputs need to be merged at the end')
+        else:
+            if output.partitioned or output.arrow_ipc:
+                logger.warning('partitioned and arrow ipc outputs are not streamed, a single parquet file is written')
+            streams['events'] = ParquetStreamWriter('gitlab_event_log_' + parquet_suffix, ['time'],
+                                                    preserve_timezone, output)
+            streams['issue_list'] = ParquetStreamWriter('gitlab_issues_' + parquet_suffix,
+                                                        ['created_time', 'updated_time'], preserve_timezone, output)
+            streams['mr_list'] = ParquetStreamWriter('gitlab_MRs_' + parquet_suffix,
+                                                     ['created_time', 'updated_time'], preserve_timezone, output)
+            streams['commit_list'] = ParquetStreamWriter('gitlab_commits_' + parquet_suffix,
+                                                         ['created_time'], preserve_timezone, output)
+            streams['pl_list'] = ParquetStreamWriter('gitlab_pipelines_' + parquet_suffix,
+                                                     ['created_time', 'updated_time'], preserve_timezone, output)
+            project_config['streams'] = streams
+            project_config['stream_batch_size'] = streaming['batch_size']
+    # checkpoints of each project are saved during extraction, so that a failed run can be resumed
+    checkpoint = settings['checkpoint']
+    checkpoints = None
+    if checkpoint['enabled'] or args.resume:
+        if streams:
+            logger.warning('checkpoints are disabled for streamed runs, as streamed outputs cannot be resumed')
+        else:
+            checkpoints = CheckpointStore(checkpoint['directory'], 'gitlab', checkpoint['interval_seconds'])
+            run_state = checkpoints.load(CheckpointStore.run_key) if args.resume else None
+            if run_state is None:
+                # checkpoints of an earlier run are not used unless resuming
+                checkpoints.clear()
+                checkpoints.save(CheckpointStore.run_key, {'run_started': run_started})
+            else:
+                # watermarks are set to the start of the failed run, work completed before it is not read again
+                run_started = run_state['run_started']
+            project_config['checkpoints'] = checkpoints
+            project_config['resume'] = run_state is not None
+    # projects can be extracted in parallel, results are still merged in the order of the project id list
+    workers = settings['parallel']['workers']
+    pool_type = settings['parallel']['pool']
+    if streams and (workers > 1 or pool_type == 'process'):
+        # projects share the stream writers, rows of parallel projects would be written in the order batches fill
+        logger.warning('projects are extracted one at a time in this process when streaming, so that streamed rows '
+                       'follow the order of the project list')
+        workers = 1
+        pool_type = 'thread'
+    logger.info('extracting ' + str(len(gitlab_project_id_list)) + ' projects using ' + str(workers) + ' '
+                + pool_type + ' worker(s)')
+    if pool_type != 'process':
+        # authenticated client is shared by all connectors as they connect to the same host
+        # clients cannot be passed to worker processes, hence each process authenticates on its own
+        project_config['gl'] = GitlabConnector.create_client(gitlab_base_url, gitlab_private_token, settings['http'])
+    results = LMPUtils.ordered_map(partial(extract_project, config=project_config), gitlab_project_id_list,
+                                   workers, pool_type, init_worker if pool_type == 'process' else None)
+    try:
+        for result in results:
+            event_logs.extend(result['event_logs'])
+            issue_list.extend(result['issue_list'])
+            mr_list.extend(result['mr_list'])
+            pl_list.extend(result['pl_list'])
+            commit_list.extend(result['commit_list'])
+            if 'metrics' in result:
+                RunMetrics.get().merge(result['metrics'])
+            # dictionary merge
+            user_dict = {**user_dict, **result['user_ref']}
+    finally:
+        # footer is written even if the run fails, so that already streamed records can be read
+        for writer in streams.values():
+            writer.close()
+    for cache in ResponseCache.instances.values():
+        logger.info(cache.summary())
+    logger.info('====== Saving data======')
+    if streams:
+        logger.info('outputs were streamed during extraction, skipping dataframe creation')
+    else:
+        # stub devops connector. this is a hack as glc connector is not available outside the loop
+        devops = DevOpsConnector('gitlab', 1)
+        devops.output = output
+        # converting to pandas dataframes
+        event_df = event_logs.to_dataframe()
+        devops.publish_df(event_df, ['time'], preserve_timezone,  'event_logs',
+                          'gitlab_event_log_' + parquet_suffix, event_keys)
+        # use pm4py.format_dataframe and then pm4py.convert_to_event_log to convert this to an event log
+        # please use utils/process_mining.py for this task
+        issue_df = pd.DataFrame(issue_list)
+        devops.publish_df(issue_df, ['created_time', 'updated_time'], preserve_timezone,  'issues',
+                          'gitlab_issues_' + parquet_suffix, entity_keys)
+        mr_df = pd.DataFrame(mr_list)
+        devops.publish_df(mr_df, ['created_time', 'updated_time'], preserve_timezone,
+                          'merge requests', 'gitlab_MRs_' + parquet_suffix, entity_keys)
+        commit_df = pd.DataFrame(commit_list)
+        devops.publish_df(commit_df, ['created_time'], preserve_timezone,  'commits',
+                          'gitlab_commits_' + parquet_suffix, entity_keys)
+        pl_df = pd.DataFrame(pl_list)
+        devops.publish_df(pl_df, ['created_time', 'updated_time'], preserve_timezone,
+                          'pipelines', 'gitlab_pipelines_' + parquet_suffix, entity_keys)
     # dump user data
     json_file = open(user_json_dump, "w")
     json.dump(user_dict, json_file)
-
+    if incremental['enabled']:
+        # watermarks are only moved once all outputs are saved
+        for project in gitlab_project_id_list:
+            watermarks.set('gitlab', project, run_started)
+        watermarks.save()
+    if checkpoints is not None:
+        # outputs are saved, a later run starts from scratch
+        checkpoints.clear()
+    # api call, stage and memory metrics of the run, for tracking performance across runs
+    metrics = settings['metrics']
+    if metrics['enabled']:
+        RunMetrics.get().write('gitlab', metrics['json_file'], metrics['prometheus_file'])
@@ -1,19 +1,33 @@
-import requests
-import json
+import math
 import re
+from datetime import datetime, timezone
+from itertools import islice
+from typing import BinaryIO, Iterator
 from requests.auth import HTTPBasicAuth
 import traceback
 import sys
+import xmltodict
 sys.path.insert(0, '../common')
 from DevOpsConnector import DevOpsConnector
 from LMPUtils import LMPUtils
+from MentionExtractor import MentionExtractor
+from IdentityCache import IdentityCache
+from RateLimiter import TokenBucket
+from HttpTransport import HttpTransport
 
 
 class JiraConnector(DevOpsConnector):
-    def __init__(self, jira_url, auth_token, namespace, auth_email, api_delay: int = 1):
+    def __init__(self, jira_url, auth_token, namespace, auth_email, api_delay: float = 1,
+                 requests_per_second: float = 0, http_settings: dict = None):
         DevOpsConnector.__init__(self, namespace, api_delay)
+        # all api calls go through the rate limiter, including the ones made by concurrent workers
+        self.rate_limiter = TokenBucket.from_settings(api_delay, requests_per_second)
         self.auth = HTTPBasicAuth(auth_email, auth_token)
         self.headers = {"Accept": "application/json"}
+        # single pooled session is used for all api calls, avoiding a tls handshake per request
+        if http_settings is None:
+            http_settings = {}
+        self.transport = HttpTransport.from_settings(http_settings, self.headers, self.auth)
         self.jira_url = jira_url
         self.logger.info('Jira base url: ' + jira_url)
         # this is not user_ref; this gives email for jira id (reverse)
@@ -24,33 +38,49 @@ class JiraConnector(DevOpsConnector):
         self.issue_ns = {}
         # input - issue iid, out - set of issue mentions
         self.issue_mentions = {}
-        # regex for finding other jira issue mentions
-        self.jira_issue_regex = re.compile(jira_url + '/browse/[A-Z]{1,9}-\\d+')
+        # fields needed by add_issue when issues are read via search
+        self.issue_fields = 'project,created,issuetype,creator,parent,timetracking,description,comment'
+        # page size for changelog and comment apis
+        self.page_size = 100
+        # issues per bulk changelog request, 0 reads changelogs per issue
+        self.changelog_bulk_size = 0
+        # changelog histories per page of bulk changelog requests
+        self.changelog_bulk_page_size = 1000
+        # input - issue key, out - issue record waiting for the bulk changelog request
+        self.changelog_queue = {}
+        # accounts per bulk user request, 0 reads each account when it is first seen
+        self.user_bulk_size = 0
+        # account ids seen without an email, resolved in bulk later. account id is used as the user until then
+        self.pending_accounts = set()
+        # pending account ids being read by a bulk request, without holding the lock
+        self.resolving_accounts = set()
+        # input - account id resolved in bulk, out - email replacing it
+        self.account_emails = {}
+        # IdentityCache persisting emails of account ids across runs, None if not enabled
+        self.identity_cache = None
+        # issues of a xml dump read by a non production run
+        self.nonprod_limit = 10
+        # finds other jira issue mentions by their browse urls
+        self.issue_mentions_extractor = MentionExtractor({'issue': re.escape(jira_url) + r'/browse/([A-Z]{1,9}-\d+)'})
 
-    def find_issue_id_mentions(self, input_dict: dict) -> list[str]:
-        """Gives list of issue ids found in dict by converting whole thing to json"""
-        json_txt = json.dumps(input_dict)
-        regex_matches = []
-        for match in self.jira_issue_regex.findall(json_txt):
-            regex_matches.append(match.split('/')[-1])
-        return regex_matches
+    def find_issue_id_mentions(self, input_dict: dict | str | None) -> list[str]:
+        """Gives list of issue ids found in a description or comment body. adf trees are walked through their texts
+        and urls instead of converting whole thing to json"""
+        return self.issue_mentions_extractor.find_in_document(input_dict)['issue']
 
     def request(self, url_suffix, method: str = "GET", payload: dict = None, params: dict = None) -> dict:
         """Request sending method with error checking and logging integrated"""
         request_url = self.jira_url + url_suffix
         self.logger.debug('sending ' + method + ' to : ' + url_suffix)
+        self.rate_limiter.acquire()
         try:
-            if params is None:
-                response = requests.request(method, request_url, headers=self.headers, auth=self.auth)
-            else:
-                response = requests.request(method, request_url, headers=self.headers, auth=self.auth,
-                                            params=params)
+            response = self.transport.request(method, request_url, params, payload)
             if response.status_code > 399:
                 self.logger.warn('received error code ' + str(response.status_code) + ' when calling ' + request_url)
                 self.logger.warn(response.text)
                 return {}
             else:
-                return json.loads(response.text)
+                return self.transport.parse_json(response)
         except:
             self.logger.error('Error occured in jira api request. ignoring')
             traceback.print_exc()
@@ -62,30 +92,154 @@ class JiraConnector(DevOpsConnector):
         return response
 
     def get_email_by_account_id(self, jira_account_id: str) -> str:
-        """This method sends an api call to /rest/api/3/user"""
+        """This method sends an api call to /rest/api/3/user. In bulk mode, the account id is given and the account
+        is resolved later by resolve_accounts"""
         # avoid using same api call again
         if jira_account_id in self.jira_id_email:
-            user_email = self.jira_id_email[jira_account_id]
+            return self.jira_id_email[jira_account_id]
+        if jira_account_id in self.pending_accounts or jira_account_id in self.resolving_accounts:
+            return jira_account_id
+        if self.identity_cache is not None:
+            user_email = self.identity_cache.get(jira_account_id)
+            if user_email is not None:
+                self.jira_id_email[jira_account_id] = user_email
+                return user_email
+        if self.user_bulk_size > 0:
+            with self.lock:
+                self.pending_accounts.add(jira_account_id)
+            return jira_account_id
+        url_suffix = '/rest/api/3/user'
+        self.logger.debug('Getting email for account: ' + str(jira_account_id))
+        response = self.get_data(url_suffix, {'accountId': jira_account_id})
+        if 'emailAddress' in response:
+            user_email = response['emailAddress']
         else:
-            url_suffix = '/rest/api/3/user'
-            self.logger.debug('Getting email for account: ' + str(jira_account_id))
-            response = self.get_data(url_suffix, {'accountId': jira_account_id})
-            if 'emailAddress' in response:
-                user_email = response['emailAddress']
-            else:
-                self.logger.warn('Email not found for account id: ' + str(jira_account_id))
-                user_email = jira_account_id
-            self.jira_id_email[jira_account_id] = user_email
+            self.logger.warn('Email not found for account id: ' + str(jira_account_id))
+            user_email = jira_account_id
+        self.remember_email(jira_account_id, user_email, 'accountId' in response)
         return user_email
 
-    def get_change_log_per_issue(self, issue_key: str) -> dict:
-        """get changelog history via call to /rest/api/3/issue"""
+    def remember_email(self, jira_account_id: str, user_email: str, found: bool):
+        self.jira_id_email[jira_account_id] = user_email
+        # accounts hiding their email are cached as well, failed lookups are not
+        if found and self.identity_cache is not None:
+            self.identity_cache.put(jira_account_id, user_email)
+
+    def resolve_accounts(self):
+        """Reads emails of the pending accounts via /rest/api/3/user/bulk, then replaces the account ids used in
+        events, user references and issue records in place of the emails"""
+        self.read_pending_accounts(self.take_pending_accounts())
+        self.replace_accounts()
+
+    def take_pending_accounts(self) -> list[str]:
+        """Gives the pending accounts to be read, they are marked as being resolved until read_pending_accounts"""
+        with self.lock:
+            account_ids = sorted(self.pending_accounts - set(self.jira_id_email))
+            self.pending_accounts = set()
+            self.resolving_accounts.update(account_ids)
+        return account_ids
+
+    def read_pending_accounts(self, account_ids: list[str]):
+        """Reads emails of accounts given by take_pending_accounts. Called without holding the lock, so that
+        workers adding events are not blocked by the requests"""
+        if not account_ids:
+            return
+        self.logger.info('Resolving ' + str(len(account_ids)) + ' accounts in bulk')
+        try:
+            self.get_users_in_bulk(account_ids)
+        finally:
+            with self.lock:
+                self.resolving_accounts.difference_update(account_ids)
+
+    def replace_accounts(self):
+        """Replaces the account ids resolved so far in events, user references and issue records"""
+        # all resolved accounts are replaced, events of concurrent workers may have been added after an earlier call
+        with self.lock:
+            if not self.account_emails:
+                return
+            replacements = self.account_emails
+            self.events.replace_values('user', replacements)
+            for account_id, user_email in replacements.items():
+                if account_id in self.user_ref:
+                    self.user_ref[user_email] = self.user_ref.pop(account_id)
+            for record in self.issue_list + list(self.changelog_queue.values()):
+                record['reporter_email'] = replacements.get(record['reporter_email'], record['reporter_email'])
+
+    def get_users_in_bulk(self, account_ids: list[str]):
+        """Reads emails of accounts via /rest/api/3/user/bulk, following all pages of each batch"""
+        for start in range(0, len(account_ids), self.user_bulk_size):
+            batch = account_ids[start:start + self.user_bulk_size]
+            params = {'accountId': batch, 'startAt': 0, 'maxResults': len(batch)}
+            found = set()
+            while True:
+                response = self.get_data('/rest/api/3/user/bulk', params)
+                users = response.get('values', [])
+                for user in users:
+                    found.add(user['accountId'])
+                    if 'emailAddress' in user:
+                        # replace_accounts iterates resolved accounts under the lock
+                        with self.lock:
+                            self.account_emails[user['accountId']] = user['emailAddress']
+                        self.remember_email(user['accountId'], user['emailAddress'], True)
+                    else:
+                        self.remember_email(user['accountId'], user['accountId'], True)
+                params['startAt'] += len(users)
+                if len(users) == 0 or response.get('isLast', True):
+                    break
+            for account_id in batch:
+                if account_id not in found:
+                    self.logger.warn('Email not found for account id: ' + account_id)
+                    self.remember_email(account_id, account_id, False)
+
+    def flush_streams(self, force: bool = False):
+        """Events and records are written with emails, not the account ids standing in for them. Accounts are read
+        without holding the lock, accounts seen by workers meanwhile are read in another round. The lock is only
+        held from the last round until written"""
+        if not self.streams:
+            return
+        while True:
+            with self.lock:
+                if not force and all(len(getattr(self, attribute)) < self.stream_batch_size
+                                     for attribute in self.streams):
+                    return
+                account_ids = self.take_pending_accounts()
+                if not account_ids:
+                    if self.resolving_accounts:
+                        # another worker is reading accounts of the batch, it writes the batch once they are read
+                        return
+                    self.replace_accounts()
+                    DevOpsConnector.flush_streams(self, force)
+                    return
+            self.read_pending_accounts(account_ids)
+
+    def get_change_log_per_issue(self, issue_key: str, history_ids: set = None) -> int:
+        """get changelog history via call to /rest/api/3/issue, following all pages. Gives the number of events added.
+        history_ids - ids of histories already read, these are skipped"""
         self.logger.set_prefix([issue_key])
         url_suffix = '/rest/api/3/issue/' + issue_key + '/changelog'
-        response = self.get_data(url_suffix)
+        params = {'startAt': 0, 'maxResults': self.page_size}
+        # counted locally since concurrent workers share the connector event counters
+        added_count = 0
+        while True:
+            response = self.get_data(url_suffix, params)
+            values = response.get('values', [])
+            added_count += self.iterate_change_log(values, issue_key, history_ids)
+            params['startAt'] += len(values)
+            if len(values) == 0 or response.get('isLast', False) or params['startAt'] >= response.get('total', 0):
+                break
+        return added_count
+
+    def iterate_change_log(self, values: list[dict], issue_key: str, history_ids: set = None) -> int:
+        """Adds events for changelog histories of an issue. Gives the number of events added.
+        history_ids - if given, histories in it are skipped and ids of the read histories are added to it"""
+        added_count = 0
         try:
-            for event in response['values']:
+            for event in values:
                 event_id = str(event['id'])
+                if history_ids is not None:
+                    if event_id in history_ids:
+                        continue
+                    history_ids.add(event_id)
                 event_time = event['created']
                 display_name = event['author']['displayName']
                 # emailAddress may not always be provided
@@ -113,21 +267,154 @@ class JiraConnector(DevOpsConnector):
                         case 'Key':
                             action = "jira_prj_changed"
                     if action != '':
-                        self.add_event(event_id, action, event_time, self.issue_case_id[issue_key], user_email,
-                                       display_name, issue_key, '', '', self.issue_ns[issue_key], duration)
+                        if self.add_event(event_id, action, event_time, self.issue_case_id[issue_key], user_email,
+                                          display_name, issue_key, '', '', self.issue_ns[issue_key], duration):
+                            added_count += 1
         except KeyError as e:
             self.logger.error('KeyError occured: ' + str(e))
             traceback.print_exc()
-        return response
+        return added_count
+
+    def get_change_logs_in_bulk(self, issue_records: dict[str, dict]):
+        """Get changelogs of up to 1000 issues per call to /rest/api/3/changelog/bulkfetch, following nextPageToken.
+        issue_records - issue key to issue record, state_changes of the records are set once all pages are read"""
+        url_suffix = '/rest/api/3/changelog/bulkfetch'
+        # bulk changelogs refer to issues by id
+        issue_id_key = {record['issue_id']: issue_key for issue_key, record in issue_records.items()}
+        added_counts = dict.fromkeys(issue_records, 0)
+        # input - issue key, out - ids of histories read so far, a failed page can leave an issue read in part
+        history_ids = {issue_key: set() for issue_key in issue_records}
+        payload = {'issueIdsOrKeys': list(issue_records), 'maxResults': self.changelog_bulk_page_size}
+        self.logger.info('Reading changelogs of ' + str(len(issue_records)) + ' issues in bulk')
+        while True:
+            response = self.request(url_suffix, 'POST', payload)
+            if response == {}:
+                # bulk api is not available on all jira versions, issues are read one by one instead. After the
+                # first page, issues of earlier pages may be complete or partial, all are read again per issue
+                # and histories already added are skipped
+                self.logger.warn('Bulk changelog request failed, reading changelogs per issue')
+                for issue_key in issue_records:
+                    added_counts[issue_key] += self.get_change_log_per_issue(issue_key, history_ids[issue_key])
+                break
+            for change_log in response.get('issueChangeLogs', []):
+                issue_key = issue_id_key.get(str(change_log['issueId']))
+                if issue_key is None:
+                    self.logger.warn('Changelog received for an unknown issue id: ' + str(change_log['issueId']))
+                    continue
+                added_counts[issue_key] += self.iterate_change_log(change_log.get('changeHistories', []), issue_key,
+                                                                   history_ids[issue_key])
+            if 'nextPageToken' not in response:
+                break
+            payload['nextPageToken'] = response['nextPageToken']
+        for issue_key, record in issue_records.items():
+            record['state_changes'] = str(added_counts[issue_key])
+            self.issue_list.append(record)
+
+    def add_change_log(self, issue_key: str, issue_record: dict):
+        """Reads the changelog of an issue and adds its record to issue list. In bulk mode, issues are queued
+        until a bulk request can be made, hence records are added later"""
+        if self.changelog_bulk_size == 0:
+            changelog_count = str(self.get_change_log_per_issue(issue_key))
+            self.logger.debug('Changelog events added: ' + changelog_count)
+            issue_record['state_changes'] = changelog_count
+            self.issue_list.append(issue_record)
+            return
+        with self.lock:
+            self.changelog_queue[issue_key] = issue_record
+            if len(self.changelog_queue) < self.changelog_bulk_size:
+                return
+            issue_records = self.changelog_queue
+            self.changelog_queue = {}
+        self.get_change_logs_in_bulk(issue_records)
+
+    def flush_change_logs(self):
+        """Reads changelogs of the issues remaining in the bulk queue"""
+        with self.lock:
+            issue_records = self.changelog_queue
+            self.changelog_queue = {}
+        if issue_records:
+            self.get_change_logs_in_bulk(issue_records)
 
-    def get_comments_per_issue(self, issue_key: str) -> dict:
-        """Get comment details for a given issue via /rest/api/3/issue/"""
+    def get_comments_per_issue(self, issue_key: str, start_at: int = 0) -> int:
+        """Get comment details for a given issue via /rest/api/3/issue/, following all pages starting from
+        start_at. Gives the number of events added"""
         self.logger.set_prefix([issue_key])
         url_suffix = '/rest/api/3/issue/' + issue_key + '/comment'
-        response = self.get_data(url_suffix)
-        # iterate through comments
-        self.iterate_comments(response['comments'], issue_key)
-        return response
+        params = {'startAt': start_at, 'maxResults': self.page_size}
+        added_count = 0
+        while True:
+            response = self.get_data(url_suffix, params)
+            comments = response.get('comments', [])
+            # iterate through comments
+            added_count += self.iterate_comments(comments, issue_key)
+            params['startAt'] += len(comments)
+            if len(comments) == 0 or params['startAt'] >= response.get('total', 0):
+                break
+        return added_count
+
+    def get_issues_via_api(self, issue_keys: list[str], workers: int = 1):
+        """Get issues concurrently using a bounded pool of workers. api calls are throttled by the rate limiter"""
+        self.logger.info('Reading ' + str(len(issue_keys)) + ' issues using ' + str(workers) + ' worker(s)')
+        issue_counter = 0
+        for _ in LMPUtils.ordered_map(self.get_issue_via_api, issue_keys, workers):
+            issue_counter += 1
+            self.log_status(issue_counter, len(issue_keys))
+        self.flush_change_logs()
+
+    def search_issues(self, jql: str, page_size: int = 100, token_paging: bool = True) -> Iterator[dict]:
+        """Pages through /rest/api/3/search/jql using nextPageToken, or /rest/api/3/search using startAt
+        if token_paging is disabled. Yields one issue dict at a time"""
+        params = {'jql': jql, 'maxResults': page_size, 'fields': self.issue_fields}
+        if token_paging:
+            url_suffix = '/rest/api/3/search/jql'
+        else:
+            url_suffix = '/rest/api/3/search'
+            params['startAt'] = 0
+        while True:
+            response = self.get_data(url_suffix, params)
+            issues = response.get('issues', [])
+            self.logger.debug('issues found in search page: ' + str(len(issues)))
+            yield from issues
+            if token_paging:
+                if response.get('isLast', False) or 'nextPageToken' not in response:
+                    break
+                params['nextPageToken'] = response['nextPageToken']
+            else:
+                params['startAt'] += len(issues)
+                if len(issues) == 0 or params['startAt'] >= response.get('total', 0):
+                    break
+
+    def get_issues_via_search(self, jql: str, page_size: int = 100, token_paging: bool = True, workers: int = 1,
+                              max_issues: int = 0):
+        """Get issues matching a jql query. Issue events are built concurrently while search pages are read.
+        max_issues of 0 reads all matching issues"""
+        if self.updated_after is not None:
+            # only issues updated after the watermark are read in incremental runs
+            jql = self.add_jql_clause(jql, 'updated >= ' + self.to_jql_relative_time(self.updated_after))
+        self.logger.info('Searching issues using jql: ' + jql)
+        issues = self.search_issues(jql, page_size, token_paging)
+        if max_issues > 0:
+            issues = islice(issues, max_issues)
+        issue_counter = 0
+        for _ in LMPUtils.ordered_map(self.add_issue, issues, workers):
+            issue_counter += 1
+            self.log_status(issue_counter)
+        self.flush_change_logs()
+
+    @classmethod
+    def add_jql_clause(cls, jql: str, clause: str) -> str:
+        """Adds a clause to the jql query using AND, keeping any ORDER BY at the end"""
+        order_match = re.search(r'\s+ORDER\s+BY\s+', jql, re.IGNORECASE)
+        if order_match is None:
+            return '(' + jql + ') AND ' + clause
+        return '(' + jql[:order_match.start()] + ') AND ' + clause + jql[order_match.start():]
+
+    @classmethod
+    def to_jql_relative_time(cls, iso8601_time: str) -> str:
+        """Gives the time as minutes relative to now, like -90m. Absolute jql dates are read in the timezone
+        of the jira user, while relative ones do not depend on it"""
+        elapsed = datetime.now(timezone.utc) - datetime.fromisoformat(iso8601_time)
+        return '-' + str(math.ceil(elapsed.total_seconds() / 60)) + 'm'
 
     def get_issue_via_api(self, issue_key: str) -> dict:
         """Get issue details for a given issue via /rest/api/3/issue/{issueIdOrKey}"""
@@ -138,6 +425,13 @@ class JiraConnector(DevOpsConnector):
         if issue == {}:
             self.logger.error('Issue data cannot be retrieved: ' + issue_key)
             return issue
+        return self.add_issue(issue, issue_key)
+
+    def add_issue(self, issue: dict, issue_key: str = None) -> dict:
+        """Adds events of an issue dict as returned by issue or search apis. Changelog is read using api call"""
+        if issue_key is None:
+            issue_key = issue['key']
+            self.logger.set_prefix([issue_key])
         try:
             # issue key is the jira project_key - number format string
             ns = issue['fields']['project']['key']
@@ -167,36 +461,38 @@ class JiraConnector(DevOpsConnector):
                     timespent = int(issue['fields']['timetracking']['timeSpentSeconds'])
             # find any issue mentions
             mentions = self.find_issue_id_mentions(issue['fields']['description'])
-            for mention in mentions:
-                self.add_link(self.issue_mentions, issue_key, mention)
+            with self.lock:
+                for mention in mentions:
+                    self.add_link(self.issue_mentions, issue_key, mention)
             # add jira create event
             self.add_event(issue_id, action, issue_created, case_id, reporter_email, reporter_name,
                            issue_key, issue_type, parent, ns)
-            # iterate through comments and add, no need to use comments api call for this
-            self.added_event_count()
-            self.iterate_comments(issue['fields']['comment']['comments'], issue_key)
-            comment_count = str(self.added_event_count())
+            # iterate through comments and add, no need to use comments api call for the first page
+            comment_field = issue['fields']['comment']
+            comment_count = self.iterate_comments(comment_field['comments'], issue_key)
+            if comment_field.get('total', 0) > len(comment_field['comments']):
+                # issue fields only hold the first page of comments, rest is read using comments api
+                comment_count += self.get_comments_per_issue(issue_key, len(comment_field['comments']))
+            comment_count = str(comment_count)
             self.logger.debug('Comment events added: ' + comment_count)
-            # get changelog events using api call
-            self.get_change_log_per_issue(issue_key)
-            changelog_count = str(self.added_event_count())
-            self.logger.debug('Changelog events added: ' + changelog_count)
             # prepare mentions as a set
             mention_set = self.empty_set_or_value(self.issue_mentions, issue_key)
-            # add to issue list
-            self.issue_list.append({'issue_key': issue_key, 'reporter_email': reporter_email,
-                                    'reporter_name': reporter_name,
-                                    'issue_type': issue_type, 'parent': parent,
-                                    'issue_id': issue_id, 'created': issue_created,
-                                    'ns': ns, 'timespent': timespent,
-                                    'comments': comment_count, 'state_changes': changelog_count,
-                                    'mentions': mention_set})
+            # get changelog events using api call, then add to issue list
+            self.add_change_log(issue_key, {'issue_key': issue_key, 'reporter_email': reporter_email,
+                                            'reporter_name': reporter_name,
+                                            'issue_type': issue_type, 'parent': parent,
+                                            'issue_id': issue_id, 'created': issue_created,
+                                            'ns': ns, 'timespent': timespent,
+                                            'comments': comment_count, 'state_changes': '',
+                                            'mentions': mention_set})
         except KeyError as e:
             print('[ERROR] KeyError occured: ' + str(e))
             traceback.print_exc()
         return issue
 
-    def iterate_comments(self, comment_list: list[dict], issue_key: str):
+    def iterate_comments(self, comment_list: list[dict], issue_key: str) -> int:
+        """Adds comment events for an issue. Gives the number of events added"""
+        added_count = 0
         try:
             for event in comment_list:
                 event_id = str(event['id'])
@@ -218,72 +514,98 @@ class JiraConnector(DevOpsConnector):
                     action = 'jira_commented'
                 # find any issue mentions
                 mentions = self.find_issue_id_mentions(event['body'])
-                for mention in mentions:
-                    self.add_link(self.issue_mentions, issue_key, mention)
-                self.add_event(event_id, action, event_time, self.issue_case_id[issue_key], user_email,
-                               display_name,
-                               issue_key, info1, '', self.issue_ns[issue_key])
+                with self.lock:
+                    for mention in mentions:
+                        self.add_link(self.issue_mentions, issue_key, mention)
+                if self.add_event(event_id, action, event_time, self.issue_case_id[issue_key], user_email,
+                                  display_name,
+                                  issue_key, info1, '', self.issue_ns[issue_key]):
+                    added_count += 1
         except KeyError as e:
             print('[ERROR] KeyError occured: ' + str(e))
             traceback.print_exc()
+        return added_count
 
     def iterate_xml_issues(self, jira_xml: dict, prod_run: bool = False):
         """Allows to load issues from a xml dump from jira"""
         issue_counter = 0
         xml_issues = jira_xml['rss']['channel']['item']
         if not prod_run:
-            xml_issues = xml_issues[0:10]
+            xml_issues = xml_issues[0:self.nonprod_limit]
         for issue in xml_issues:
             issue_counter += 1
-            # issue key is the jira project_key - number format string
-            issue_key = issue['key']['#text']
-            ns = issue['project']['@key']
-            case_id = issue_key
-            action = 'jira_created'
-            issue_id = str(issue['key']['@id'])
-            issue_created = LMPUtils.rfc2822_to_iso(issue['created'])
-            issue_type = issue['type']['#text']
-            reporter_email = self.get_email_by_account_id(issue['reporter']['@accountid'])
-            reporter_name = issue['reporter']['#text']
-            parent = ''
-            if 'parent' in issue:
-                parent = issue['parent']['#text']
-                case_id = parent
-                action = 'jira_sub_created'
-            # set issue dict for easy reference
-            self.issue_case_id[issue_key] = case_id
-            self.issue_ns[issue_key] = ns
-            # add jira create event
-            self.add_event(issue_id, action, issue_created, case_id, reporter_email, reporter_name,
-                           issue_key, issue_type, parent, ns)
-            if 'timespent' in issue:
-                timespent = int(issue['timespent']['@seconds'])
-            else:
-                timespent = 0
-            # find any issue mentions
-            mentions = self.find_issue_id_mentions(issue['description'])
-            for mention in mentions:
-                self.add_link(self.issue_mentions, issue_key, mention)
-            # get comment data using api call because xml is not great for lists
-            self.added_event_count()
-            self.get_comments_per_issue(issue_key)
-            comment_count = str(self.added_event_count())
-            self.logger.debug('Comment events added: ' + comment_count)
-            # get changelog events using api call
-            self.get_change_log_per_issue(issue_key)
-            changelog_count = str(self.added_event_count())
-            self.logger.debug('Changelog events added: ' + changelog_count)
-            # prepare mentions as a set
-            mention_set = self.empty_set_or_value(self.issue_mentions, issue_key)
-            # add to issue list
-            self.issue_list.append({'issue_key': issue_key, 'reporter_email': reporter_email,
-                                    'reporter_name': reporter_name,
-                                    'issue_type': issue_type, 'parent': parent,
-                                    'issue_id': issue_id, 'created': issue_created,
-                                    'ns': ns, 'timespent': timespent,
-                                    'comments': comment_count, 'state_changes': changelog_count,
-                                    'mentions': mention_set})
+            self.process_xml_issue(issue)
             self.log_status(issue_counter, len(xml_issues))
+        self.flush_change_logs()
+
+    def stream_xml_issues(self, xml_file: BinaryIO, prod_run: bool = False):
+        """Loads issues from a xml dump from jira, parsing one item at a time. Memory use does not depend on the
+        size of the dump, and a non production run stops parsing after the first items"""
+        issue_counter = 0
+
+        def on_item(path: list, issue) -> bool:
+            nonlocal issue_counter
+            # other children of the channel, ex: title and build-info, are given at the same depth
+            if path[-1][0] != 'item':
+                return True
+            issue_counter += 1
+            self.process_xml_issue(issue)
+            # total is not known until the whole dump is parsed
+            self.log_status(issue_counter)
+            # returning false stops the parser
+            return prod_run or issue_counter < self.nonprod_limit
+
+        try:
+            # rss > channel > item
+            xmltodict.parse(xml_file, item_depth=3, item_callback=on_item)
+        except xmltodict.ParsingInterrupted:
+            self.logger.info('stopped reading xml after ' + str(issue_counter) + ' issues')
+        self.flush_change_logs()
+
+    def process_xml_issue(self, issue: dict):
+        """Adds events of an issue item of a xml dump"""
+        # issue key is the jira project_key - number format string
+        issue_key = issue['key']['#text']
+        ns = issue['project']['@key']
+        case_id = issue_key
+        action = 'jira_created'
+        issue_id = str(issue['key']['@id'])
+        issue_created = LMPUtils.rfc2822_to_iso(issue['created'])
+        issue_type = issue['type']['#text']
+        reporter_email = self.get_email_by_account_id(issue['reporter']['@accountid'])
+        reporter_name = issue['reporter']['#text']
+        parent = ''
+        if 'parent' in issue:
+            parent = issue['parent']['#text']
+            case_id = parent
+            action = 'jira_sub_created'
+        # set issue dict for easy reference
+        self.issue_case_id[issue_key] = case_id
+        self.issue_ns[issue_key] = ns
+        # add jira create event
+        self.add_event(issue_id, action, issue_created, case_id, reporter_email, reporter_name,
+                       issue_key, issue_type, parent, ns)
+        if 'timespent' in issue:
+            timespent = int(issue['timespent']['@seconds'])
+        else:
+            timespent = 0
+        # find any issue mentions
+        mentions = self.find_issue_id_mentions(issue['description'])
+        for mention in mentions:
+            self.add_link(self.issue_mentions, issue_key, mention)
+        # get comment data using api call because xml is not great for lists
+        comment_count = str(self.get_comments_per_issue(issue_key))
+        self.logger.debug('Comment events added: ' + comment_count)
+        # prepare mentions as a set
+        mention_set = self.empty_set_or_value(self.issue_mentions, issue_key)
+        # get changelog events using api call, then add to issue list
+        self.add_change_log(issue_key, {'issue_key': issue_key, 'reporter_email': reporter_email,
+                                        'reporter_name': reporter_name,
+                                        'issue_type': issue_type, 'parent': parent,
+                                        'issue_id': issue_id, 'created': issue_created,
+                                        'ns': ns, 'timespent': timespent,
+                                        'comments': comment_count, 'state_changes': '',
+                                        'mentions': mention_set})
 
 
 
@@ -1,4 +1,5 @@
 import os
+import time
 import pandas as pd
 from jiraConnector import JiraConnector
 import json
@@ -7,12 +8,16 @@ import xmltodict
 import sys
 sys.path.insert(0, '../common')
 from LMPUtils import LMPUtils
+from WatermarkState import WatermarkState
+from ParquetStreamWriter import ParquetStreamWriter
+from OutputEngine import OutputEngine
+from RunMetrics import RunMetrics
+from IdentityCache import IdentityCache
 
 if __name__ == '__main__':
     # ===== configurations ===============
     # read main config
-    with open('../common/settings.json', 'r') as settings_file:
-        settings = json.load(settings_file)['jira']
+    settings = LMPUtils.load_settings('jira')
     # Export jira issue csv with all fields using jira UI itself
     # Note: put 'r' prefix below for windows paths when using absolute path.
     # WARNING: CSV export is known to skip tracks in fields when csv is decoded. Using xml output is recommended
@@ -45,46 +50,119 @@ if __name__ == '__main__':
     preserve_timezone = settings['preserve_timezone']
 
     # initialize global var
-    event_logs = []
     user_info_dict = {}
     # initialize jira connector
     logger.info('======== Jira api calls starting : ===========')
-    jira_connector = JiraConnector(jira_url, auth_token, 'default', auth_email)
+    # requests per second takes precedence over api delay when set to a value above 0
+    jira_connector = JiraConnector(jira_url, auth_token, 'default', auth_email, issue_api_delay,
+                                   settings['api']['requests_per_second'], settings['http'])
     jira_connector.user_ref = user_info_dict
+    jira_connector.page_size = settings['api']['page_size']
+    if settings['changelog']['bulk']:
+        # changelogs of many issues are read in a single request, instead of one request per issue
+        jira_connector.changelog_bulk_size = settings['changelog']['issues_per_request']
+        jira_connector.changelog_bulk_page_size = settings['changelog']['page_size']
+    user_settings = settings['users']
+    if user_settings['bulk']:
+        # emails of accounts are read in batches once issues are read, instead of one request per account
+        jira_connector.user_bulk_size = user_settings['accounts_per_request']
+    if user_settings['cache']['enabled']:
+        # emails read by earlier runs are reused until they expire
+        jira_connector.identity_cache = IdentityCache(user_settings['cache']['path'],
+                                                      user_settings['cache']['ttl_hours'])
+    # codec, categorical columns and layout of the outputs
+    jira_connector.output = OutputEngine.from_settings(settings['output'])
 
+    # incremental runs are supported for jql issue source only
+    incremental = settings['incremental']
+    incremental_run = incremental['enabled'] and jira_issue_source_type == 'jql'
+    if incremental['enabled'] and not incremental_run:
+        logger.warning('incremental runs are supported for jql issue source only, all issues of the '
+                       + jira_issue_source_type + ' issue source are read and outputs are replaced')
+    run_started = WatermarkState.now()
+    watermarks = WatermarkState(incremental['state_file'], incremental['overlap_minutes'])
+    # merge keys are used to upsert records into existing outputs
+    event_keys = None
+    entity_keys = None
+    # streaming writes events and issues in batches while reading, keeping memory usage flat
+    streaming = settings['streaming']
+    streams = {}
+    if streaming['enabled']:
+        if incremental_run:
+            logger.warning('streaming is disabled for incremental runs, as outputs need to be merged at the end')
+        else:
+            if jira_connector.output.partitioned or jira_connector.output.arrow_ipc:
+                logger.warning('partitioned and arrow ipc outputs are not streamed, a single parquet file is written')
+            streams['issue_list'] = ParquetStreamWriter('jira_issues_' + parquet_suffix, ['created'],
+                                                        preserve_timezone, jira_connector.output)
+            streams['events'] = ParquetStreamWriter('jira_event_logs_' + parquet_suffix, ['time'],
+                                                    preserve_timezone, jira_connector.output)
+            jira_connector.enable_streaming(streams, streaming['batch_size'])
     # load jira issues
     issue_df = pd.DataFrame()
-    if jira_issue_source_type == 'xml':
-        # TODO: both get issue api and xml provide reliable comment list. Get the info from there
-        jira_issue_source = settings['issue_source']['path']
-        with open(jira_issue_source) as xml_source:
-            jira_xml = xmltodict.parse(xml_source.read())
-            jira_connector.iterate_xml_issues(jira_xml, production_run)
-    else:
-        jira_project_key = os.environ['JIRA_PRJ_KEY']
-        jira_issue_start = int(os.environ['JIRA_START_KEY'])
-        jira_issue_end = int(os.environ['JIRA_STOP_KEY'])
-        issue_key_list = []
-        for i in range(jira_issue_start, jira_issue_end + 1):
-            issue_key_list.append(jira_project_key + '-' + str(i))
-        if not production_run:
-            issue_key_list = issue_key_list[:20]
-        logger.info('Number of issues to be read: ' + str(len(issue_key_list)))
-        issue_counter = 0
-        for issue_key in issue_key_list:
-            issue_counter += 1
-            jira_connector.get_issue_via_api(issue_key)
-            jira_connector.log_status(issue_counter, len(issue_key_list))
+    issues_started = time.perf_counter()
+    try:
+        if jira_issue_source_type == 'xml':
+            # TODO: both get issue api and xml provide reliable comment list. Get the info from there
+            jira_issue_source = settings['issue_source']['path']
+            if settings['issue_source']['xml_streaming']:
+                # items are parsed one at a time, multi GB dumps are not loaded to memory
+                with open(jira_issue_source, 'rb') as xml_source:
+                    jira_connector.stream_xml_issues(xml_source, production_run)
+            else:
+                with open(jira_issue_source) as xml_source:
+                    jira_xml = xmltodict.parse(xml_source.read())
+                    jira_connector.iterate_xml_issues(jira_xml, production_run)
+        elif jira_issue_source_type == 'jql':
+            # pages through search results instead of enumerating keys, missing keys do not cost a request
+            jira_project_key = os.environ['JIRA_PRJ_KEY']
+            if incremental_run:
+                # only issues updated after the last successful run are read
+                logger.info('incremental run, state file: ' + incremental['state_file'])
+                jira_connector.updated_after = watermarks.get('jira', jira_project_key)
+                event_keys = ['id', 'action', 'time']
+                entity_keys = ['issue_key']
+            jql = settings['issue_source']['jql'].format(project=jira_project_key)
+            jira_connector.get_issues_via_search(jql, settings['issue_source']['page_size'],
+                                                 settings['issue_source']['token_paging'], settings['api']['workers'],
+                                                 0 if production_run else 20)
+        else:
+            jira_project_key = os.environ['JIRA_PRJ_KEY']
+            jira_issue_start = int(os.environ['JIRA_START_KEY'])
+            jira_issue_end = int(os.environ['JIRA_STOP_KEY'])
+            issue_key_list = []
+            for i in range(jira_issue_start, jira_issue_end + 1):
+                issue_key_list.append(jira_project_key + '-' + str(i))
+            if not production_run:
+                issue_key_list = issue_key_list[:20]
+            logger.info('Number of issues to be read: ' + str(len(issue_key_list)))
+            jira_connector.get_issues_via_api(issue_key_list, settings['api']['workers'])
+        jira_connector.resolve_accounts()
+        jira_connector.flush_streams(True)
+        RunMetrics.get().record_stage(jira_connector.namespace, 'get_issues_events',
+                                      time.perf_counter() - issues_started, jira_connector.event_counter)
+    finally:
+        # footer is written even if the run fails, so that already streamed records can be read
+        for writer in streams.values():
+            writer.close()
 
-    issue_df = pd.DataFrame(jira_connector.issue_list)
-    # remove any missing values with 'na' in parent field
-    issue_df['parent'] = issue_df['parent'].fillna('na')
-    jira_connector.publish_df(issue_df, ['created'], preserve_timezone,  'issues',
-                              'jira_issues_' + parquet_suffix)
-    # create event df
-    event_df = pd.DataFrame(jira_connector.event_logs)
-    jira_connector.publish_df(event_df, ['time'], preserve_timezone,  'events',
-                              'jira_event_logs_' + parquet_suffix)
+    if jira_connector.transport.cache is not None:
+        logger.info(jira_connector.transport.cache.summary())
+    if jira_connector.identity_cache is not None:
+        jira_connector.identity_cache.save()
+        logger.info(jira_connector.identity_cache.summary())
+    if streams:
+        logger.info('outputs were streamed while reading issues, skipping dataframe creation')
+    else:
+        issue_df = pd.DataFrame(jira_connector.issue_list)
+        # remove any missing values with 'na' in parent field
+        issue_df['parent'] = issue_df['parent'].fillna('na')
+        jira_connector.publish_df(issue_df, ['created'], preserve_timezone,  'issues',
+                                  'jira_issues_' + parquet_suffix, entity_keys)
+        # create event df
+        event_df = jira_connector.events.to_dataframe()
+        jira_connector.publish_df(event_df, ['time'], preserve_timezone,  'events',
+                                  'jira_event_logs_' + parquet_suffix, event_keys)
     # use pm4py.format_dataframe and then pm4py.convert_to_event_log to convert this to an event log
     # please use utils/process_mining.py for this task
     # write users to file if enabled
@@ -93,4 +171,11 @@ if __name__ == '__main__':
     if user_json != ' ':
         with open(user_json, 'w') as user_file:
             json.dump(user_info_dict, user_file)
-
+    if entity_keys is not None:
+        # watermark is only moved once all outputs are saved
+        watermarks.set('jira', jira_project_key, run_started)
+        watermarks.save()
+    # api call, stage and memory metrics of the run, for tracking performance across runs
+    metrics = settings['metrics']
+    if metrics['enabled']:
+        RunMetrics.get().write('jira', metrics['json_file'], metrics['prometheus_file'])
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# modules are imported by name, the same way the loggers do after adding ../common to the path
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in ['common', 'gitlab', 'azure_devops', 'jira']:
+    sys.path.insert(0, os.path.join(root, directory))
@@ -0,0 +1,74 @@
+import gzip
+import json
+from datetime import datetime, timezone
+import pytest
+from CheckpointStore import CheckpointStore
+from EventBuffer import EventBuffer
+
+
+def events() -> EventBuffer:
+    buffer = EventBuffer()
+    for i, user in enumerate(['alice', 'bob', 'alice']):
+        buffer.append({'id': str(i), 'action': 'created', 'time': '2024-01-01T00:00:0' + str(i) + 'Z',
+                       'case': 'C-' + str(i % 2), 'user': user, 'local_case': 'L-1', 'info1': None, 'info2': '',
+                       'ns': 'ns1', 'duration': i * 10})
+    return buffer
+
+
+STATE = {'completed': {1, 2, 3}, 'names': {'b', 'a'}, 'pair': (1, 'a', None),
+         'started': datetime(2024, 1, 2, 3, 4, 5, 678000, tzinfo=timezone.utc), 'naive': datetime(2024, 1, 2),
+         'by_iid': {1: {'branches': ['main'], 'created': '2024-01-01'}, 2: {'branches': [], 'created': None}},
+         'by_pair': {(1, 'a'): 1.5, (2, 'b'): True}, 'mixed_keys': {'1': 'str', 1: 'int'},
+         'tagged': {CheckpointStore.type_key: 'set', 'items': []}, 'nested': [{'s': {(1, 2)}}, [(), set()]],
+         'empty': {}, 'events': events()}
+
+
+def assert_same_state(decoded: dict):
+    assert decoded.keys() == STATE.keys()
+    for key, value in STATE.items():
+        if isinstance(value, EventBuffer):
+            assert isinstance(decoded[key], EventBuffer)
+            assert decoded[key].to_list() == value.to_list()
+            assert decoded[key].categories('user') == value.categories('user')
+        else:
+            assert decoded[key] == value
+            assert type(decoded[key]) is type(value)
+    # types inside containers are kept as well
+    assert type(next(iter(decoded['by_pair']))) is tuple
+    assert type(decoded['nested'][0]['s']) is set
+
+
+def test_encode_gives_json_and_decode_round_trips():
+    encoded = json.loads(json.dumps(CheckpointStore.encode(STATE)))
+    assert_same_state(CheckpointStore.decode(encoded))
+
+
+def test_events_continue_after_decode():
+    buffer = CheckpointStore.decode(CheckpointStore.encode(events()))
+    buffer.append_row(('9', 'closed', '2024-01-01T00:00:09Z', 'C-0', 'bob', 'L-1', None, '', 'ns1', 5))
+    assert buffer.column('user') == ['alice', 'bob', 'alice', 'bob']
+    assert buffer.column('duration') == [0, 10, 20, 5]
+
+
+def test_unsupported_types():
+    with pytest.raises(TypeError):
+        CheckpointStore.encode({'value': object()})
+    with pytest.raises(ValueError):
+        CheckpointStore.decode({CheckpointStore.type_key: 'pickle', 'value': ''})
+
+
+def test_save_load_and_clear(tmp_path):
+    store = CheckpointStore(str(tmp_path), 'gitlab')
+    assert store.load('group/project') is None
+    store.save('group/project', STATE)
+    assert_same_state(store.load('group/project'))
+    # other versions and unreadable files are not resumed
+    with gzip.open(store.path('old'), 'wt', encoding='utf-8') as checkpoint_file:
+        json.dump({'version': 1, 'state': {}}, checkpoint_file)
+    assert store.load('old') is None
+    with open(store.path('broken'), 'wb') as checkpoint_file:
+        checkpoint_file.write(b'not gzip')
+    assert store.load('broken') is None
+    (tmp_path / 'other.txt').write_text('kept')
+    store.clear()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['other.txt']
@@ -0,0 +1,106 @@
+import pandas as pd
+import pyarrow as pa
+from DevOpsConnector import DevOpsConnector
+from EventBuffer import EventBuffer
+
+
+def event(event_id, action, case, user, ns='ns1', duration=0) -> dict:
+    return {'id': str(event_id), 'action': action, 'time': '2024-01-01T00:00:0' + str(event_id % 10) + 'Z',
+            'case': case, 'user': user, 'local_case': 'L-' + str(event_id), 'info1': 'i' + str(event_id),
+            'info2': '', 'ns': ns, 'duration': duration}
+
+
+EVENTS = [event(1, 'created', 'C-1', 'alice'), event(2, 'closed', 'C-1', 'bob', duration=30),
+          event(3, 'created', 'C-2', 'alice', 'ns2'), event(4, 'assigned', 'C-2', 'carol', 'ns2', 5)]
+
+
+def buffer_of(events: list[dict]) -> EventBuffer:
+    buffer = EventBuffer()
+    for e in events:
+        buffer.append(e)
+    return buffer
+
+
+def as_plain(df: pd.DataFrame) -> pd.DataFrame:
+    """Categorical columns as object columns, to compare with the list of dicts form"""
+    return df.astype({column: object for column in EventBuffer.dictionary_columns})
+
+
+def test_append_row_matches_append():
+    by_dict = buffer_of(EVENTS)
+    by_row = EventBuffer()
+    for e in EVENTS:
+        by_row.append_row(tuple(e[column] for column in EventBuffer.columns))
+    assert by_row.to_list() == by_dict.to_list() == EVENTS
+
+
+def test_to_dataframe_matches_list_of_dicts():
+    df = buffer_of(EVENTS).to_dataframe()
+    expected = pd.DataFrame(EVENTS, columns=EventBuffer.columns)
+    for column in EventBuffer.dictionary_columns:
+        assert isinstance(df[column].dtype, pd.CategoricalDtype)
+    pd.testing.assert_frame_equal(as_plain(df), expected, check_dtype=False)
+    assert df['duration'].dtype == 'int64'
+
+
+def test_to_arrow_matches_list_of_dicts():
+    table = buffer_of(EVENTS).to_arrow()
+    assert table.column_names == EventBuffer.columns
+    for column in EventBuffer.dictionary_columns:
+        assert pa.types.is_dictionary(table.schema.field(column).type)
+    assert table.to_pylist() == EVENTS
+
+
+def test_extend_translates_overlapping_dictionaries():
+    first = buffer_of(EVENTS[:2])
+    # categories of the second buffer are in another order, and partly shared with the first
+    second = buffer_of([event(5, 'assigned', 'C-3', 'carol'), event(6, 'closed', 'C-1', 'alice'),
+                        event(7, 'created', 'C-3', 'dave', 'ns3')])
+    first.extend(second)
+    assert len(first) == 5
+    assert first.to_list() == EVENTS[:2] + second.to_list()
+    assert first.categories('action') == ['created', 'closed', 'assigned']
+    assert first.categories('user') == ['alice', 'bob', 'carol', 'dave']
+    pd.testing.assert_frame_equal(as_plain(first.to_dataframe()),
+                                  pd.DataFrame(first.to_list(), columns=EventBuffer.columns), check_dtype=False)
+
+
+def test_extend_empty_buffers():
+    buffer = EventBuffer()
+    buffer.extend(EventBuffer())
+    assert len(buffer) == 0
+    buffer.extend(buffer_of(EVENTS))
+    assert buffer.to_list() == EVENTS
+
+
+def test_replace_values_with_new_and_existing_values():
+    buffer = buffer_of(EVENTS)
+    # carol is replaced by a new value, alice by a value already in the column
+    buffer.replace_values('user', {'carol': 'carol@example.com', 'alice': 'bob'})
+    assert buffer.column('user') == ['bob', 'bob', 'bob', 'carol@example.com']
+    assert buffer.categories('user') == ['bob', 'carol@example.com']
+    # appends after a replacement use the translated codes
+    buffer.append(event(5, 'created', 'C-3', 'bob'))
+    buffer.append(event(6, 'created', 'C-3', 'erin'))
+    assert buffer.column('user')[-2:] == ['bob', 'erin']
+    assert list(buffer.to_dataframe()['user'].astype(str)) == buffer.column('user')
+
+
+def test_clear_resets_dictionaries():
+    buffer = buffer_of(EVENTS)
+    buffer.clear()
+    assert len(buffer) == 0
+    assert buffer.categories('action') == []
+    assert len(buffer.to_dataframe()) == 0
+
+
+def test_add_event_appends_columns():
+    connector = DevOpsConnector('ns1', 0)
+    assert connector.add_event(1, 'created', '2024-01-01T00:00:01Z', 'C-1', 'alice', 'Alice', 'L-1', 'i1')
+    assert connector.add_event(2, 'closed', '2024-01-01T00:00:02Z', 'C-1', 'bob', 'Bob', 'L-2', 'i2', duration=30)
+    # events with a date only time or a missing field are rejected
+    assert not connector.add_event(3, 'created', '2024-01-01', 'C-1', 'alice', 'Alice', 'L-3')
+    assert not connector.add_event(4, 'created', '2024-01-01T00:00:04Z', None, 'alice', 'Alice', 'L-4')
+    assert connector.events.to_list() == EVENTS[:2]
+    assert connector.event_counter == 2
+    assert connector.user_ref == {'alice': 'Alice', 'bob': 'Bob'}
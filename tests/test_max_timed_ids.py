@@ -0,0 +1,53 @@
+import datetime
+import pytest
+from DevOpsConnector import DevOpsConnector
+
+TIMES = {1: '2024-03-01T10:00:00Z', 2: '2024-03-02T10:00:00+00:00', 3: '2024-03-02T12:00:00+02:00',
+         4: '2024-03-01T09:00:00.123456Z', 5: '1999-12-31T23:00:00Z', 6: '2024-03-02T10:00:00Z'}
+
+
+def test_matches_get_max_timed_id():
+    links = {'a': {1, 2}, 'b': {1, 4}, 'c': {4}, 'd': {5}, 'e': {1, 5, 4}}
+    latest = DevOpsConnector.get_max_timed_ids(links, TIMES)
+    assert latest == {key: DevOpsConnector.get_max_timed_id(ids, TIMES) for key, ids in links.items()}
+    assert latest == {'a': 2, 'b': 1, 'c': 4, 'd': 0, 'e': 1}
+
+
+def test_ties_go_to_first_id_in_set_order():
+    # 2, 3 and 6 are the same instant given in different offsets
+    for ids in [{2, 3, 6}, {6, 3, 2}, {3, 6}, {6, 2}]:
+        assert DevOpsConnector.get_max_timed_ids({'k': ids}, TIMES)['k'] == next(iter(ids))
+        assert DevOpsConnector.get_max_timed_ids({'k': ids}, TIMES)['k'] == \
+            DevOpsConnector.get_max_timed_id(ids, TIMES)
+
+
+def test_string_ids_and_datetime_values():
+    times = {'x': '2024-01-01T00:00:00Z', 'y': datetime.datetime(2024, 1, 1, 0, 0, 1, tzinfo=datetime.timezone.utc)}
+    assert DevOpsConnector.get_max_timed_ids({'k': {'x', 'y'}}, times) == {'k': 'y'}
+    assert DevOpsConnector.get_max_timed_id({'x', 'y'}, times) == 'y'
+
+
+def test_naive_times_are_utc():
+    times = {1: '2024-03-01T10:00:00', 2: '2024-03-01T10:30:00+01:00', 3: '2024-03-01T09:59:59Z'}
+    # the single id version can not compare naive times with its aware baseline
+    with pytest.raises(TypeError):
+        DevOpsConnector.get_max_timed_id({1}, times)
+    assert DevOpsConnector.get_max_timed_ids({'a': {1, 2}, 'b': {1, 3}, 'c': {2, 3}}, times) == \
+        {'a': 1, 'b': 1, 'c': 3}
+
+
+def test_unknown_and_unreadable_ids_leave_the_key_out():
+    times = dict(TIMES, bad='not a time')
+    links = {'a': {1, 99}, 'b': {1, 'bad'}, 'c': {1, 2}}
+    with pytest.raises(KeyError):
+        DevOpsConnector.get_max_timed_id(links['a'], times)
+    with pytest.raises(ValueError):
+        DevOpsConnector.get_max_timed_id(links['b'], times)
+    assert DevOpsConnector.get_max_timed_ids(links, times) == {'c': 2}
+
+
+def test_keys_and_empty_links():
+    links = {'a': {1, 2}, 'b': {4}, 'c': set(), 'd': None}
+    assert DevOpsConnector.get_max_timed_ids(links, TIMES, keys=['b', 'missing']) == {'b': 4}
+    assert DevOpsConnector.get_max_timed_ids(links, TIMES) == {'a': 2, 'b': 4}
+    assert DevOpsConnector.get_max_timed_ids({}, TIMES) == {}
@@ -0,0 +1,82 @@
+import json
+import re
+from AZDConnector import AZDConnector
+from GitlabConnector import GitlabConnector
+from jiraConnector import JiraConnector
+from MentionExtractor import MentionExtractor
+
+JIRA_URL = 'https://jira.example.com'
+
+
+def old_gitlab_mentions(body: str) -> dict:
+    """Note parsing of GitlabConnector before MentionExtractor"""
+    mentions = {'assigned': [], 'branch': [], 'mr': []}
+    if re.search(re.compile('assigned to'), body) is not None:
+        mentions['assigned'].append('assigned to')
+    if re.search(re.compile('created branch'), body) is not None:
+        mentions['branch'].append(body.split('`')[1])
+    if re.search(re.compile('mentioned in merge request'), body) is not None:
+        mentions['mr'].append(str(int(body.split('!')[1])))
+    return mentions
+
+
+def old_jira_mentions(input_dict) -> list[str]:
+    """find_issue_id_mentions of jiraConnector before MentionExtractor"""
+    regex = re.compile(JIRA_URL + '/browse/[A-Z]{1,9}-\\d+')
+    return [match.split('/')[-1] for match in regex.findall(json.dumps(input_dict))]
+
+
+def test_gitlab_notes_match_old_parsing():
+    notes = ['assigned to @alice', 'assigned to @alice and unassigned @bob',
+             'created branch [`12-fix-login`](/group/project/-/compare/main...12-fix-login) to address this issue',
+             'mentioned in merge request !34', 'mentioned in merge request group/other-project!7',
+             'changed the description', 'marked this issue as related to #3']
+    for body in notes:
+        assert GitlabConnector.note_mentions.find(body) == old_gitlab_mentions(body)
+
+
+def test_azd_history_and_comments_match_old_regexes():
+    history = 'Linked to <a href="https://dev.azure.com/org/project/_git/repo/pullrequest/42">PR 42</a>'
+    old_mr = int(re.search(re.compile(r'pullrequest/\d+'), history).group(0).split('/')[-1])
+    assert int(AZDConnector.work_item_mentions.first('mr', history)) == old_mr == 42
+    assert AZDConnector.work_item_mentions.first('mr', 'Changed state to Active') == ''
+    comment = 'User mentioned work item #123 in a commit'
+    assert re.search(re.compile('mentioned work item #\\d+'), comment) is not None
+    assert AZDConnector.work_item_mentions.first('work_item', comment) == '123'
+    assert AZDConnector.work_item_mentions.first('work_item', 'Linked to work item 123') == ''
+
+
+def test_jira_documents_match_old_json_search():
+    connector = JiraConnector(JIRA_URL, 'token', 'ns', 'user@example.com')
+    document = {'type': 'doc', 'version': 1, 'content': [
+        {'type': 'paragraph', 'content': [
+            {'type': 'text', 'text': 'Duplicate of ' + JIRA_URL + '/browse/ABC-1 and'},
+            {'type': 'inlineCard', 'attrs': {'url': JIRA_URL + '/browse/ABC-22'}},
+            {'type': 'text', 'text': 'see',
+             'marks': [{'type': 'link', 'attrs': {'href': JIRA_URL + '/browse/XY-3'}}]}]},
+        {'type': 'paragraph', 'content': [
+            {'type': 'text', 'text': 'not a mention https://other.example.com/browse/ABC-4, nor ABC-5'}]}]}
+    assert connector.find_issue_id_mentions(document) == old_jira_mentions(document) == ['ABC-1', 'ABC-22', 'XY-3']
+    body = 'Blocked by ' + JIRA_URL + '/browse/ABC-7, see ' + JIRA_URL + '/browse/abc-8'
+    assert connector.find_issue_id_mentions(body) == old_jira_mentions(body) == ['ABC-7']
+    assert connector.find_issue_id_mentions(None) == []
+    assert connector.find_issue_id_mentions({'type': 'doc', 'content': []}) == []
+
+
+def test_first_searches_texts_in_order():
+    extractor = MentionExtractor({'ext_issue': r'(EXT-\d+)'})
+    title, description = 'Fix login EXT-12', 'Also touches EXT-13'
+    old = re.compile(r'(EXT-\d+)').search(title + ' ' + description).group(1)
+    assert extractor.first('ext_issue', title, description) == old == 'EXT-12'
+    assert extractor.first('ext_issue', 'Fix login', None, description) == 'EXT-13'
+    assert extractor.first('ext_issue', None, '') == ''
+
+
+def test_patterns_without_groups_and_find_many():
+    extractor = MentionExtractor({'word': 'hello', 'number': r'#(\d+)'})
+    assert extractor.find('hello #1, hello #22') == {'word': ['hello', 'hello'], 'number': ['1', '22']}
+    assert extractor.find(None) == {'word': [], 'number': []}
+    assert extractor.find_many(['#5', 'hello']) == [{'word': [], 'number': ['5']}, {'word': ['hello'], 'number': []}]
+    documents = [{'content': [{'text': 'hello'}, {'text': '#9'}]}, None]
+    assert extractor.find_many(documents, documents=True) == [{'word': ['hello'], 'number': ['9']},
+                                                             {'word': [], 'number': []}]
@@ -22,7 +22,8 @@ $env:GITLAB_ID_EMAIL_CSV='None'
 ##### JIRA ##########
 # parquet file suffix to use for saving dataframe; compressed in gz
 $env:JIRA_PARQUET_SUFFIX='ABCD'
-# delay in seconds between api calls for issues
+# delay in seconds between api calls, used as the rate limit shared by all api workers
+# set requests_per_second in common/settings.json to override
 $env:JIRA_API_DELAY='1'
 # false is good for a test run, with only partial data is retrieved
 $env:JIRA_PRODUCTION_RUN='True'
@@ -32,7 +33,8 @@ $env:JIRA_USER_JSON='jira_users.json'
 $env:JIRA_URL='https://xxxxxx.atlassian.net'
 $env:JIRA_AUTH_TOKEN='xxxxxxx'
 $env:JIRA_AUTH_EMAIL='abc@xxx'
-# if using issue source as jira and not xml, define below
+# if using issue source as jira or jql and not xml, define below
+# start and stop keys are only used by jira source type
 $env:JIRA_PRJ_KEY='MS'
 $env:JIRA_START_KEY='5000'
 $env:JIRA_STOP_KEY='5010'